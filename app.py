@@ -1,22 +1,60 @@
-from flask import Flask, request, send_from_directory
+from flask import Flask, Request, request, send_from_directory, current_app, g
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_restx import Api, Resource, fields, Namespace
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
+from functools import wraps
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import Counter, deque
+from itertools import chain
 from PIL import Image
 import os
+import time
 import uuid
+import click
+import multiprocessing
+import json
+import hashlib
+import base64
 import mimetypes
+import shutil
+import tempfile
 from dotenv import load_dotenv
-from oss_service import oss_service
+from storage import storage, supported_image_formats, IMAGE_FORMATS
+from cache import signed_url_cache, resized_image_cache, response_cache
+from search_index import PhotoSearchIndex
+from query_counter import QueryCounter
+from migrations import run_migrations
+from tasks import JobQueue, BackgroundWorker, RateLimiter, build_derivatives
 
 # 加载环境变量
 load_dotenv()
 
+# 单独设置请求体大小上限的接口 {endpoint: 配置项}，其他接口使用 MAX_CONTENT_LENGTH
+REQUEST_SIZE_LIMITS = {}
+
+class SizeLimitedRequest(Request):
+    """按接口设置请求体大小上限（批量上传等接口允许更大的请求体）"""
+    @property
+    def max_content_length(self):
+        return current_app.config[REQUEST_SIZE_LIMITS.get(self.endpoint, 'MAX_CONTENT_LENGTH')]
+    
+    @property
+    def max_form_parts(self):
+        if self.endpoint in REQUEST_SIZE_LIMITS:
+            return current_app.config['BATCH_UPLOAD_MAX_FILES'] + 100
+        return super().max_form_parts
+
 app = Flask(__name__)
+app.request_class = SizeLimitedRequest
 
 # 配置
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:////data/photos.db')
@@ -27,6 +65,36 @@ app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 10485760))  # 10MB
 app.config['VIEW_PASSWORD'] = os.getenv('VIEW_PASSWORD', '563538')  # 查看密钥
 app.config['ADMIN_PASSWORD'] = os.getenv('ADMIN_PASSWORD', 'vaneljd')  # 查看密钥
+app.config['SIGNED_URL_EXPIRES'] = int(os.getenv('SIGNED_URL_EXPIRES', 3600))  # 签名URL有效期（秒）
+app.config['SQL_QUERY_BUDGET'] = int(os.getenv('SQL_QUERY_BUDGET', 0))  # 单个请求SQL数量上限（0表示不检查）
+app.config['DERIVATIVE_WORKERS'] = int(os.getenv('DERIVATIVE_WORKERS', 2))  # 每个worker生成缩略图的进程数
+app.config['DERIVATIVE_MAX_RETRIES'] = int(os.getenv('DERIVATIVE_MAX_RETRIES', 3))  # 缩略图生成失败重试次数
+app.config['PROCESSING_TIMEOUT'] = int(os.getenv('PROCESSING_TIMEOUT', 900))  # 照片处理中超过N秒视为任务丢失（worker重启/超时被杀），自动重新提交
+app.config['PROCESSING_RECOVERY_INTERVAL'] = int(os.getenv('PROCESSING_RECOVERY_INTERVAL', 300))  # 检查丢失的缩略图任务的间隔（秒，0表示不检查）
+app.config['UPLOAD_SESSION_TTL'] = int(os.getenv('UPLOAD_SESSION_TTL', 86400))  # 分片上传会话闲置过期时间（秒）
+app.config['UPLOAD_SESSION_GC_INTERVAL'] = int(os.getenv('UPLOAD_SESSION_GC_INTERVAL', 3600))  # 后台清理过期上传会话的间隔（秒，0表示仅通过 flask gc-upload-sessions 清理）
+app.config['UPLOAD_PART_SIZE'] = int(os.getenv('UPLOAD_PART_SIZE', 5 * 1024 * 1024))  # 建议的分片大小（字节）
+app.config['UPLOAD_SESSION_MAX_SIZE'] = int(os.getenv('UPLOAD_SESSION_MAX_SIZE', 200 * 1024 * 1024))  # 单个分片上传会话的文件大小上限（字节）
+app.config['PLACEHOLDER_THUMBNAIL_URL'] = os.getenv('PLACEHOLDER_THUMBNAIL_URL', '/api/images/placeholder')  # 缩略图生成前的占位图
+app.config['RESIZE_ALLOWED_SIZES'] = sorted(
+    {int(size) for size in os.getenv('RESIZE_ALLOWED_SIZES', '160,240,320,480,640,800,960,1280,1600,1920').split(',') if size.strip()}
+)  # 按需缩放允许的宽/高（像素）
+app.config['IMAGE_DELIVERY_MODE'] = os.getenv('IMAGE_DELIVERY_MODE', 'redirect')  # redirect（302到OSS签名URL）或 proxy（经API流式转发）
+app.config['IMAGE_PROXY_CACHE_CONTROL'] = os.getenv('IMAGE_PROXY_CACHE_CONTROL', 'private, max-age=86400')  # proxy 模式的 Cache-Control
+app.config['IMAGE_PROXY_CHUNK_SIZE'] = int(os.getenv('IMAGE_PROXY_CHUNK_SIZE', 64 * 1024))  # proxy 模式每次转发的字节数
+app.config['RESIZE_CACHE_MAX_AGE'] = int(os.getenv('RESIZE_CACHE_MAX_AGE', 86400))  # 缩放图片的浏览器缓存时间（秒）
+app.config['PUBLIC_CACHE_CONTROL'] = os.getenv('PUBLIC_CACHE_CONTROL', 'public, max-age=30')  # 公开接口的 Cache-Control
+app.config['SYNC_TOMBSTONE_DAYS'] = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))  # 已删除照片的删除标记保留天数（超过后增量同步需全量重新同步）
+app.config['SYNC_SETTLE_SECONDS'] = int(os.getenv('SYNC_SETTLE_SECONDS', 2))  # 增量同步不返回最近N秒内的变更（等待并发事务提交，避免遗漏）
+app.config['STORAGE_PURGE_INTERVAL'] = int(os.getenv('STORAGE_PURGE_INTERVAL', 30))  # 后台清理线程检查待删除文件的间隔（秒）
+app.config['STORAGE_PURGE_BATCH_SIZE'] = int(os.getenv('STORAGE_PURGE_BATCH_SIZE', 1000))  # 每批删除的文件数
+app.config['STORAGE_PURGE_RETRY_DELAY'] = int(os.getenv('STORAGE_PURGE_RETRY_DELAY', 30))  # 删除失败首次重试间隔（秒，之后指数退避）
+app.config['STORAGE_PURGE_MAX_RETRY_DELAY'] = int(os.getenv('STORAGE_PURGE_MAX_RETRY_DELAY', 3600))  # 删除失败最大重试间隔（秒）
+app.config['TOMBSTONE_PURGE_INTERVAL'] = int(os.getenv('TOMBSTONE_PURGE_INTERVAL', 3600))  # 后台清除过期删除标记的间隔（秒，0表示仅通过命令清除）
+app.config['BATCH_MAX_IDS'] = int(os.getenv('BATCH_MAX_IDS', 500))  # 批量操作单次最多照片数
+app.config['BATCH_UPLOAD_MAX_FILES'] = int(os.getenv('BATCH_UPLOAD_MAX_FILES', 200))  # 批量上传单次最多文件数
+app.config['BATCH_UPLOAD_MAX_CONTENT_LENGTH'] = int(os.getenv('BATCH_UPLOAD_MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))  # 批量上传请求体上限（单个文件仍受 MAX_CONTENT_LENGTH 限制）
+app.config['BATCH_UPLOAD_WORKERS'] = int(os.getenv('BATCH_UPLOAD_WORKERS', 4))  # 批量上传并发处理的文件数
 
 # 初始化扩展
 db = SQLAlchemy(app)
@@ -43,6 +111,23 @@ api = Api(
     prefix='/api'
 )
 
+# SQL数量检查：超出预算时打印告警，并通过 X-Query-Count 响应头返回SQL数量
+if app.config['SQL_QUERY_BUDGET']:
+    @app.before_request
+    def start_query_counter():
+        g.query_counter = QueryCounter().start()
+
+    @app.after_request
+    def check_query_budget(response):
+        counter = g.pop('query_counter', None)
+        if counter:
+            counter.stop()
+            response.headers['X-Query-Count'] = str(counter.count)
+            if counter.count > app.config['SQL_QUERY_BUDGET']:
+                print(f"警告: {request.method} {request.path} 执行了 {counter.count} 条SQL，"
+                      f"超过预算 {app.config['SQL_QUERY_BUDGET']}")
+        return response
+
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -103,27 +188,238 @@ def generate_image_urls(photo, request_host=None):
         'thumbnail': f"/api/images/{photo.id}/thumbnail"
     }
 
-def format_photo_data(photo, request_host=None):
+def get_url_mode():
+    """
+    获取响应中图片URL的模式
+    api: 返回 /api/images/... 路径（默认）
+    signed: 直接返回OSS签名URL及其过期时间，省去一次重定向
+    """
+    url_mode = request.args.get('url_mode', 'api')
+    if url_mode == 'signed' and storage:
+        return 'signed'
+    return 'api'
+
+def load_derivatives(photos):
+    """
+    批量读取照片的衍生图（一次查询）
+    :return: {原图oss_key: {variant: 衍生图key}}
+    """
+    source_keys = {photo.oss_key for photo in photos if photo.oss_key and photo.status == 'ready'}
+    if not source_keys:
+        return {}
+    
+    result = {}
+    rows = db.session.query(PhotoDerivative.source_key, PhotoDerivative.variant, PhotoDerivative.key)\
+                     .filter(PhotoDerivative.source_key.in_(source_keys),
+                             PhotoDerivative.format == 'jpeg',
+                             PhotoDerivative.variant != 'thumbnail')\
+                     .all()
+    for source_key, variant, key in rows:
+        # 只返回按长边生成的衍生图（不含按需缩放的图片）
+        if variant.isdigit():
+            result.setdefault(source_key, {})[variant] = key
+    return result
+
+def load_variant_keys(photo):
+    """
+    读取照片缩略图及各尺寸衍生图的所有格式
+    :return: {variant: {format: 衍生图key}}
+    """
+    if not photo.oss_key or photo.status != 'ready':
+        return {}
+    variants = {}
+    rows = db.session.query(PhotoDerivative.variant, PhotoDerivative.format, PhotoDerivative.key)\
+                     .filter_by(source_key=photo.oss_key).all()
+    for variant, image_format, key in rows:
+        variants.setdefault(variant, {})[image_format] = key
+    return variants
+
+# 按压缩率从高到低排列的可协商图片格式
+NEGOTIABLE_IMAGE_FORMATS = (('avif', 'image/avif'), ('webp', 'image/webp'))
+
+def negotiate_image_format(formats):
+    """
+    根据请求的 Accept 头选择图片格式
+    只认可明确列出的 image/avif、image/webp（*/* 不代表支持新格式）
+    :param formats: 可用格式 {format: key}
+    :return: 'avif'/'webp'/'jpeg'
+    """
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    for image_format, mimetype in NEGOTIABLE_IMAGE_FORMATS:
+        if image_format in formats and mimetype in accepted:
+            return image_format
+    return 'jpeg'
+
+def sign_photo_urls(photos, derivatives=None):
+    """
+    批量为一页照片生成签名URL
+    :param photos: 照片对象列表
+    :param derivatives: load_derivatives 返回的衍生图
+    :return: {photo_id: {'src': (url, expires_at), 'thumbnail': (url, expires_at), 'srcset': {variant: (url, expires_at)}}}
+    """
+    derivatives = derivatives or {}
+    items = []
+    for photo in photos:
+        items.append((photo.oss_key, 'original'))
+        if photo.status == 'ready':
+            items.append((photo.oss_thumbnail_key, 'thumbnail'))
+        for variant, key in derivatives.get(photo.oss_key, {}).items():
+            items.append((key, variant))
+    
+    signed = signed_url_cache.get_urls(
+        items,
+        storage.generate_signed_url,
+        app.config['SIGNED_URL_EXPIRES']
+    )
+    
+    return {
+        photo.id: {
+            'src': signed.get((photo.oss_key, 'original')),
+            'thumbnail': signed.get((photo.oss_thumbnail_key, 'thumbnail')) if photo.status == 'ready' else None,
+            'srcset': {
+                variant: signed.get((key, variant))
+                for variant, key in derivatives.get(photo.oss_key, {}).items()
+            }
+        }
+        for photo in photos
+    }
+
+def format_photo_data(photo, request_host=None, signed_urls=None, derivatives=None):
     """
     格式化照片数据，包含动态生成的URL
+    :param signed_urls: sign_photo_urls 返回的该照片签名URL（可选），提供时直接返回OSS地址
+    :param derivatives: 该照片的衍生图 {variant: key}（可选），未提供时查询数据库
     """
     urls = generate_image_urls(photo, request_host)
+    expires = {}
     
-    return {
+    # 缩略图尚未生成时返回占位图
+    if photo.status != 'ready':
+        urls['thumbnail'] = app.config['PLACEHOLDER_THUMBNAIL_URL']
+    
+    if derivatives is None:
+        derivatives = load_derivatives([photo]).get(photo.oss_key, {})
+    
+    # 按长边尺寸提供的衍生图（srcset）
+    srcset = {variant: f"/api/images/{photo.id}/{variant}" for variant in derivatives}
+    
+    if signed_urls:
+        for name in ('src', 'thumbnail'):
+            if signed_urls.get(name):
+                urls[name], expires[name] = signed_urls[name]
+        for variant, signed in signed_urls.get('srcset', {}).items():
+            if signed:
+                srcset[variant], expires_at = signed
+                expires['srcset'] = min(expires.get('srcset', expires_at), expires_at)
+    
+    photo_data = {
         'id': photo.id,
         'title': photo.title,
         'description': photo.description,
         'src': urls['src'],
         'thumbnail': urls['thumbnail'],
+        'srcset': dict(sorted(srcset.items(), key=lambda item: int(item[0]))),
         'date': photo.date,
         'size': photo.size,
         'location': photo.location,
         'is_public': photo.is_public,
         'file_name': photo.file_name,
         'mime_type': photo.mime_type,
+        'status': photo.status,
         'created_at': photo.created_at.isoformat() if photo.created_at else None,
         'updated_at': photo.updated_at.isoformat() if photo.updated_at else None
     }
+    
+    if signed_urls:
+        photo_data['src_expires_at'] = expires.get('src')
+        photo_data['thumbnail_expires_at'] = expires.get('thumbnail')
+        photo_data['srcset_expires_at'] = expires.get('srcset')
+    
+    return photo_data
+
+def format_photo_list(photos):
+    """
+    格式化一页照片（一次查询衍生图），url_mode=signed 时批量签名
+    :return: 与 photos 一一对应的照片数据列表
+    """
+    derivatives = load_derivatives(photos)
+    signed = sign_photo_urls(photos, derivatives) if get_url_mode() == 'signed' else {}
+    return [
+        format_photo_data(photo, signed_urls=signed.get(photo.id), derivatives=derivatives.get(photo.oss_key, {}))
+        for photo in photos
+    ]
+
+def encode_cursor(photo):
+    """将 (created_at, id) 编码为不透明的游标字符串"""
+    return encode_position(photo.created_at, photo.id)
+
+def encode_position(moment, photo_id):
+    """将 (时间, 照片ID) 编码为不透明的游标字符串（decode_cursor 解析）"""
+    raw = json.dumps([moment.isoformat(), photo_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    解析游标字符串
+    :return: (created_at, photo_id)
+    :raises ValueError: 游标格式错误
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, photo_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(photo_id)
+    except Exception:
+        raise ValueError('游标格式错误')
+
+def paginate_photos(query, page, per_page, rank=None):
+    """
+    对照片查询进行分页
+    请求带有 cursor 参数（首页可为空）时使用基于 (created_at, id) 的游标分页，
+    不执行 OFFSET 扫描和 COUNT 查询；否则使用传统的 page/per_page 分页。
+    :param rank: 全文检索的相关度排序表达式（仅用于page/per_page分页）
+    :return: (照片列表, 分页信息)
+    :raises ValueError: 游标格式错误
+    """
+    per_page = max(1, per_page)
+    if 'cursor' not in request.args:
+        order_by = [Photo.created_at.desc()] if rank is None else [rank, Photo.created_at.desc()]
+        pagination = query.order_by(*order_by).paginate(page=page, per_page=per_page, error_out=False)
+        return pagination.items, {
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        created_at, photo_id = decode_cursor(cursor)
+        query = query.filter(
+            db.or_(
+                Photo.created_at < created_at,
+                db.and_(Photo.created_at == created_at, Photo.id < photo_id)
+            )
+        )
+    
+    items = query.order_by(Photo.created_at.desc(), Photo.id.desc()).limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    
+    return items, {
+        'per_page': per_page,
+        'next_cursor': encode_cursor(items[-1]) if has_more else None,
+        'has_more': has_more
+    }
+
+def invalid_cursor_response(e):
+    return {
+        'success': False,
+        'error': {
+            'code': 'INVALID_CURSOR',
+            'message': '分页游标无效',
+            'details': str(e)
+        }
+    }, 400
 
 # 数据模型
 class User(db.Model):
@@ -137,6 +433,21 @@ class User(db.Model):
     photos = db.relationship('Photo', backref='user', lazy=True, cascade='all, delete-orphan')
 
 class Photo(db.Model):
+    __table_args__ = (
+        # 游标分页按 (created_at, id) 排序
+        db.Index('ix_photo_created_at_id', 'created_at', 'id'),
+        # 公开照片列表：按 is_public 过滤并按 created_at 排序
+        db.Index('ix_photo_public_created_at_id', 'is_public', 'created_at', 'id'),
+        # 用户照片（仪表板最近上传、按用户查询）
+        db.Index('ix_photo_user_created_at', 'user_id', 'created_at'),
+        # 按内容哈希查找重复照片（秒传）
+        db.Index('ix_photo_content_hash', 'content_hash'),
+        # 增量同步按 (updated_at, id) 顺序读取变更
+        db.Index('ix_photo_updated_at_id', 'updated_at', 'id'),
+        # 按原图key更新状态、批量重新生成衍生图时按原图key顺序读取
+        db.Index('ix_photo_oss_key', 'oss_key'),
+    )
+    
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     title = db.Column(db.String(200), nullable=False, default='')
     description = db.Column(db.Text)
@@ -152,8 +463,870 @@ class Photo(db.Model):
     oss_key = db.Column(db.String(500))  # OSS文件key
     oss_thumbnail_key = db.Column(db.String(500))  # OSS缩略图key
     mime_type = db.Column(db.String(100))
+    content_hash = db.Column(db.String(64))  # 原图SHA-256
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')  # processing/ready/failed
+    processing_error = db.Column(db.Text)  # 缩略图生成失败原因
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)  # 删除时间（软删除，记录保留为增量同步的删除标记，超过保留期后清除）
+    unpublished_at = db.Column(db.DateTime)  # 最近一次由公开改为非公开的时间（匿名增量同步据此返回不再公开的照片）
+
+@event.listens_for(Photo.is_public, 'set', active_history=True)
+def _record_unpublished(target, value, oldvalue, initiator):
+    if oldvalue is True and not value:
+        target.unpublished_at = datetime.utcnow()
+
+# 查询默认排除已删除的照片，需要包含时使用 .execution_options(include_deleted=True)
+@event.listens_for(db.session, 'do_orm_execute')
+def _exclude_deleted_photos(state):
+    if (
+        not state.is_column_load
+        and not state.is_relationship_load
+        and not state.execution_options.get('include_deleted', False)
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(Photo, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
+
+class TombstonePurge(db.Model):
+    """已删除照片记录（删除标记）的清除记录，since 早于已清除的删除标记时增量同步返回410"""
+    id = db.Column(db.Integer, primary_key=True)
+    purged_through = db.Column(db.DateTime, nullable=False)  # 本次清除的删除标记中最大的 updated_at
+    count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserStats(db.Model):
+    """用户照片统计（上传、修改可见性、删除时增量维护）"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_photos = db.Column(db.Integer, nullable=False, default=0)
+    public_photos = db.Column(db.Integer, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, nullable=False, default=0)  # 总文件大小（字节）
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PhotoBlob(db.Model):
+    """按内容去重的OSS对象，多张照片可引用同一对象（引用计数）"""
+    content_hash = db.Column(db.String(64), primary_key=True)  # 原图SHA-256
+    oss_key = db.Column(db.String(500), nullable=False)
+    oss_thumbnail_key = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.BigInteger)
+    mime_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PhotoDerivative(db.Model):
+    """原图的衍生图（缩略图、各尺寸缩放图），按原图OSS key关联，内容去重的照片共享"""
+    __table_args__ = (
+        db.UniqueConstraint('source_key', 'variant', 'format', name='uq_photo_derivative'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source_key = db.Column(db.String(500), nullable=False, index=True)  # 原图OSS key
+    variant = db.Column(db.String(20), nullable=False)  # thumbnail 或长边像素
+    format = db.Column(db.String(10), nullable=False, default='jpeg')
+    key = db.Column(db.String(500), nullable=False)  # 衍生图OSS key
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 照片数据（含缩略图/衍生图）变更的事务提交后，递增公开接口响应缓存的版本号
+def _affects_public_responses(obj):
+    if isinstance(obj, Photo):
+        return True
+    # 按需缩放生成的图片（variant 含 -）不出现在接口响应中
+    return isinstance(obj, PhotoDerivative) and '-' not in (obj.variant or '')
+
+@event.listens_for(db.session, 'before_flush')
+def _track_photo_changes(session, flush_context, instances):
+    if any(_affects_public_responses(obj) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['photos_changed'] = True
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_photo_bulk_changes(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper and state.bind_mapper.class_ in (Photo, PhotoDerivative):
+        state.session.info['photos_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_response_cache(session):
+    if session.info.pop('photos_changed', False):
+        response_cache.bump()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_photo_changes(session):
+    session.info.pop('photos_changed', None)
+
+def save_derivatives(source_key, derivatives):
+    """
+    在当前事务中替换原图的衍生图记录（按需缩放生成的图片保留），
+    新结果中不再存在的衍生图文件（如去掉了某个尺寸或格式）加入待删除队列；
+    其他worker本地缓存的照片映射最多保留 local_photo_ttl 秒，旧文件在此之后才会被删除
+    """
+    existing = PhotoDerivative.query.filter(
+        PhotoDerivative.source_key == source_key,
+        ~PhotoDerivative.variant.contains('-')
+    )
+    current_keys = {item['key'] for item in derivatives}
+    stale_keys = {row.key for row in existing.with_entities(PhotoDerivative.key)} - current_keys
+    existing.delete(synchronize_session=False)
+    db.session.add_all([
+        PhotoDerivative(
+            source_key=source_key,
+            variant=item['variant'],
+            format=item['format'],
+            key=item['key'],
+            width=item['width'],
+            height=item['height'],
+            size=item['size']
+        )
+        for item in derivatives
+    ])
+    delete_after = datetime.utcnow() + timedelta(seconds=signed_url_cache.local_photo_ttl)
+    db.session.add_all([PendingFileDeletion(file_key=key, next_attempt_at=delete_after) for key in sorted(stale_keys)])
+
+def pop_derivatives(source_keys):
+    """
+    在当前事务中删除原图的衍生图记录（一次查询、一次删除）
+    :return: {原图key: [(variant, 衍生图OSS key)]}
+    """
+    source_keys = list(set(source_keys))
+    if not source_keys:
+        return {}
+    
+    derivatives = {}
+    for row in PhotoDerivative.query.filter(PhotoDerivative.source_key.in_(source_keys)).all():
+        derivatives.setdefault(row.source_key, []).append((row.variant, row.key))
+    PhotoDerivative.query.filter(PhotoDerivative.source_key.in_(source_keys)).delete(synchronize_session=False)
+    return derivatives
+
+class PendingFileDeletion(db.Model):
+    """待删除的存储文件（删除照片时在同一事务中写入，由后台清理线程批量删除，失败后按指数退避重试）"""
+    id = db.Column(db.Integer, primary_key=True)
+    file_key = db.Column(db.String(500), nullable=False)  # 存储文件key，本地文件时为文件路径
+    is_local = db.Column(db.Boolean, nullable=False, default=False)  # 本地文件（兼容性保留的 file_path）
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已失败次数
+    last_error = db.Column(db.Text)  # 最近一次删除失败原因
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """分片上传会话（对应一次OSS分片上传）"""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    upload_id = db.Column(db.String(100), nullable=False)  # OSS分片上传ID
+    oss_key = db.Column(db.String(500), nullable=False)
+    oss_thumbnail_key = db.Column(db.String(500), nullable=False)
+    file_name = db.Column(db.String(255))
+    mime_type = db.Column(db.String(100))
+    total_size = db.Column(db.BigInteger)  # 客户端声明的文件大小（可选）
+    photo_meta = db.Column(db.Text)  # 照片元数据（JSON）
+    status = db.Column(db.String(20), nullable=False, default='active')  # active/completed/aborted
+    photo_id = db.Column(db.String(36))  # 完成后创建的照片ID
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    parts = db.relationship('UploadPart', backref='session', lazy=True, cascade='all, delete-orphan',
+                            order_by='UploadPart.part_number')
+
+class UploadPart(db.Model):
+    """分片上传会话中已上传的分片"""
+    session_id = db.Column(db.String(36), db.ForeignKey('upload_session.id'), primary_key=True)
+    part_number = db.Column(db.Integer, primary_key=True)
+    etag = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 全文检索索引
+search_index = PhotoSearchIndex(db, Photo)
+
+def compute_user_stats(user_id):
+    """
+    从照片表聚合计算用户统计
+    :return: 未加入会话的 UserStats 对象
+    """
+    total, public, size = db.session.query(
+        db.func.count(Photo.id),
+        db.func.coalesce(db.func.sum(db.case((Photo.is_public == True, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(Photo.size), 0)
+    ).filter(Photo.user_id == user_id).one()
+    
+    return UserStats(user_id=user_id, total_photos=total, public_photos=public, total_size=size)
+
+def adjust_user_stats(user_id, total=0, public=0, size=0):
+    """
+    在当前事务中增量更新用户统计，统计行不存在时从照片表聚合创建
+    :param total: 照片数变化量
+    :param public: 公开照片数变化量
+    :param size: 文件大小变化量（字节）
+    """
+    update = db.update(UserStats).where(UserStats.user_id == user_id).values(
+        total_photos=UserStats.total_photos + total,
+        public_photos=UserStats.public_photos + public,
+        total_size=UserStats.total_size + size,
+        updated_at=datetime.utcnow()
+    )
+    
+    if db.session.execute(update).rowcount:
+        return
+    
+    # 统计行不存在：先flush本次事务中的照片变更，再聚合生成统计行
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(compute_user_stats(user_id))
+    except IntegrityError:
+        # 并发请求已创建统计行，改为增量更新
+        db.session.execute(update)
+
+def reconcile_user_stats():
+    """
+    根据照片表重建全部用户统计
+    :return: 重建的统计行数
+    """
+    db.session.query(UserStats).delete()
+    rows = db.session.query(
+        Photo.user_id,
+        db.func.count(Photo.id),
+        db.func.coalesce(db.func.sum(db.case((Photo.is_public == True, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(Photo.size), 0)
+    ).group_by(Photo.user_id).all()
+    
+    db.session.add_all([
+        UserStats(user_id=user_id, total_photos=total, public_photos=public, total_size=size)
+        for user_id, total, public, size in rows
+    ])
+    db.session.commit()
+    return len(rows)
+
+def _remove_source_file(job):
+    source_path = job.get('source_path')
+    if source_path and os.path.exists(source_path):
+        try:
+            os.remove(source_path)
+        except OSError as e:
+            print(f"删除临时文件失败: {e}")
+
+def on_derivatives_ready(job, result):
+    """缩略图生成成功：标记照片为 ready（任务期间照片已被删除时，新生成的文件加入待删除队列）"""
+    with app.app_context():
+        derivatives = result.get('derivatives', [])
+        live = db.session.query(Photo.id).filter(Photo.oss_key == job['oss_key']).first() is not None
+        if live:
+            save_derivatives(job['oss_key'], derivatives)
+            # 同一OSS对象可能被多张照片引用（内容去重），一并更新
+            Photo.query.filter_by(oss_key=job['oss_key']).update(
+                {'status': 'ready', 'processing_error': None},
+                synchronize_session=False
+            )
+        else:
+            db.session.add_all([PendingFileDeletion(file_key=item['key']) for item in derivatives])
+        db.session.commit()
+        if not live and derivatives:
+            storage_purger.notify()
+    signed_url_cache.invalidate_photo(job['photo_id'], [job['oss_key'], job['thumbnail_key']])
+    _remove_source_file(job)
+
+def on_derivatives_failed(job, error):
+    """缩略图多次重试后仍失败：标记照片为 failed"""
+    print(f"照片 {job['photo_id']} 缩略图生成失败: {error}")
+    with app.app_context():
+        Photo.query.filter_by(oss_key=job['oss_key']).update(
+            {'status': 'failed', 'processing_error': str(error)},
+            synchronize_session=False
+        )
+        db.session.commit()
+    _remove_source_file(job)
+
+# 缩略图生成任务队列
+derivative_queue = JobQueue(
+    build_derivatives,
+    on_success=on_derivatives_ready,
+    on_failure=on_derivatives_failed,
+    max_workers=app.config['DERIVATIVE_WORKERS'],
+    max_retries=app.config['DERIVATIVE_MAX_RETRIES']
+)
+
+def derivative_job(photo, source_path=None):
+    """构造照片的缩略图生成任务"""
+    return {
+        'photo_id': photo.id,
+        'oss_key': photo.oss_key,
+        'thumbnail_key': photo.oss_thumbnail_key,
+        'source_path': source_path
+    }
+
+def photo_meta_from(data):
+    """
+    从表单或JSON中读取照片元数据
+    :param data: request.form 或 JSON 字典
+    """
+    is_public = data.get('is_public', False)
+    if isinstance(is_public, str):
+        is_public = is_public.lower() == 'true'
+    
+    return {
+        'title': data.get('title', 'Unnamed'),
+        'description': data.get('description', ''),
+        'date': data.get('date', ''),
+        'location': data.get('location', ''),
+        'is_public': bool(is_public)
+    }
+
+def find_blob(content_hash, user_id=None):
+    """
+    查找内容相同的OSS对象
+    :param user_id: 指定时只返回该用户已有照片引用的对象（避免通过哈希探测他人照片）
+    """
+    if not content_hash:
+        return None
+    blob = PhotoBlob.query.get(content_hash)
+    if blob and user_id is not None:
+        owned = Photo.query.filter_by(content_hash=content_hash, user_id=user_id).first()
+        if not owned:
+            return None
+    return blob
+
+def store_upload(file, filename):
+    """
+    保存上传文件：先流式写入临时文件并计算SHA-256，内容已存在时直接引用已有OSS对象，否则上传
+    :return: 上传结果（reused 表示引用了已有对象；临时文件均保留，引用的对象在提交前被删除时用于重新上传）
+    """
+    source = storage.spool_upload(file)
+    blob = find_blob(source['sha256'])
+    
+    if blob:
+        return {
+            'file_size': source['size'],
+            'file_key': blob.oss_key,
+            'thumbnail_key': blob.oss_thumbnail_key,
+            'sha256': source['sha256'],
+            'source_path': source['path'],
+            'reused': True
+        }
+    
+    return put_spooled_upload(source, filename)
+
+def put_spooled_upload(source, filename):
+    """
+    上传已写入临时文件的原图，失败时删除临时文件
+    :param source: storage.spool_upload 的返回值
+    :return: 上传结果（保留临时文件供后台任务生成缩略图）
+    """
+    original_key = f"photos/{filename}"
+    try:
+        storage.put_file(original_key, source['path'], source['size'])
+    except Exception:
+        _remove_source_file({'source_path': source['path']})
+        raise
+    
+    return {
+        'file_size': source['size'],
+        'file_key': original_key,
+        'thumbnail_key': f"thumbnails/{filename}",
+        'sha256': source['sha256'],
+        'source_path': source['path'],
+        'reused': False
+    }
+
+class BlobReleasedError(Exception):
+    """引用的已有OSS对象在查找之后、增加引用计数之前被删除（最后一个引用已删除，文件已加入待删除队列）"""
+    def __init__(self, content_hash):
+        super().__init__(f"相同内容的文件已被删除: {content_hash}")
+        self.content_hash = content_hash
+
+def acquire_blob(upload_result, mime_type):
+    """
+    在当前事务中增加OSS对象的引用计数，对象未登记时创建记录
+    并发上传相同内容时以先登记的对象为准，返回需要删除的重复OSS key
+    :raises BlobReleasedError: upload_result 引用已有对象（reused）但该对象已被删除，不能重新登记（文件将被后台删除）
+    :return: (使用的 file_key, thumbnail_key, 需要删除的重复key列表)
+    """
+    content_hash = upload_result['sha256']
+    update = db.update(PhotoBlob).where(PhotoBlob.content_hash == content_hash)\
+                                 .values(ref_count=PhotoBlob.ref_count + 1)
+    
+    if not db.session.execute(update).rowcount:
+        if upload_result.get('reused'):
+            raise BlobReleasedError(content_hash)
+        try:
+            with db.session.begin_nested():
+                db.session.add(PhotoBlob(
+                    content_hash=content_hash,
+                    oss_key=upload_result['file_key'],
+                    oss_thumbnail_key=upload_result['thumbnail_key'],
+                    size=upload_result['file_size'],
+                    mime_type=mime_type,
+                    ref_count=1
+                ))
+            return upload_result['file_key'], upload_result['thumbnail_key'], []
+        except IntegrityError:
+            db.session.execute(update)
+    
+    blob = PhotoBlob.query.get(content_hash)
+    duplicates = []
+    if blob.oss_key != upload_result['file_key']:
+        duplicates = [upload_result['file_key']]
+    return blob.oss_key, blob.oss_thumbnail_key, duplicates
+
+def release_blobs(photos):
+    """
+    在当前事务中批量减少多张照片所引用OSS对象的引用计数（每个内容哈希一次更新，一次查询）
+    :return: 应删除OSS对象的原图key集合（没有内容哈希的旧照片或最后一个引用）
+    """
+    released = {photo.oss_key for photo in photos if not photo.content_hash}
+    counts = Counter(photo.content_hash for photo in photos if photo.content_hash)
+    if not counts:
+        return released
+    
+    for content_hash, count in counts.items():
+        db.session.execute(
+            db.update(PhotoBlob).where(PhotoBlob.content_hash == content_hash)
+                                .values(ref_count=PhotoBlob.ref_count - count)
+        )
+    blobs = {
+        blob.content_hash: blob
+        for blob in db.session.query(PhotoBlob).populate_existing()
+                              .filter(PhotoBlob.content_hash.in_(list(counts))).all()
+    }
+    for photo in photos:
+        if not photo.content_hash:
+            continue
+        blob = blobs.get(photo.content_hash)
+        if blob is None or blob.ref_count <= 0:
+            released.add(photo.oss_key)
+    for blob in blobs.values():
+        if blob.ref_count <= 0:
+            db.session.delete(blob)
+    return released
+
+def delete_photo_records(photos):
+    """
+    在当前事务中删除照片（软删除：记录保留为增量同步的删除标记），
+    同步引用计数、衍生图记录、检索索引和用户统计，并将需删除的文件加入待删除队列
+    （由调用方提交事务，提交后调用 storage_purger.notify() 唤醒后台清理线程）
+    :return: {原图key: [(variant, 衍生图OSS key)]}
+    """
+    released = {key for key in release_blobs(photos) if key}
+    derivatives = pop_derivatives(released)
+    
+    file_keys = []
+    for photo in photos:
+        if photo.oss_key in released:
+            file_keys.extend(key for key in (photo.oss_key, photo.oss_thumbnail_key) if key)
+    for items in derivatives.values():
+        file_keys.extend(key for _, key in items)
+    
+    deltas = {}
+    now = datetime.utcnow()
+    for photo in photos:
+        total, public, size = deltas.get(photo.user_id, (0, 0, 0))
+        deltas[photo.user_id] = (total - 1, public - (1 if photo.is_public else 0), size - (photo.size or 0))
+        search_index.remove_photo(photo.id)
+        photo.deleted_at = now
+        photo.updated_at = now
+    for user_id, (total, public, size) in deltas.items():
+        adjust_user_stats(user_id, total=total, public=public, size=size)
+    
+    pending = [PendingFileDeletion(file_key=key) for key in dict.fromkeys(file_keys)]
+    for photo in photos:
+        if photo.file_path:
+            # 本地文件及缩略图（兼容性处理）
+            pending.extend(
+                PendingFileDeletion(file_key=path, is_local=True)
+                for path in (photo.file_path, photo.file_path.replace('uploads/', 'uploads/thumbnails/'))
+            )
+    db.session.add_all(pending)
+    return derivatives
+
+def purge_tombstones(batch_size=1000):
+    """
+    清除超过保留期（SYNC_TOMBSTONE_DAYS）的已删除照片记录（分批删除，每批一个事务），
+    并在同一事务中记录清除到的位置（TombstonePurge），供增量同步判断 since 是否过期
+    :return: 清除的记录数
+    """
+    cutoff = datetime.utcnow() - timedelta(days=app.config['SYNC_TOMBSTONE_DAYS'])
+    purged = 0
+    while True:
+        rows = db.session.query(Photo.id, Photo.updated_at).execution_options(include_deleted=True)\
+                         .filter(Photo.deleted_at < cutoff).limit(batch_size).all()
+        if not rows:
+            return purged
+        ids = [row.id for row in rows]
+        Photo.query.execution_options(include_deleted=True).filter(Photo.id.in_(ids))\
+                   .delete(synchronize_session=False)
+        db.session.add(TombstonePurge(purged_through=max(row.updated_at for row in rows), count=len(ids)))
+        db.session.commit()
+        purged += len(ids)
+
+def queue_file_deletions(file_keys):
+    """
+    将未被数据库引用的存储文件加入待删除队列并提交（用于创建记录的事务失败后清理已上传的文件）
+    :param file_keys: 文件key列表（忽略空值）
+    """
+    file_keys = [key for key in dict.fromkeys(file_keys) if key]
+    if not file_keys:
+        return
+    try:
+        db.session.add_all([PendingFileDeletion(file_key=key) for key in file_keys])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"警告: 记录待删除文件失败，{len(file_keys)} 个文件将遗留在存储中: {e}")
+        return
+    storage_purger.notify()
+
+def referenced_file_keys(file_keys):
+    """
+    返回仍被未删除的照片、内容去重对象或衍生图引用的存储key（这些文件不能删除）
+    :param file_keys: 要检查的key列表
+    """
+    referenced = set()
+    if not file_keys:
+        return referenced
+    for column in (Photo.oss_key, Photo.oss_thumbnail_key, PhotoBlob.oss_key, PhotoBlob.oss_thumbnail_key, PhotoDerivative.key):
+        referenced.update(row[0] for row in db.session.query(column).filter(column.in_(file_keys)).distinct())
+    return referenced
+
+def purge_pending_files(batch_size=None):
+    """
+    批量删除待删除队列中到期的文件，成功后删除队列记录，失败时按指数退避安排重试
+    删除前再次检查引用，仍被引用的文件（如入队后又被新照片引用）只删除队列记录不删除文件
+    多个进程同时处理同一批记录时只会重复删除（文件不存在时忽略），记录更新按ID执行，不会冲突
+    :return: (处理完成的记录数（含跳过的记录）, 删除失败的文件数)
+    """
+    batch_size = batch_size or app.config['STORAGE_PURGE_BATCH_SIZE']
+    now = datetime.utcnow()
+    entries = PendingFileDeletion.query.filter(PendingFileDeletion.next_attempt_at <= now)\
+                                       .order_by(PendingFileDeletion.id).limit(batch_size).all()
+    
+    errors = {}
+    referenced = referenced_file_keys([entry.file_key for entry in entries if not entry.is_local])
+    skipped = [entry for entry in entries if not entry.is_local and entry.file_key in referenced]
+    if skipped:
+        print(f"警告: {len(skipped)} 个待删除文件仍被引用，已跳过")
+    stored = [entry for entry in entries if not entry.is_local and entry.file_key not in referenced]
+    if stored:
+        try:
+            if not storage:
+                raise Exception("存储服务不可用")
+            storage.delete_objects([entry.file_key for entry in stored])
+        except Exception as e:
+            errors.update((entry.id, str(e)) for entry in stored)
+    for entry in entries:
+        if not entry.is_local:
+            continue
+        try:
+            os.remove(entry.file_key)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors[entry.id] = str(e)
+    
+    deleted = [entry.id for entry in entries if entry.id not in errors]
+    if deleted:
+        PendingFileDeletion.query.filter(PendingFileDeletion.id.in_(deleted)).delete(synchronize_session=False)
+    for entry in entries:
+        if entry.id not in errors:
+            continue
+        delay = min(app.config['STORAGE_PURGE_RETRY_DELAY'] * 2 ** entry.attempts,
+                    app.config['STORAGE_PURGE_MAX_RETRY_DELAY'])
+        PendingFileDeletion.query.filter_by(id=entry.id).update({
+            'attempts': entry.attempts + 1,
+            'last_error': errors[entry.id],
+            'next_attempt_at': now + timedelta(seconds=delay)
+        }, synchronize_session=False)
+    db.session.commit()
+    
+    storage_purge_stats['files_deleted'] += len(deleted) - len(skipped)
+    storage_purge_stats['files_skipped'] += len(skipped)
+    storage_purge_stats['files_failed'] += len(errors)
+    if errors:
+        storage_purge_stats['last_error'] = next(iter(errors.values()))
+        print(f"警告: {len(errors)} 个文件删除失败，稍后重试: {storage_purge_stats['last_error']}")
+    return len(deleted), len(errors)
+
+# 后台清理统计（当前进程）
+storage_purge_stats = {
+    'files_deleted': 0,
+    'files_failed': 0,
+    'files_skipped': 0,
+    'last_error': None,
+    'tombstones_purged': 0,
+    'tombstones_purged_at': None,
+    'last_run_at': None
+}
+
+def run_storage_purge():
+    """
+    后台清理线程执行一次：删除到期的待删除文件，并按 TOMBSTONE_PURGE_INTERVAL 清除过期的删除标记
+    :return: 是否还有到期的待删除文件（本批已满）
+    """
+    with app.app_context():
+        try:
+            deleted, failed = purge_pending_files()
+            now = datetime.utcnow()
+            storage_purge_stats['last_run_at'] = now
+            
+            interval = app.config['TOMBSTONE_PURGE_INTERVAL']
+            last_purged_at = storage_purge_stats['tombstones_purged_at']
+            if interval and (last_purged_at is None or (now - last_purged_at).total_seconds() >= interval):
+                storage_purge_stats['tombstones_purged_at'] = now
+                storage_purge_stats['tombstones_purged'] += purge_tombstones()
+        except Exception:
+            db.session.rollback()
+            raise
+    return deleted + failed >= app.config['STORAGE_PURGE_BATCH_SIZE']
+
+# 存储文件后台清理线程（删除照片后唤醒，并定期重试失败的删除）
+storage_purger = BackgroundWorker(
+    run_storage_purge,
+    interval=app.config['STORAGE_PURGE_INTERVAL'],
+    name='storage-purger'
+)
+
+def recover_processing_photos(batch_size=100):
+    """
+    重新提交丢失的缩略图生成任务：任务只保存在worker进程内存中，worker被回收、超时被杀或重新部署时会丢失，
+    照片一直处于 processing 状态。处理中超过 PROCESSING_TIMEOUT 秒的照片从存储读取原图重新生成。
+    通过条件更新 updated_at 认领照片，多个worker同时检查时每张照片只由一个worker重新提交
+    :return: 重新提交的任务数
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['PROCESSING_TIMEOUT'])
+    photos = Photo.query.filter(Photo.status == 'processing', Photo.updated_at < cutoff)\
+                        .order_by(Photo.updated_at).limit(batch_size).all()
+    submitted = set()
+    for photo in photos:
+        claimed = Photo.query.filter(
+            Photo.id == photo.id, Photo.status == 'processing', Photo.updated_at == photo.updated_at
+        ).update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        # 内容去重的照片共享原图，每个原图只生成一次
+        if claimed and photo.oss_key not in submitted:
+            submitted.add(photo.oss_key)
+            derivative_queue.submit(derivative_job(photo))
+    if submitted:
+        print(f"警告: {len(submitted)} 个缩略图生成任务超过 {app.config['PROCESSING_TIMEOUT']} 秒未完成，已重新提交")
+    return len(submitted)
+
+def run_processing_recovery():
+    with app.app_context():
+        try:
+            recover_processing_photos()
+        except Exception:
+            db.session.rollback()
+            raise
+
+# 丢失的缩略图生成任务恢复线程
+processing_recovery = BackgroundWorker(
+    run_processing_recovery,
+    interval=app.config['PROCESSING_RECOVERY_INTERVAL'],
+    name='processing-recovery'
+)
+
+@app.before_request
+def start_background_workers():
+    # 每个worker进程首次处理请求时启动，处理上次退出前未完成的删除、丢失的缩略图任务及过期的上传会话
+    storage_purger.start()
+    if app.config['PROCESSING_RECOVERY_INTERVAL']:
+        processing_recovery.start()
+    if app.config['UPLOAD_SESSION_GC_INTERVAL']:
+        upload_session_gc.start()
+
+# 存储对账扫描的key前缀（原图、缩略图、衍生图、按需缩放图）
+RECONCILE_PREFIXES = ('photos/', 'thumbnails/', 'derivatives/', 'resized/')
+
+# 按二进制（码点）顺序比较字符串的排序规则，与存储列表顺序一致；SQLite 默认即为二进制比较
+BINARY_COLLATIONS = {'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+def referenced_keys_query():
+    """
+    数据库中引用的全部存储key（按key排序，每个key一行）
+    :return: 查询，列为 key, kind（original/thumbnail/derivative/resized/pending/upload）,
+             expected（1 表示文件应存在，缺失时报告；0 表示仅防止被当作孤立文件删除）
+    """
+    live = Photo.deleted_at.is_(None)
+    sources = db.union_all(
+        db.select(Photo.oss_key.label('key'), db.literal('original').label('kind'), db.literal(1).label('expected'))
+          .where(live, Photo.oss_key.isnot(None)),
+        # 缩略图生成完成后才应存在
+        db.select(Photo.oss_thumbnail_key, db.literal('thumbnail'), db.case((Photo.status == 'ready', 1), else_=0))
+          .where(live, Photo.oss_thumbnail_key.isnot(None)),
+        db.select(PhotoBlob.oss_key, db.literal('original'), db.literal(0)),
+        db.select(PhotoBlob.oss_thumbnail_key, db.literal('thumbnail'), db.literal(0)),
+        db.select(PhotoDerivative.key,
+                  db.case((PhotoDerivative.variant.contains('-'), 'resized'), else_='derivative'),
+                  db.literal(1)),
+        # 待后台删除的文件、未完成的分片上传
+        db.select(PendingFileDeletion.file_key, db.literal('pending'), db.literal(0))
+          .where(PendingFileDeletion.is_local == False),
+        db.select(UploadSession.oss_key, db.literal('upload'), db.literal(0))
+          .where(UploadSession.status == 'active'),
+        db.select(UploadSession.oss_thumbnail_key, db.literal('upload'), db.literal(0))
+          .where(UploadSession.status == 'active')
+    ).subquery()
+    key = sources.c.key
+    collation = BINARY_COLLATIONS.get(db.engine.dialect.name)
+    if collation:
+        key = key.collate(collation)
+    return db.select(key, db.func.min(sources.c.kind), db.func.max(sources.c.expected))\
+             .group_by(key).order_by(key)
+
+def ordered(items, key, source):
+    """检查迭代器按key严格递增（数据库排序规则与存储不一致时终止，避免误删）"""
+    previous = None
+    for item in items:
+        current = key(item)
+        if previous is not None and current <= previous:
+            raise Exception(f"{source}未按key字典序返回（{previous!r} 之后为 {current!r}），"
+                            f"请确认数据库按二进制排序比较字符串")
+        previous = current
+        yield item
+
+def reconcile_storage(prefixes=RECONCILE_PREFIXES, delete=False, min_age=86400, chunk_size=1000, report=print):
+    """
+    对账存储文件与数据库：按key排序归并存储文件列表和数据库引用的key（均为流式读取，内存占用与文件数无关），
+    找出孤立文件（存储中存在但数据库未引用）和缺失文件（数据库引用但存储中不存在）。
+    数据库按二进制排序规则排序；归并过程中发现任一方未按key递增返回时终止，此时不删除任何文件
+    :param prefixes: 扫描的key前缀
+    :param delete: 是否删除孤立文件（归并期间写入临时文件，完整归并后每 chunk_size 个批量删除一次）
+    :param min_age: 只处理最后修改时间早于该秒数的孤立文件（上传完成到数据库提交之间的文件不是孤立文件）
+    :param chunk_size: 数据库每次读取的行数，及批量删除的文件数
+    :param report: 逐个文件的报告回调，参数为一行文本
+    :return: 统计字典
+    """
+    prefixes = sorted(set(prefixes))
+    stats = {
+        'objects': 0, 'db_keys': 0,
+        'orphans': 0, 'orphan_bytes': 0, 'recent_orphans': 0,
+        'deleted': 0, 'delete_failed': 0,
+        'missing': Counter(),
+        'elapsed': 0.0
+    }
+    start = time.perf_counter()
+    cutoff = time.time() - min_age
+    
+    def flush(to_delete):
+        if not to_delete:
+            return
+        try:
+            storage.delete_objects(to_delete)
+            stats['deleted'] += len(to_delete)
+        except Exception as e:
+            stats['delete_failed'] += len(to_delete)
+            print(f"警告: 删除 {len(to_delete)} 个孤立文件失败: {e}")
+    
+    def check_missing(row):
+        stats['db_keys'] += 1
+        if row[2] and row[0].startswith(tuple(prefixes)):
+            stats['missing'][row[1]] += 1
+            report(f"缺失\t{row[1]}\t{row[0]}")
+    
+    # 前缀互不包含且已排序，依次列出即为整体有序
+    objects = ordered(chain.from_iterable(storage.list_objects(prefix) for prefix in prefixes),
+                      lambda item: item['key'], '存储文件列表')
+    rows = ordered(db.session.execute(referenced_keys_query().execution_options(yield_per=chunk_size)),
+                   lambda row: row[0], '数据库查询')
+    row = next(rows, None)
+    # 待删除的孤立文件先写入临时文件（每行一个JSON字符串），内存占用与孤立文件数无关
+    orphans = tempfile.TemporaryFile('w+', encoding='utf-8') if delete else None
+    
+    try:
+        for item in objects:
+            key = item['key']
+            stats['objects'] += 1
+            while row is not None and row[0] < key:
+                check_missing(row)
+                row = next(rows, None)
+            if row is not None and row[0] == key:
+                stats['db_keys'] += 1
+                row = next(rows, None)
+                continue
+            
+            last_modified = item.get('last_modified')
+            if last_modified is not None and last_modified > cutoff:
+                stats['recent_orphans'] += 1
+                continue
+            stats['orphans'] += 1
+            stats['orphan_bytes'] += item.get('size') or 0
+            report(f"孤立\t{item.get('size') or 0}\t{key}")
+            if orphans is not None:
+                orphans.write(json.dumps(key) + '\n')
+        
+        while row is not None:
+            check_missing(row)
+            row = next(rows, None)
+        
+        # 归并完整结束（两侧排序均已校验）后才删除
+        if orphans is not None:
+            orphans.seek(0)
+            batch = []
+            for line in orphans:
+                batch.append(json.loads(line))
+                if len(batch) >= chunk_size:
+                    flush(batch)
+                    batch = []
+            flush(batch)
+    finally:
+        if orphans is not None:
+            orphans.close()
+    
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+def create_photo_record(user_id, upload_result, file_name, mime_type, meta, adjust_stats=True):
+    """
+    在当前事务中创建照片记录，并同步检索索引和用户统计（由调用方提交事务）
+    :param upload_result: 上传结果，包含 file_size, file_key, thumbnail_key，以及可选的 sha256
+    :param meta: photo_meta_from 返回的元数据
+    :param adjust_stats: 是否更新用户统计（批量创建时由调用方合并更新）
+    :return: 照片对象（新对象状态为 processing，等待后台生成缩略图；引用已有对象时沿用其状态）
+    """
+    file_key = upload_result['file_key']
+    thumbnail_key = upload_result['thumbnail_key']
+    status = 'processing'
+    
+    if upload_result.get('sha256'):
+        file_key, thumbnail_key, duplicates = acquire_blob(upload_result, mime_type)
+        for duplicate_key in duplicates:
+            # 并发上传了相同内容，删除本次多余的原图
+            try:
+                storage.delete_image(duplicate_key)
+            except Exception as e:
+                print(f"删除重复OSS文件失败: {e}")
+        
+        existing = Photo.query.filter(Photo.oss_key == file_key, Photo.status.in_(['ready', 'processing'])).first()
+        if existing:
+            status = existing.status
+    
+    photo = Photo(
+        title=meta['title'],
+        description=meta['description'],
+        src='',  # 将通过API动态生成
+        thumbnail='',  # 将通过API动态生成
+        date=meta['date'],
+        size=upload_result['file_size'],  # 存储原始字节数
+        location=meta['location'],
+        is_public=meta['is_public'],
+        user_id=user_id,
+        file_name=file_name,
+        oss_key=file_key,
+        oss_thumbnail_key=thumbnail_key,
+        mime_type=mime_type,
+        content_hash=upload_result.get('sha256'),
+        status=status
+    )
+    
+    db.session.add(photo)
+    db.session.flush()
+    search_index.index_photo(photo)
+    if adjust_stats:
+        adjust_user_stats(
+            photo.user_id,
+            total=1,
+            public=1 if photo.is_public else 0,
+            size=photo.size or 0
+        )
+    return photo
 
 # API 模型定义
 auth_ns = Namespace('auth', description='用户认证相关接口')
@@ -227,12 +1400,17 @@ photo_model = api.model('Photo', {
     'description': fields.String(description='照片描述'),
     'src': fields.String(description='照片URL'),
     'thumbnail': fields.String(description='缩略图URL'),
+    'srcset': fields.Raw(description='各尺寸衍生图URL，键为长边像素，如 {"320": "...", "640": "..."}'),
     'date': fields.String(description='拍摄日期'),
     'size': fields.Integer(description='文件大小（字节）'),
     'location': fields.String(description='拍摄地点'),
     'is_public': fields.Boolean(description='是否公开'),
     'file_name': fields.String(description='文件名'),
     'mime_type': fields.String(description='文件类型'),
+    'status': fields.String(description='处理状态：processing（缩略图生成中）/ready/failed'),
+    'src_expires_at': fields.Integer(description='src签名URL过期时间戳（url_mode=signed时返回）'),
+    'thumbnail_expires_at': fields.Integer(description='thumbnail签名URL过期时间戳（url_mode=signed时返回）'),
+    'srcset_expires_at': fields.Integer(description='srcset签名URL最早过期时间戳（url_mode=signed时返回）'),
     'created_at': fields.DateTime(description='创建时间'),
     'updated_at': fields.DateTime(description='更新时间')
 })
@@ -246,7 +1424,9 @@ photos_response_model = api.model('PhotosResponse', {
             'page': fields.Integer(description='当前页码'),
             'per_page': fields.Integer(description='每页数量'),
             'total': fields.Integer(description='总数量'),
-            'pages': fields.Integer(description='总页数')
+            'pages': fields.Integer(description='总页数'),
+            'next_cursor': fields.String(description='下一页游标（游标分页时返回，没有更多数据时为null）'),
+            'has_more': fields.Boolean(description='是否还有更多数据（游标分页时返回）')
         }))
     }))
 })
@@ -259,6 +1439,22 @@ photo_update_model = api.model('PhotoUpdate', {
     'is_public': fields.Boolean(description='是否公开')
 })
 
+batch_ids_model = api.model('PhotoBatchIds', {
+    'ids': fields.List(fields.String, required=True, description='照片ID列表（单次最多 BATCH_MAX_IDS 个）')
+})
+
+batch_visibility_model = api.inherit('PhotoBatchVisibility', batch_ids_model, {
+    'is_public': fields.Boolean(required=True, description='是否公开')
+})
+
+batch_update_model = api.inherit('PhotoBatchUpdate', batch_ids_model, {
+    'title': fields.String(description='照片标题'),
+    'description': fields.String(description='照片描述'),
+    'date': fields.String(description='拍摄日期'),
+    'location': fields.String(description='拍摄地点'),
+    'is_public': fields.Boolean(description='是否公开')
+})
+
 # 仪表板统计模型
 stats_model = api.model('DashboardStats', {
     'success': fields.Boolean(description='请求是否成功', example=True),
@@ -287,6 +1483,36 @@ def handle_errors(f):
             }, 500
     return wrapper
 
+def cached_response(f):
+    """
+    公开接口响应缓存：按 路径+查询参数 缓存成功响应（键含数据版本号，照片数据变更后失效），命中时不访问数据库；
+    响应带 ETag 和 Cache-Control（CDN可缓存），If-None-Match 匹配（弱比较，支持多个ETag及*）时返回304
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        from flask import Response
+        
+        key = request.full_path
+        version, cached = response_cache.get(key)
+        if cached is None:
+            result = f(*args, **kwargs)
+            if isinstance(result, tuple):
+                # 错误响应不缓存
+                return result
+            body = json.dumps(result)
+            cached = {'body': body, 'etag': hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]}
+            response_cache.set(version, key, cached)
+        
+        headers = {
+            'ETag': f'"{cached["etag"]}"',
+            'Cache-Control': app.config['PUBLIC_CACHE_CONTROL']
+        }
+        # 弱比较：代理压缩响应后会把 ETag 改为 W/"..."，客户端回传时仍应返回304
+        if request.if_none_match.contains_weak(cached['etag']):
+            return Response(status=304, headers=headers)
+        return Response(cached['body'], mimetype='application/json', headers=headers)
+    return wrapper
+
 # 认证接口
 @auth_ns.route('/login')
 class Login(Resource):
@@ -504,13 +1730,15 @@ class PhotoList(Resource):
     @api.response(200, 'Success', photos_response_model)
     @api.param('page', '页码', type='integer', default=1)
     @api.param('per_page', '每页数量', type='integer', default=12)
+    @api.param('cursor', '分页游标（传入时使用游标分页，首页传空值，之后传上一页返回的next_cursor）', type='string')
     @api.param('search', '搜索关键词', type='string')
+    @api.param('url_mode', '图片URL模式：api（默认）或 signed（直接返回OSS签名URL）', type='string', default='api')
     @api.param('X-View-Password', '查看密钥（Header）', _in='header', type='string')
     @handle_errors
     def get(self):
         """获取照片列表（登录用户或提供查看密钥可查看所有照片，否则只能查看公开照片）"""
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 12, type=int), 100)
+        per_page = max(1, min(request.args.get('per_page', 12, type=int), 100))
         search = request.args.get('search', '')
         
         # 验证访问权限
@@ -519,26 +1747,23 @@ class PhotoList(Resource):
         # 根据访问类型构建查询
         if access_type in ['viewer', 'user']:
             # 验证通过（查看密钥或登录用户），可以看到所有照片（包括非公开的）
-            query = Photo.query
+            # 同一条SQL中联表加载上传者，避免逐行查询用户（N+1）
+            query = Photo.query.options(db.joinedload(Photo.user))
         else:
             # 验证失败，只能看到公开照片
             query = Photo.query.filter_by(is_public=True)
         
+        rank = None
         if search:
-            query = query.filter(
-                db.or_(
-                    Photo.title.contains(search),
-                    Photo.description.contains(search),
-                    Photo.location.contains(search)
-                )
-            )
+            query, rank = search_index.apply(query, search)
         
-        query = query.order_by(Photo.created_at.desc())
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        try:
+            photos, pagination = paginate_photos(query, page, per_page, rank)
+        except ValueError as e:
+            return invalid_cursor_response(e)
         
         photos_data = []
-        for photo in pagination.items:
-            photo_data = format_photo_data(photo)
+        for photo, photo_data in zip(photos, format_photo_list(photos)):
             # 为查看者和登录用户添加额外信息
             if access_type in ['viewer', 'user']:
                 photo_data['user_id'] = photo.user_id
@@ -550,17 +1775,95 @@ class PhotoList(Resource):
             'success': True,
             'data': {
                 'photos': photos_data,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages
-                },
+                'pagination': pagination,
                 'access_type': access_type,
                 'can_view_private': access_type in ['viewer', 'user']
             }
         }
 
+@photos_ns.route('/changes')
+class PhotoChanges(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @api.response(410, 'Sync token expired', error_model)
+    @api.param('since', '上次同步返回的 next_since（首次同步不传）', type='string')
+    @api.param('limit', '每批最多变更数（最大500）', type='integer', default=100)
+    @api.param('url_mode', '图片URL模式：api（默认）或 signed（直接返回OSS签名URL）', type='string', default='api')
+    @api.param('X-View-Password', '查看密钥（Header）', _in='header', type='string')
+    @handle_errors
+    def get(self):
+        """
+        增量同步：按 (updated_at, id) 顺序返回 since 之后新增/修改的照片（upserts）和已删除或不再可见的照片ID（removed）
+        客户端保存返回的 next_since 用于下次同步，has_more 为 true 时立即继续请求；
+        since 之后的删除标记已被清除（since 早于已清除的删除标记）时返回410，需不带 since 重新全量同步
+        """
+        limit = max(min(request.args.get('limit', 100, type=int), 500), 1)
+        since = request.args.get('since', '')
+        is_authorized, access_type = verify_view_access()
+        can_view_private = access_type in ['viewer', 'user']
+        
+        now = datetime.utcnow()
+        # 最近几秒内的变更暂不返回：并发事务可能以更早的 updated_at 稍后提交
+        settled = now - timedelta(seconds=app.config['SYNC_SETTLE_SECONDS'])
+        query = Photo.query.execution_options(include_deleted=True).filter(Photo.updated_at <= settled)
+        if not can_view_private and not since:
+            query = query.filter(Photo.is_public == True, Photo.deleted_at.is_(None))
+        
+        if since:
+            try:
+                since_at, since_id = decode_cursor(since)
+            except ValueError as e:
+                return invalid_cursor_response(e)
+            # 只有 since 之后的删除标记已被清除时才过期（与 since 本身的时间无关，全量同步可以翻页到很早的记录）
+            purged_through = db.session.query(db.func.max(TombstonePurge.purged_through)).scalar()
+            if purged_through is not None and since_at < purged_through:
+                return {
+                    'success': False,
+                    'error': {
+                        'code': 'SYNC_EXPIRED',
+                        'message': '同步标记已过期',
+                        'details': f"超过 {app.config['SYNC_TOMBSTONE_DAYS']} 天未同步，期间的删除记录已清除，请不带 since 参数重新全量同步"
+                    }
+                }, 410
+            query = query.filter(
+                db.or_(
+                    Photo.updated_at > since_at,
+                    db.and_(Photo.updated_at == since_at, Photo.id > since_id)
+                )
+            )
+            if not can_view_private:
+                # 匿名访问只返回公开照片的新增/修改/删除，以及 since 之后由公开改为非公开的照片，
+                # 从未公开（或 since 时已非公开）的照片不出现在结果中，也不占用 limit
+                query = query.filter(db.or_(Photo.is_public == True, Photo.unpublished_at > since_at))
+        
+        rows = query.order_by(Photo.updated_at, Photo.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        # 已删除的照片（匿名访问时还包括非公开的照片）作为删除返回；首次同步不需要返回删除
+        upserts = [photo for photo in rows if not photo.deleted_at and (can_view_private or photo.is_public)]
+        visible = {photo.id for photo in upserts}
+        removed = [photo.id for photo in rows if photo.id not in visible] if since else []
+        
+        if rows:
+            next_since = encode_position(rows[-1].updated_at, rows[-1].id)
+        elif since:
+            next_since = since
+        else:
+            next_since = encode_position(settled, '')
+        
+        return {
+            'success': True,
+            'data': {
+                'upserts': format_photo_list(upserts),
+                'removed': removed,
+                'next_since': next_since,
+                'has_more': has_more,
+                'access_type': access_type
+            }
+        }
+
 @photos_ns.route('/<string:photo_id>')
 class PhotoDetail(Resource):
     @api.doc(security='Bearer')
@@ -576,7 +1879,7 @@ class PhotoDetail(Resource):
         # 根据访问类型查询照片
         if access_type in ['viewer', 'user']:
             # 验证通过（查看密钥或登录用户），可以查看所有照片
-            photo = Photo.query.filter_by(id=photo_id).first()
+            photo = Photo.query.options(db.joinedload(Photo.user)).filter_by(id=photo_id).first()
         else:
             # 验证失败，只能查看公开照片
             photo = Photo.query.filter_by(id=photo_id, is_public=True).first()
@@ -628,23 +1931,28 @@ class PhotoDetail(Resource):
                 }
             }, 404
         
-        data = request.get_json()
-        
-        if 'title' in data:
-            photo.title = data['title']
-        if 'description' in data:
-            photo.description = data['description']
-        if 'date' in data:
-            photo.date = data['date']
-        if 'location' in data:
-            photo.location = data['location']
-        if 'is_public' in data:
-            photo.is_public = data['is_public']
+        data = request.get_json(silent=True) or {}
+        invalid = validate_photo_changes(data)
+        if invalid:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'INVALID_FIELD_VALUE',
+                    'message': '参数错误',
+                    'details': invalid
+                }
+            }, 400
+        was_public = bool(photo.is_public)
         
-        photo.updated_at = datetime.utcnow()
+        reindex = apply_photo_changes(photo, data)
         
         try:
+            if bool(photo.is_public) != was_public:
+                adjust_user_stats(photo.user_id, public=1 if photo.is_public else -1)
+            if reindex:
+                search_index.index_photo(photo)
             db.session.commit()
+            signed_url_cache.invalidate_photo(photo.id, [photo.oss_key, photo.oss_thumbnail_key])
             return {
                 'success': True,
                 'message': '照片信息更新成功',
@@ -684,24 +1992,15 @@ class PhotoDetail(Resource):
             }, 404
         
         try:
-            # 删除OSS文件
-            if oss_service and photo.oss_key:
-                try:
-                    oss_service.delete_image(photo.oss_key, photo.oss_thumbnail_key)
-                except Exception as e:
-                    print(f"删除OSS文件失败: {e}")
-            
-            # 删除本地文件（兼容性处理）
-            if photo.file_path and os.path.exists(photo.file_path):
-                os.remove(photo.file_path)
-            
-            # 删除本地缩略图
-            thumbnail_path = photo.file_path.replace('uploads/', 'uploads/thumbnails/') if photo.file_path else None
-            if thumbnail_path and os.path.exists(thumbnail_path):
-                os.remove(thumbnail_path)
-            
-            db.session.delete(photo)
+            # 内容去重的OSS对象仅在最后一个引用删除时删除，文件由后台清理线程在提交事务后删除
+            derivatives = delete_photo_records([photo])
             db.session.commit()
+            storage_purger.notify()
+            signed_url_cache.invalidate_photo(
+                photo_id,
+                [photo.oss_key, photo.oss_thumbnail_key],
+                derivatives.get(photo.oss_key, [])
+            )
             
             return {
                 'success': True,
@@ -718,6 +2017,319 @@ class PhotoDetail(Resource):
                 }
             }, 500
 
+# 可修改的照片字段
+PHOTO_EDITABLE_FIELDS = ('title', 'description', 'date', 'location', 'is_public')
+# 写入全文检索索引的字段
+SEARCH_INDEXED_FIELDS = ('title', 'description', 'location')
+# 字符串字段的最大长度（None 表示不限），title 不能为空值
+PHOTO_TEXT_FIELDS = {'title': 200, 'description': None, 'date': 10, 'location': 200}
+
+def validate_photo_changes(data):
+    """
+    校验要修改的照片字段类型
+    :return: 错误说明，合法时返回None
+    """
+    for field, max_length in PHOTO_TEXT_FIELDS.items():
+        if field not in data:
+            continue
+        value = data[field]
+        if value is None and field != 'title':
+            continue
+        if not isinstance(value, str):
+            return f"{field} 必须是字符串"
+        if max_length and len(value) > max_length:
+            return f"{field} 不能超过 {max_length} 个字符"
+    if 'is_public' in data and not isinstance(data['is_public'], bool):
+        return 'is_public 必须是布尔值'
+    return None
+
+def apply_photo_changes(photo, data):
+    """
+    修改照片信息（仅 PHOTO_EDITABLE_FIELDS 中出现在 data 里的字段，调用前需通过 validate_photo_changes 校验）
+    :return: 检索字段（标题、描述、地点）是否有变化（有变化时需更新检索索引）
+    """
+    reindex = any(field in data and data[field] != getattr(photo, field) for field in SEARCH_INDEXED_FIELDS)
+    for field in PHOTO_EDITABLE_FIELDS:
+        if field in data:
+            setattr(photo, field, data[field])
+    photo.updated_at = datetime.utcnow()
+    return reindex
+
+def batch_error(code, message, details, status=400):
+    return {
+        'success': False,
+        'error': {
+            'code': code,
+            'message': message,
+            'details': details
+        }
+    }, status
+
+def load_batch_photos(data, user_id):
+    """
+    校验批量操作的照片ID列表，并一次查询出当前用户的这些照片
+    :return: (去重后的ID列表, {照片ID: 照片}, 错误响应)，校验失败时前两项为None
+    """
+    ids = (data or {}).get('ids')
+    if not isinstance(ids, list) or not ids or not all(isinstance(photo_id, str) for photo_id in ids):
+        return None, None, batch_error('INVALID_BATCH_IDS', '照片ID列表无效', 'ids 必须是非空的照片ID字符串数组')
+    
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > app.config['BATCH_MAX_IDS']:
+        return None, None, batch_error(
+            'BATCH_TOO_LARGE',
+            '照片数量超出限制',
+            f"单次最多操作 {app.config['BATCH_MAX_IDS']} 张照片"
+        )
+    
+    photos = Photo.query.filter(Photo.id.in_(ids), Photo.user_id == user_id).all()
+    return ids, {photo.id: photo for photo in photos}, None
+
+def batch_results(ids, photos, photo_data=None, errors=None):
+    """
+    生成逐个ID的批量操作结果（不存在或不属于当前用户的照片返回 PHOTO_NOT_FOUND）
+    :param photo_data: {照片ID: 照片数据}（可选，附加到成功结果中）
+    :param errors: {照片ID: 错误}（可选，这些照片未修改，作为失败返回）
+    """
+    errors = errors or {}
+    results = []
+    for photo_id in ids:
+        if photo_id in errors:
+            result = {'id': photo_id, 'success': False, 'error': errors[photo_id]}
+        elif photo_id in photos:
+            result = {'id': photo_id, 'success': True}
+            if photo_data is not None:
+                result['photo'] = photo_data[photo_id]
+        else:
+            result = {
+                'id': photo_id,
+                'success': False,
+                'error': {
+                    'code': 'PHOTO_NOT_FOUND',
+                    'message': '照片不存在',
+                    'details': '找不到指定的照片'
+                }
+            }
+        results.append(result)
+    
+    succeeded = len([photo_id for photo_id in photos if photo_id not in errors])
+    return {
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(ids) - succeeded
+    }
+
+def batch_update_photos(data, changes):
+    """批量修改当前用户的照片信息（一次查询、一个事务）"""
+    current_user_id = int(get_jwt_identity())
+    ids, photos, error = load_batch_photos(data, current_user_id)
+    if error:
+        return error
+    
+    # 所有照片设为相同的值，值无效时每张照片均不修改，作为失败返回
+    invalid = validate_photo_changes(changes)
+    if invalid:
+        errors = {
+            photo_id: {'code': 'INVALID_FIELD_VALUE', 'message': '参数错误', 'details': invalid}
+            for photo_id in photos
+        }
+        return {
+            'success': True,
+            'message': '批量更新完成',
+            'data': batch_results(ids, photos, errors=errors)
+        }
+    
+    public_delta = 0
+    try:
+        for photo in photos.values():
+            was_public = bool(photo.is_public)
+            # 只修改公开状态等非检索字段时不重建检索索引
+            if apply_photo_changes(photo, changes):
+                search_index.index_photo(photo)
+            public_delta += int(bool(photo.is_public)) - int(was_public)
+        if public_delta:
+            adjust_user_stats(current_user_id, public=public_delta)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return batch_error('UPDATE_FAILED', '批量更新照片信息失败', str(e), 500)
+    
+    for photo in photos.values():
+        signed_url_cache.invalidate_photo(photo.id, [photo.oss_key, photo.oss_thumbnail_key])
+    updated = list(photos.values())
+    photo_data = dict(zip([photo.id for photo in updated], format_photo_list(updated)))
+    return {
+        'success': True,
+        'message': '批量更新完成',
+        'data': batch_results(ids, photos, photo_data)
+    }
+
+@photos_ns.route('/batch/delete')
+class PhotoBatchDelete(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(batch_ids_model)
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """批量删除照片（一个事务删除记录，文件由后台清理线程批量删除），返回逐个ID的结果"""
+        ids, photos, error = load_batch_photos(request.get_json(silent=True), int(get_jwt_identity()))
+        if error:
+            return error
+        
+        deleted = list(photos.values())
+        try:
+            derivatives = delete_photo_records(deleted)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return batch_error('DELETE_FAILED', '批量删除照片失败', str(e), 500)
+        
+        storage_purger.notify()
+        for photo in deleted:
+            signed_url_cache.invalidate_photo(
+                photo.id,
+                [photo.oss_key, photo.oss_thumbnail_key],
+                derivatives.get(photo.oss_key, [])
+            )
+        
+        return {
+            'success': True,
+            'message': '批量删除完成',
+            'data': batch_results(ids, photos)
+        }
+
+@photos_ns.route('/batch/visibility')
+class PhotoBatchVisibility(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(batch_visibility_model)
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """批量修改照片公开状态，返回逐个ID的结果"""
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data.get('is_public'), bool):
+            return batch_error('INVALID_BATCH_CHANGES', '参数错误', 'is_public 必须是布尔值')
+        return batch_update_photos(data, {'is_public': data['is_public']})
+
+@photos_ns.route('/batch/update')
+class PhotoBatchUpdate(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(batch_update_model)
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """批量修改照片信息（标题、描述、日期、地点、公开状态，所有照片设为相同的值），返回逐个ID的结果"""
+        data = request.get_json(silent=True) or {}
+        changes = {field: data[field] for field in PHOTO_EDITABLE_FIELDS if field in data}
+        if not changes:
+            return batch_error(
+                'INVALID_BATCH_CHANGES',
+                '参数错误',
+                f"至少需要修改一个字段: {', '.join(PHOTO_EDITABLE_FIELDS)}"
+            )
+        return batch_update_photos(data, changes)
+
+photo_check_model = api.model('PhotoCheck', {
+    'sha256': fields.String(required=True, description='文件SHA-256（十六进制）')
+})
+
+photo_instant_model = api.inherit('PhotoInstantUpload', photo_check_model, {
+    'file_name': fields.String(required=True, description='文件名', example='IMG_0001.jpg'),
+    'title': fields.String(description='照片标题'),
+    'description': fields.String(description='照片描述'),
+    'date': fields.String(description='拍摄日期'),
+    'location': fields.String(description='拍摄地点'),
+    'is_public': fields.Boolean(description='是否公开')
+})
+
+def blob_not_found_response():
+    return {
+        'success': False,
+        'error': {
+            'code': 'BLOB_NOT_FOUND',
+            'message': '文件不存在',
+            'details': '没有找到相同内容的文件，请正常上传'
+        }
+    }, 404
+
+@photos_ns.route('/check')
+class PhotoCheck(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(photo_check_model)
+    @api.response(200, 'Success')
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """上传前检查相同内容的文件是否已存在（存在时可调用秒传接口）"""
+        data = request.get_json() or {}
+        blob = find_blob((data.get('sha256') or '').lower(), int(get_jwt_identity()))
+        
+        return {
+            'success': True,
+            'data': {
+                'exists': blob is not None,
+                'blob': {
+                    'sha256': blob.content_hash,
+                    'size': blob.size,
+                    'mime_type': blob.mime_type
+                } if blob else None
+            }
+        }
+
+@photos_ns.route('/instant')
+class PhotoInstantUpload(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(photo_instant_model)
+    @api.response(200, 'Success')
+    @api.response(404, 'Not Found', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """秒传：引用已存在的相同内容文件创建照片，无需上传文件"""
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        blob = find_blob((data.get('sha256') or '').lower(), int(current_user_id))
+        
+        if not blob:
+            return blob_not_found_response()
+        
+        file_name = data.get('file_name') or blob.oss_key.rsplit('/', 1)[-1]
+        try:
+            photo = create_photo_record(
+                int(current_user_id),
+                {
+                    'file_size': blob.size,
+                    'file_key': blob.oss_key,
+                    'thumbnail_key': blob.oss_thumbnail_key,
+                    'sha256': blob.content_hash,
+                    'reused': True
+                },
+                file_name,
+                blob.mime_type or mimetypes.guess_type(file_name)[0] or 'image/jpeg',
+                photo_meta_from(data)
+            )
+        except BlobReleasedError:
+            db.session.rollback()
+            return blob_not_found_response()
+        db.session.commit()
+        
+        if photo.status == 'processing':
+            derivative_queue.submit(derivative_job(photo))
+        
+        return {
+            'success': True,
+            'message': '照片秒传成功',
+            'data': {
+                'photo': format_photo_data(photo)
+            }
+        }
+
 @photos_ns.route('/upload')
 class PhotoUpload(Resource):
     @api.doc(security='Bearer')
@@ -764,7 +2376,7 @@ class PhotoUpload(Resource):
             }, 415
         
         # 检查OSS服务是否可用
-        if not oss_service:
+        if not storage:
             return {
                 'success': False,
                 'error': {
@@ -774,6 +2386,7 @@ class PhotoUpload(Resource):
                 }
             }, 500
         
+        upload_result = None
         try:
             # 生成唯一文件名
             file_ext = file.filename.rsplit('.', 1)[1].lower()
@@ -782,36 +2395,29 @@ class PhotoUpload(Resource):
             # 获取文件信息
             mime_type = mimetypes.guess_type(file.filename)[0] or 'image/jpeg'
             
-            # 上传到OSS
-            upload_result = oss_service.upload_image(file, unique_filename)
-            
-            # 获取表单数据
-            title = request.form.get('title', 'Unnamed')
-            description = request.form.get('description', '')
-            date = request.form.get('date', '')
-            location = request.form.get('location', '')
-            is_public = request.form.get('is_public', 'false').lower() == 'true'
+            # 上传原图到OSS（内容已存在时直接引用），缩略图由后台任务生成
+            upload_result = store_upload(file, unique_filename)
+            meta = photo_meta_from(request.form)
             
             # 创建照片记录 - 不再存储直接URL，而是存储OSS key
-            photo = Photo(
-                title=title,
-                description=description,
-                src='',  # 将通过API动态生成
-                thumbnail='',  # 将通过API动态生成
-                date=date,
-                size=upload_result['file_size'],  # 存储原始字节数
-                location=location,
-                is_public=is_public,
-                user_id=int(current_user_id),
-                file_name=file.filename,
-                oss_key=upload_result['file_key'],
-                oss_thumbnail_key=upload_result['thumbnail_key'],
-                mime_type=mime_type
-            )
-            
-            db.session.add(photo)
+            try:
+                photo = create_photo_record(int(current_user_id), upload_result, file.filename, mime_type, meta)
+            except BlobReleasedError:
+                # 引用的相同内容文件刚被删除，改为上传本次的文件
+                db.session.rollback()
+                upload_result = put_spooled_upload({
+                    'path': upload_result['source_path'],
+                    'size': upload_result['file_size'],
+                    'sha256': upload_result['sha256']
+                }, unique_filename)
+                photo = create_photo_record(int(current_user_id), upload_result, file.filename, mime_type, meta)
             db.session.commit()
             
+            if photo.status == 'processing':
+                derivative_queue.submit(derivative_job(photo, upload_result['source_path']))
+            else:
+                _remove_source_file(upload_result)
+            
             return {
                 'success': True,
                 'message': '照片上传成功',
@@ -821,6 +2427,11 @@ class PhotoUpload(Resource):
             }
             
         except Exception as e:
+            db.session.rollback()
+            if upload_result:
+                _remove_source_file(upload_result)
+                if not upload_result['reused']:
+                    queue_file_deletions([upload_result['file_key']])
             return {
                 'success': False,
                 'error': {
@@ -830,100 +2441,810 @@ class PhotoUpload(Resource):
                 }
             }, 500
 
-# 仪表板统计接口
-@dashboard_ns.route('/stats')
-class DashboardStats(Resource):
-    @api.doc(security='Bearer')
-    @api.response(200, 'Success', stats_model)
-    @jwt_required()
-    @handle_errors
-    def get(self):
-        """获取仪表板统计信息"""
-        current_user_id = get_jwt_identity()
+def batch_upload_results(files, user_id, meta):
+    """
+    批量上传处理流程，逐行生成 NDJSON 结果:
+    1. 线程池并发将各文件写入临时文件并计算SHA-256
+    2. 一次查询已存在的相同内容（直接引用），批次内相同内容只上传一次
+    3. 线程池并发上传原图，每次将已完成的一批文件在一个事务中创建照片记录并返回结果，再提交缩略图任务
+    """
+    def line(data):
+        return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+    
+    def failure(entry, code, message, details):
+        return line({
+            'index': entry['index'],
+            'file_name': entry['file_name'],
+            'success': False,
+            'error': {'code': code, 'message': message, 'details': details}
+        })
+    
+    def remove_source(entry):
+        if entry.get('source'):
+            _remove_source_file({'source_path': entry['source']['path']})
+    
+    def leader_keys(group):
+        """本批中由本次请求上传（未引用已有文件）的原图及缩略图key"""
+        return [
+            key
+            for entry in group if entry.get('leader') and entry.get('upload_result')
+            for key in (entry['upload_result']['file_key'], entry['upload_result']['thumbnail_key'])
+        ]
+    
+    def commit_group(group):
+        """在一个事务中为一批已上传的文件创建照片记录"""
+        try:
+            photos = [
+                create_photo_record(
+                    user_id,
+                    entry['upload_result'],
+                    entry['file_name'],
+                    mimetypes.guess_type(entry['file_name'])[0] or 'image/jpeg',
+                    meta,
+                    adjust_stats=False
+                )
+                for entry in group
+            ]
+            adjust_user_stats(
+                user_id,
+                total=len(photos),
+                public=len(photos) if meta['is_public'] else 0,
+                size=sum(photo.size or 0 for photo in photos)
+            )
+            db.session.commit()
+        except BlobReleasedError as e:
+            # 引用的相同内容文件刚被删除（临时文件已删除，无法改为上传），这些文件返回失败，其余文件重新创建
+            db.session.rollback()
+            released = [entry for entry in group if entry['upload_result']['sha256'] == e.content_hash]
+            rest = [entry for entry in group if entry['upload_result']['sha256'] != e.content_hash]
+            for entry in released:
+                entry['committed'] = True
+            return [
+                failure(entry, 'BLOB_RELEASED', '照片上传失败', '相同内容的文件已被删除，请重新上传')
+                for entry in released
+            ] + (commit_group(rest) if rest else [])
+        except Exception as e:
+            db.session.rollback()
+            for entry in group:
+                entry['committed'] = True
+                remove_source(entry)
+            queue_file_deletions(leader_keys(group))
+            return [failure(entry, 'UPLOAD_FAILED', '照片上传失败', str(e)) for entry in group]
         
-        # 统计照片数量
-        total_photos = Photo.query.filter_by(user_id=int(current_user_id)).count()
-        public_photos = Photo.query.filter_by(user_id=int(current_user_id), is_public=True).count()
-        private_photos = total_photos - public_photos
+        # 相同内容只提交一次缩略图任务（有临时文件时读取临时文件，否则从存储读取原图），其余临时文件直接删除
+        submitted = set()
+        for entry, photo in zip(group, photos):
+            entry['committed'] = True
+            source_path = entry['upload_result']['source_path']
+            if photo.status == 'processing' and photo.oss_key not in submitted:
+                submitted.add(photo.oss_key)
+                derivative_queue.submit(derivative_job(photo, source_path))
+                if source_path:
+                    entry['source'] = None
+                    continue
+            remove_source(entry)
+        return [
+            line({'index': entry['index'], 'file_name': entry['file_name'], 'success': True, 'photo': photo_data})
+            for entry, photo_data in zip(group, format_photo_list(photos))
+        ]
+    
+    succeeded = failed = 0
+    entries = []
+    for index, file in enumerate(files):
+        entry = {'index': index, 'file': file, 'file_name': file.filename, 'source': None}
+        if allowed_file(file.filename):
+            entries.append(entry)
+        else:
+            failed += 1
+            yield failure(entry, 'INVALID_FILE_TYPE', '不支持的文件类型', '只支持 jpg, jpeg, png, gif, webp 格式的图片文件')
+    
+    executor = ThreadPoolExecutor(max_workers=app.config['BATCH_UPLOAD_WORKERS'])
+    pending = {}
+    try:
+        # 1. 并发写入临时文件并计算SHA-256
+        spooling = [(entry, executor.submit(storage.spool_upload, entry['file'])) for entry in entries]
+        valid = []
+        for entry, future in spooling:
+            try:
+                entry['source'] = future.result()
+            except Exception as e:
+                failed += 1
+                yield failure(entry, 'UPLOAD_FAILED', '照片上传失败', str(e))
+                continue
+            if entry['source']['size'] > app.config['MAX_CONTENT_LENGTH']:
+                remove_source(entry)
+                failed += 1
+                yield failure(entry, 'FILE_TOO_LARGE', '文件过大', f"单个文件不能超过 {app.config['MAX_CONTENT_LENGTH']} 字节")
+                continue
+            valid.append(entry)
         
-        # 计算总文件大小
-        photos = Photo.query.filter_by(user_id=int(current_user_id)).all()
-        total_size_bytes = 0
-        for photo in photos:
-            # 直接使用存储的文件大小
-            if photo.size:
-                total_size_bytes += photo.size
+        # 2. 一次查询已存在的相同内容；批次内相同内容由第一个文件上传，其余文件等待其完成
+        hashes = list({entry['source']['sha256'] for entry in valid})
+        blobs = {blob.content_hash: blob for blob in PhotoBlob.query.filter(PhotoBlob.content_hash.in_(hashes)).all()} if hashes else {}
+        reused, leaders, followers = [], {}, {}
+        for entry in valid:
+            source = entry['source']
+            blob = blobs.get(source['sha256'])
+            if blob or source['sha256'] in leaders:
+                entry['upload_result'] = {
+                    'file_size': source['size'],
+                    'file_key': blob.oss_key if blob else None,
+                    'thumbnail_key': blob.oss_thumbnail_key if blob else None,
+                    'sha256': source['sha256'],
+                    'source_path': None,
+                    'reused': True
+                }
+                remove_source(entry)
+                if blob:
+                    reused.append(entry)
+                else:
+                    followers[source['sha256']].append(entry)
+            else:
+                entry['leader'] = True
+                leaders[source['sha256']] = entry
+                followers[source['sha256']] = []
         
-        total_size_str = get_file_size_string(total_size_bytes)
+        if reused:
+            for result in commit_group(reused):
+                yield result
         
-        # 获取最近上传的照片
-        recent_photos = Photo.query.filter_by(user_id=int(current_user_id))\
-                                  .order_by(Photo.created_at.desc())\
-                                  .limit(5).all()
+        # 3. 并发上传，已完成的文件按批创建记录并返回结果
+        for sha256, entry in leaders.items():
+            file_ext = entry['file_name'].rsplit('.', 1)[1].lower()
+            future = executor.submit(put_spooled_upload, entry['source'], f"{uuid.uuid4()}.{file_ext}")
+            pending[future] = entry
         
-        recent_uploads = []
-        for photo in recent_photos:
-            recent_uploads.append(format_photo_data(photo))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            group = []
+            for future in done:
+                entry = pending.pop(future)
+                dependants = followers[entry['source']['sha256']]
+                try:
+                    entry['upload_result'] = future.result()
+                except Exception as e:
+                    entry['source'] = None  # 上传失败时临时文件已删除
+                    for item in [entry] + dependants:
+                        failed += 1
+                        yield failure(item, 'UPLOAD_FAILED', '照片上传失败', str(e))
+                    continue
+                for item in dependants:
+                    item['upload_result'].update(
+                        file_key=entry['upload_result']['file_key'],
+                        thumbnail_key=entry['upload_result']['thumbnail_key']
+                    )
+                group.extend([entry] + dependants)
+            
+            if group:
+                for result in commit_group(group):
+                    yield result
         
-        return {
-            'success': True,
-            'data': {
-                'total_photos': total_photos,
-                'public_photos': public_photos,
-                'private_photos': private_photos,
-                'total_size': total_size_str,
-                'recent_uploads': recent_uploads
-            }
-        }
+        succeeded = len(files) - failed
+    finally:
+        # 客户端断开连接时，已上传但尚未创建记录的原图加入待删除队列
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future, entry in pending.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                entry['upload_result'] = future.result()
+        queue_file_deletions(leader_keys([entry for entry in entries if not entry.get('committed')]))
+        for entry in entries:
+            remove_source(entry)
+    
+    yield line({'done': True, 'total': len(files), 'succeeded': succeeded, 'failed': failed})
 
-# 公开访问接口
-@public_ns.route('/photos')
-class PublicPhotoList(Resource):
-    @api.response(200, 'Success', photos_response_model)
-    @api.param('page', '页码', type='integer', default=1)
-    @api.param('per_page', '每页数量', type='integer', default=12)
+@photos_ns.route('/upload/batch', endpoint='photo_batch_upload')
+class PhotoBatchUpload(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success（application/x-ndjson，每行一个文件的结果，最后一行为汇总）')
+    @api.response(400, 'Bad Request', error_model)
+    @jwt_required()
     @handle_errors
-    def get(self):
-        """获取公开照片列表"""
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 12, type=int), 100)
-        
-        query = Photo.query.filter_by(is_public=True).order_by(Photo.created_at.desc())
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        photos_data = []
-        for photo in pagination.items:
-            photos_data.append(format_photo_data(photo))
+    def post(self):
+        """
+        批量上传照片（表单字段 files 可重复；title/description/date/location/is_public 应用于所有照片）
+        以 NDJSON 流式返回每个文件的处理结果，客户端可据此显示进度
+        """
+        from flask import Response, stream_with_context
         
-        return {
-            'success': True,
-            'data': {
-                'photos': photos_data,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages
-                }
-            }
-        }
-
-@public_ns.route('/photos/<string:photo_id>')
-class PublicPhotoDetail(Resource):
-    @api.response(200, 'Success')
-    @api.response(404, 'Not Found', error_model)
-    @handle_errors
-    def get(self, photo_id):
-        """获取公开照片详情"""
-        photo = Photo.query.filter_by(id=photo_id, is_public=True).first()
+        current_user_id = int(get_jwt_identity())
+        files = [file for file in request.files.getlist('files') if file.filename]
         
-        if not photo:
+        if not files:
             return {
                 'success': False,
                 'error': {
-                    'code': 'PHOTO_NOT_FOUND',
-                    'message': '照片不存在',
-                    'details': '找不到指定的照片或照片未公开'
+                    'code': 'NO_FILE',
+                    'message': '没有选择文件',
+                    'details': '请在 files 字段中选择要上传的图片文件'
+                }
+            }, 400
+        
+        if len(files) > app.config['BATCH_UPLOAD_MAX_FILES']:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'TOO_MANY_FILES',
+                    'message': '文件数量超出限制',
+                    'details': f"单次最多上传 {app.config['BATCH_UPLOAD_MAX_FILES']} 个文件"
+                }
+            }, 400
+        
+        # 检查OSS服务是否可用
+        if not storage:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'OSS_UNAVAILABLE',
+                    'message': 'OSS服务不可用',
+                    'details': '请检查OSS配置'
+                }
+            }, 500
+        
+        return Response(
+            stream_with_context(batch_upload_results(files, current_user_id, photo_meta_from(request.form))),
+            mimetype='application/x-ndjson'
+        )
+
+REQUEST_SIZE_LIMITS['photo_batch_upload'] = 'BATCH_UPLOAD_MAX_CONTENT_LENGTH'
+
+def format_upload_session(session):
+    """格式化分片上传会话，包含已上传分片（用于断点续传）"""
+    return {
+        'session_id': session.id,
+        'status': session.status,
+        'file_name': session.file_name,
+        'total_size': session.total_size,
+        'part_size': app.config['UPLOAD_PART_SIZE'],
+        'uploaded_size': sum(part.size for part in session.parts),
+        'parts': [
+            {'part_number': part.part_number, 'size': part.size, 'etag': part.etag}
+            for part in session.parts
+        ],
+        'photo_id': session.photo_id,
+        'expires_at': session.expires_at.isoformat() if session.expires_at else None
+    }
+
+def upload_size_exceeded_response(size, limit):
+    return {
+        'success': False,
+        'error': {
+            'code': 'FILE_TOO_LARGE',
+            'message': '文件过大',
+            'details': f'文件大小 {size} 字节超过上限 {limit} 字节'
+        }
+    }, 413
+
+def get_upload_session(session_id, user_id, active=True):
+    """
+    获取当前用户的分片上传会话
+    :return: (会话, 错误响应)
+    """
+    session = UploadSession.query.filter_by(id=session_id, user_id=user_id).first()
+    if not session:
+        return None, ({
+            'success': False,
+            'error': {
+                'code': 'SESSION_NOT_FOUND',
+                'message': '上传会话不存在',
+                'details': '找不到指定的上传会话或会话已过期'
+            }
+        }, 404)
+    if active and session.status != 'active':
+        return None, ({
+            'success': False,
+            'error': {
+                'code': 'SESSION_NOT_ACTIVE',
+                'message': '上传会话已结束',
+                'details': f'会话状态为 {session.status}'
+            }
+        }, 409)
+    return session, None
+
+def abort_upload_session(session):
+    """取消OSS分片上传并删除会话（由调用方提交事务）"""
+    if storage:
+        storage.abort_multipart(session.oss_key, session.upload_id)
+    db.session.delete(session)
+
+def gc_upload_sessions():
+    """
+    清理过期未完成的分片上传会话，以及已结束的会话记录
+    通过条件更新 expires_at 认领会话，多个worker同时清理时每个会话只由一个worker处理；
+    认领后清理失败的会话在下一轮（UPLOAD_SESSION_GC_INTERVAL 秒后）重试，期间重新上传分片的会话不会被清理
+    :return: 清理的会话数
+    """
+    now = datetime.utcnow()
+    retry_at = now + timedelta(seconds=app.config['UPLOAD_SESSION_GC_INTERVAL'] or 3600)
+    # 先记下过期时间（提交后对象会重新加载，可能读到其他请求延长后的值）
+    expired = UploadSession.query.with_entities(UploadSession.id, UploadSession.expires_at)\
+                                 .filter(UploadSession.expires_at < now).all()
+    removed = 0
+    for session_id, expires_at in expired:
+        claimed = UploadSession.query.filter(
+            UploadSession.id == session_id, UploadSession.expires_at == expires_at
+        ).update({'expires_at': retry_at}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            continue
+        session = db.session.get(UploadSession, session_id)
+        try:
+            if session.status == 'active':
+                abort_upload_session(session)
+            else:
+                db.session.delete(session)
+            db.session.commit()
+            removed += 1
+        except Exception as e:
+            db.session.rollback()
+            print(f"清理上传会话 {session_id} 失败: {e}")
+    return removed
+
+def run_upload_session_gc():
+    with app.app_context():
+        try:
+            removed = gc_upload_sessions()
+        except Exception:
+            db.session.rollback()
+            raise
+    if removed:
+        print(f"已清理 {removed} 个过期上传会话")
+
+# 过期分片上传会话清理线程
+upload_session_gc = BackgroundWorker(
+    run_upload_session_gc,
+    interval=app.config['UPLOAD_SESSION_GC_INTERVAL'],
+    name='upload-session-gc'
+)
+
+def save_upload_part(session, part_number, etag, size):
+    """
+    记录已上传的分片并延长会话有效期（重复上传同一分片时覆盖）
+    并发上传同一分片时后插入的请求主键冲突，回滚后按覆盖处理
+    """
+    for attempt in range(2):
+        part = db.session.get(UploadPart, (session.id, part_number))
+        if part:
+            part.etag = etag
+            part.size = size
+        else:
+            db.session.add(UploadPart(session_id=session.id, part_number=part_number, etag=etag, size=size))
+        session.expires_at = datetime.utcnow() + timedelta(seconds=app.config['UPLOAD_SESSION_TTL'])
+        try:
+            db.session.commit()
+            return
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+
+upload_session_init_model = api.model('UploadSessionInit', {
+    'file_name': fields.String(required=True, description='文件名', example='IMG_0001.jpg'),
+    'total_size': fields.Integer(description='文件大小（字节，可选）'),
+    'title': fields.String(description='照片标题'),
+    'description': fields.String(description='照片描述'),
+    'date': fields.String(description='拍摄日期'),
+    'location': fields.String(description='拍摄地点'),
+    'is_public': fields.Boolean(description='是否公开')
+})
+
+@photos_ns.route('/uploads')
+class UploadSessionList(Resource):
+    @api.doc(security='Bearer')
+    @api.expect(upload_session_init_model)
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @api.response(415, 'Unsupported media type', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self):
+        """创建分片上传会话（断点续传）"""
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        file_name = data.get('file_name', '')
+        
+        if not file_name:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'NO_FILE_NAME',
+                    'message': '缺少文件名',
+                    'details': '请提供要上传的文件名'
+                }
+            }, 400
+        
+        if not allowed_file(file_name):
+            return {
+                'success': False,
+                'error': {
+                    'code': 'INVALID_FILE_TYPE',
+                    'message': '不支持的文件类型',
+                    'details': '只支持 jpg, jpeg, png, gif, webp 格式的图片文件'
+                }
+            }, 415
+        
+        total_size = data.get('total_size')
+        if total_size is not None and (type(total_size) is not int or total_size <= 0):
+            return {
+                'success': False,
+                'error': {
+                    'code': 'INVALID_TOTAL_SIZE',
+                    'message': '文件大小无效',
+                    'details': 'total_size 应为正整数（字节）'
+                }
+            }, 400
+        if total_size and total_size > app.config['UPLOAD_SESSION_MAX_SIZE']:
+            return upload_size_exceeded_response(total_size, app.config['UPLOAD_SESSION_MAX_SIZE'])
+        
+        if not storage:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'OSS_UNAVAILABLE',
+                    'message': 'OSS服务不可用',
+                    'details': '请检查OSS配置'
+                }
+            }, 500
+        
+        unique_filename = f"{uuid.uuid4()}.{file_name.rsplit('.', 1)[1].lower()}"
+        oss_key = f"photos/{unique_filename}"
+        
+        session = UploadSession(
+            user_id=int(current_user_id),
+            upload_id=storage.init_multipart(oss_key),
+            oss_key=oss_key,
+            oss_thumbnail_key=f"thumbnails/{unique_filename}",
+            file_name=file_name,
+            mime_type=mimetypes.guess_type(file_name)[0] or 'image/jpeg',
+            total_size=total_size,
+            photo_meta=json.dumps(photo_meta_from(data)),
+            expires_at=datetime.utcnow() + timedelta(seconds=app.config['UPLOAD_SESSION_TTL'])
+        )
+        db.session.add(session)
+        db.session.commit()
+        
+        return {
+            'success': True,
+            'message': '上传会话创建成功',
+            'data': {
+                'session': format_upload_session(session)
+            }
+        }
+
+@photos_ns.route('/uploads/<string:session_id>')
+class UploadSessionDetail(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(404, 'Not Found', error_model)
+    @jwt_required()
+    @handle_errors
+    def get(self, session_id):
+        """获取上传会话状态及已上传分片（用于断点续传）"""
+        session, error = get_upload_session(session_id, int(get_jwt_identity()), active=False)
+        if error:
+            return error
+        
+        return {
+            'success': True,
+            'data': {
+                'session': format_upload_session(session)
+            }
+        }
+    
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(404, 'Not Found', error_model)
+    @api.response(409, 'Conflict', error_model)
+    @jwt_required()
+    @handle_errors
+    def delete(self, session_id):
+        """取消上传会话"""
+        session, error = get_upload_session(session_id, int(get_jwt_identity()))
+        if error:
+            return error
+        
+        abort_upload_session(session)
+        db.session.commit()
+        
+        return {
+            'success': True,
+            'message': '上传会话已取消'
+        }
+
+@photos_ns.route('/uploads/<string:session_id>/parts/<int:part_number>')
+class UploadSessionPart(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @api.response(404, 'Not Found', error_model)
+    @api.response(409, 'Conflict', error_model)
+    @jwt_required()
+    @handle_errors
+    def put(self, session_id, part_number):
+        """上传分片（请求体为分片的原始字节，重复上传同一分片会覆盖）"""
+        session, error = get_upload_session(session_id, int(get_jwt_identity()))
+        if error:
+            return error
+        
+        if not 1 <= part_number <= 10000:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'INVALID_PART_NUMBER',
+                    'message': '分片序号无效',
+                    'details': '分片序号范围为 1-10000'
+                }
+            }, 400
+        
+        data = request.get_data()
+        if not data:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'EMPTY_PART',
+                    'message': '分片内容为空',
+                    'details': '请在请求体中提供分片数据'
+                }
+            }, 400
+        
+        # 其他分片加上本分片不能超过声明的文件大小及会话大小上限（重复上传的分片按新大小计算）
+        uploaded = db.session.query(db.func.coalesce(db.func.sum(UploadPart.size), 0)).filter(
+            UploadPart.session_id == session.id,
+            UploadPart.part_number != part_number
+        ).scalar() + len(data)
+        if uploaded > app.config['UPLOAD_SESSION_MAX_SIZE']:
+            return upload_size_exceeded_response(uploaded, app.config['UPLOAD_SESSION_MAX_SIZE'])
+        if session.total_size and uploaded > session.total_size:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'SIZE_EXCEEDED',
+                    'message': '分片总大小超过声明的文件大小',
+                    'details': f'已上传分片共 {uploaded} 字节，声明大小为 {session.total_size} 字节'
+                }
+            }, 400
+        
+        etag = storage.upload_part(session.oss_key, session.upload_id, part_number, data)
+        
+        save_upload_part(session, part_number, etag, len(data))
+        
+        return {
+            'success': True,
+            'data': {
+                'part_number': part_number,
+                'size': len(data),
+                'etag': etag
+            }
+        }
+
+@photos_ns.route('/uploads/<string:session_id>/complete')
+class UploadSessionComplete(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @api.response(404, 'Not Found', error_model)
+    @api.response(409, 'Conflict', error_model)
+    @jwt_required()
+    @handle_errors
+    def post(self, session_id):
+        """完成分片上传并创建照片"""
+        current_user_id = get_jwt_identity()
+        session, error = get_upload_session(session_id, int(current_user_id))
+        if error:
+            return error
+        
+        if not session.parts:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'NO_PARTS',
+                    'message': '没有已上传的分片',
+                    'details': '请先上传文件分片'
+                }
+            }, 400
+        
+        file_size = sum(part.size for part in session.parts)
+        if session.total_size and file_size != session.total_size:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'SIZE_MISMATCH',
+                    'message': '文件大小不一致',
+                    'details': f'已上传 {file_size} 字节，声明大小为 {session.total_size} 字节'
+                }
+            }, 400
+        # 并发上传的分片可能同时通过了分片接口的检查，合并前再次检查
+        if file_size > app.config['UPLOAD_SESSION_MAX_SIZE']:
+            return upload_size_exceeded_response(file_size, app.config['UPLOAD_SESSION_MAX_SIZE'])
+        
+        completed = False
+        try:
+            storage.complete_multipart(
+                session.oss_key,
+                session.upload_id,
+                [(part.part_number, part.etag) for part in session.parts]
+            )
+            completed = True
+            
+            photo = create_photo_record(
+                int(current_user_id),
+                {
+                    'file_size': file_size,
+                    'file_key': session.oss_key,
+                    'thumbnail_key': session.oss_thumbnail_key
+                },
+                session.file_name,
+                session.mime_type,
+                json.loads(session.photo_meta or '{}') or photo_meta_from({})
+            )
+            session.status = 'completed'
+            session.photo_id = photo.id
+            db.session.commit()
+            
+            # 原图已在OSS中，后台任务从OSS读取原图生成缩略图
+            derivative_queue.submit(derivative_job(photo))
+            
+            return {
+                'success': True,
+                'message': '照片上传成功',
+                'data': {
+                    'photo': format_photo_data(photo)
+                }
+            }
+        except Exception as e:
+            db.session.rollback()
+            if completed:
+                # 分片已合并为完整文件，会话无法再次完成：结束会话，文件加入待删除队列（同一事务提交）
+                session.status = 'aborted'
+                queue_file_deletions([session.oss_key])
+            return {
+                'success': False,
+                'error': {
+                    'code': 'UPLOAD_FAILED',
+                    'message': '照片上传失败',
+                    'details': str(e)
+                }
+            }, 500
+
+# 仪表板统计接口
+@dashboard_ns.route('/stats')
+class DashboardStats(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success', stats_model)
+    @api.param('url_mode', '图片URL模式：api（默认）或 signed（直接返回OSS签名URL）', type='string', default='api')
+    @jwt_required()
+    @handle_errors
+    def get(self):
+        """获取仪表板统计信息"""
+        current_user_id = get_jwt_identity()
+        
+        # 读取增量维护的统计行（主键查询），不存在时从照片表聚合生成
+        stats = UserStats.query.get(int(current_user_id))
+        if not stats:
+            stats = compute_user_stats(int(current_user_id))
+            try:
+                db.session.add(stats)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                stats = UserStats.query.get(int(current_user_id))
+        
+        total_photos = stats.total_photos
+        public_photos = stats.public_photos
+        private_photos = total_photos - public_photos
+        total_size_str = get_file_size_string(stats.total_size or 0)
+        
+        # 获取最近上传的照片
+        recent_photos = Photo.query.filter_by(user_id=int(current_user_id))\
+                                  .order_by(Photo.created_at.desc())\
+                                  .limit(5).all()
+        
+        recent_uploads = format_photo_list(recent_photos)
+        
+        return {
+            'success': True,
+            'data': {
+                'total_photos': total_photos,
+                'public_photos': public_photos,
+                'private_photos': private_photos,
+                'total_size': total_size_str,
+                'recent_uploads': recent_uploads
+            }
+        }
+
+@dashboard_ns.route('/cache-stats')
+class CacheStats(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @jwt_required()
+    @handle_errors
+    def get(self):
+        """获取签名URL缓存、公开接口响应缓存命中统计"""
+        return {
+            'success': True,
+            'data': {
+                'signed_url_cache': signed_url_cache.stats(),
+                'response_cache': response_cache.stats()
+            }
+        }
+
+@dashboard_ns.route('/purge-stats')
+class PurgeStats(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @jwt_required()
+    @handle_errors
+    def get(self):
+        """获取待删除文件队列及后台清理统计（队列为全局数据，清理计数为当前进程）"""
+        pending, retrying, oldest = db.session.query(
+            db.func.count(PendingFileDeletion.id),
+            db.func.coalesce(db.func.sum(db.case((PendingFileDeletion.attempts > 0, 1), else_=0)), 0),
+            db.func.min(PendingFileDeletion.created_at)
+        ).one()
+        last_run_at = storage_purge_stats['last_run_at']
+        
+        return {
+            'success': True,
+            'data': {
+                'pending_files': pending,
+                'retrying_files': retrying,
+                'oldest_pending_at': oldest.isoformat() if oldest else None,
+                'files_deleted': storage_purge_stats['files_deleted'],
+                'files_failed': storage_purge_stats['files_failed'],
+                'files_skipped': storage_purge_stats['files_skipped'],
+                'last_error': storage_purge_stats['last_error'],
+                'tombstones_purged': storage_purge_stats['tombstones_purged'],
+                'last_run_at': last_run_at.isoformat() if last_run_at else None
+            }
+        }
+
+# 公开访问接口
+@public_ns.route('/photos')
+class PublicPhotoList(Resource):
+    @api.response(200, 'Success', photos_response_model)
+    @api.param('page', '页码', type='integer', default=1)
+    @api.param('per_page', '每页数量', type='integer', default=12)
+    @api.param('cursor', '分页游标（传入时使用游标分页，首页传空值，之后传上一页返回的next_cursor）', type='string')
+    @api.param('url_mode', '图片URL模式：api（默认）或 signed（直接返回OSS签名URL）', type='string', default='api')
+    @handle_errors
+    @cached_response
+    def get(self):
+        """获取公开照片列表"""
+        page = request.args.get('page', 1, type=int)
+        per_page = max(1, min(request.args.get('per_page', 12, type=int), 100))
+        
+        query = Photo.query.filter_by(is_public=True)
+        try:
+            photos, pagination = paginate_photos(query, page, per_page)
+        except ValueError as e:
+            return invalid_cursor_response(e)
+        
+        photos_data = format_photo_list(photos)
+        
+        return {
+            'success': True,
+            'data': {
+                'photos': photos_data,
+                'pagination': pagination
+            }
+        }
+
+@public_ns.route('/photos/<string:photo_id>')
+class PublicPhotoDetail(Resource):
+    @api.response(200, 'Success')
+    @api.response(404, 'Not Found', error_model)
+    @handle_errors
+    @cached_response
+    def get(self, photo_id):
+        """获取公开照片详情"""
+        photo = Photo.query.filter_by(id=photo_id, is_public=True).first()
+        
+        if not photo:
+            return {
+                'success': False,
+                'error': {
+                    'code': 'PHOTO_NOT_FOUND',
+                    'message': '照片不存在',
+                    'details': '找不到指定的照片或照片未公开'
                 }
             }, 404
         
@@ -934,13 +3255,94 @@ class PublicPhotoDetail(Resource):
             }
         }
 
+# proxy 模式透传给OSS的请求头
+PROXY_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+
+def send_local_file(path, headers=None):
+    """
+    返回本地文件（sendfile 零拷贝），支持 Range/If-None-Match/If-Modified-Since
+    :param path: 本地文件路径
+    :param headers: 附加的响应头
+    """
+    from flask import send_file
+    
+    try:
+        response = send_file(path, conditional=True, etag=True)
+    except FileNotFoundError:
+        return {
+            'success': False,
+            'error': {
+                'code': 'FILE_NOT_FOUND',
+                'message': '文件不存在',
+                'details': '图片文件在存储中不存在'
+            }
+        }, 404
+    response.headers.update(headers or {})
+    response.headers['Cache-Control'] = app.config['IMAGE_PROXY_CACHE_CONTROL']
+    return response
+
+def proxy_image(file_key, headers):
+    """
+    经API流式转发OSS图片，按块读取转发，不在内存中缓存整个文件
+    Range/If-None-Match/If-Modified-Since 透传给存储后端，按文件ETag和修改时间返回 206/304
+    :param file_key: OSS文件key
+    :param headers: 附加的响应头
+    """
+    from flask import Response
+    
+    request_headers = {name: request.headers[name] for name in PROXY_REQUEST_HEADERS if name in request.headers}
+    try:
+        status, response_headers, stream = storage.open_image(file_key, request_headers)
+    except FileNotFoundError:
+        return {
+            'success': False,
+            'error': {
+                'code': 'FILE_NOT_FOUND',
+                'message': '文件不存在',
+                'details': '图片文件在存储中不存在'
+            }
+        }, 404
+    
+    response_headers.update(headers)
+    response_headers['Cache-Control'] = app.config['IMAGE_PROXY_CACHE_CONTROL']
+    if stream is None:
+        response_headers.pop('Content-Length', None)
+        response_headers.pop('Content-Type', None)
+        return Response(status=status, headers=response_headers)
+    
+    # 按块读取；由WSGI服务器在响应结束时关闭文件流（包括HEAD请求、客户端提前断开等未读完响应体的情况）
+    chunk_size = app.config['IMAGE_PROXY_CHUNK_SIZE']
+    body = ClosingIterator(iter(lambda: stream.read(chunk_size), b''), stream.close)
+    return Response(body, status=status, headers=response_headers, direct_passthrough=True)
+
+def load_photo_keys(photo_id):
+    """
+    获取照片的OSS key映射，优先使用缓存，避免每次访问图片都查询数据库
+    :return: {'original', 'thumbnail', 'status', 'variants'}，照片不存在时返回None
+    """
+    photo_keys = signed_url_cache.get_photo_keys(photo_id)
+    if photo_keys is None:
+        photo = Photo.query.filter_by(id=photo_id).first()
+        if not photo:
+            return None
+        
+        photo_keys = {
+            'original': photo.oss_key,
+            'thumbnail': photo.oss_thumbnail_key,
+            'status': photo.status,
+            'variants': load_variant_keys(photo)
+        }
+        # 缩略图生成完成后才缓存，避免其他worker长时间返回占位图
+        if photo.status == 'ready':
+            signed_url_cache.set_photo_keys(photo_id, photo_keys)
+    return photo_keys
+
 def _get_image(photo_id, image_type):
     """获取图片的通用方法"""
     from flask import Response
     
-    photo = Photo.query.filter_by(id=photo_id).first()
-    
-    if not photo:
+    photo_keys = load_photo_keys(photo_id)
+    if photo_keys is None:
         return {
             'success': False,
             'error': {
@@ -950,11 +3352,36 @@ def _get_image(photo_id, image_type):
             }
         }, 404
 
+    # 缩略图尚未生成时重定向到占位图
+    if image_type == 'thumbnail' and photo_keys.get('status', 'ready') != 'ready':
+        return Response(status=302, headers={'Location': app.config['PLACEHOLDER_THUMBNAIL_URL']})
+
     # 根据图片类型选择OSS key
+    variants = photo_keys.get('variants') or {}
+    formats = {}
     if image_type == 'thumbnail':
-        file_key = photo.oss_thumbnail_key
+        file_key = photo_keys.get('thumbnail')
+        formats = variants.get('thumbnail', {})
+    elif image_type.isdigit():
+        # 选择不小于请求尺寸的最小衍生图，没有时返回原图
+        sizes = sorted(int(variant) for variant in variants if variant.isdigit() and int(variant) >= int(image_type))
+        if sizes:
+            image_type = str(sizes[0])
+            formats = variants[image_type]
+            file_key = formats.get('jpeg')
+        else:
+            image_type = 'original'
+            file_key = photo_keys.get('original')
     else:
-        file_key = photo.oss_key
+        file_key = photo_keys.get('original')
+    
+    # 按 Accept 请求头选择 AVIF/WebP 格式，响应随 Accept 变化
+    headers = {}
+    if image_type != 'original':
+        headers['Vary'] = 'Accept'
+        image_format = negotiate_image_format(formats)
+        if image_format != 'jpeg':
+            file_key = formats[image_format]
     
     if not file_key:
         return {
@@ -967,7 +3394,7 @@ def _get_image(photo_id, image_type):
         }, 404
     
     try:
-        if not oss_service:
+        if not storage:
             return {
                 'success': False,
                 'error': {
@@ -978,9 +3405,20 @@ def _get_image(photo_id, image_type):
             }, 500
 
         
-        # 生成临时签名URL并重定向
-        signed_url = oss_service.generate_signed_url(file_key, expires_in_seconds=3600)  # 1小时过期
-        return Response(status=302, headers={'Location': signed_url})
+        # 经API流式转发（客户端无法访问OSS时使用，URL固定可被浏览器缓存）；
+        # 本地文件存储的签名URL本就指向本API，直接转发，省去重定向
+        if app.config['IMAGE_DELIVERY_MODE'] == 'proxy' or storage.proxy_delivery:
+            return proxy_image(file_key, headers)
+        
+        # 获取（缓存的）临时签名URL并重定向
+        signed_url, _ = signed_url_cache.get_url(
+            file_key,
+            image_type,
+            storage.generate_signed_url,
+            app.config['SIGNED_URL_EXPIRES']
+        )
+        headers['Location'] = signed_url
+        return Response(status=302, headers=headers)
         
     except Exception as e:
         return {
@@ -992,7 +3430,83 @@ def _get_image(photo_id, image_type):
             }
         }, 500
 
+# 按需缩放支持的裁剪方式
+RESIZE_FITS = ('contain', 'cover', 'fill')
+
+def render_resized_image(source_key, width, height, fit, image_format):
+    """
+    获取按需缩放的图片
+    已生成过的从存储读取；否则流式读取原图缩放，并将结果保存到存储和衍生图表
+    :return: 图片字节数据
+    """
+    variant = f"{width}x{height}-{fit}"
+    derivative = PhotoDerivative.query.filter_by(
+        source_key=source_key, variant=variant, format=image_format
+    ).first()
+    if derivative:
+        with closing(storage.get_image_stream(derivative.key)) as stream:
+            return stream.read()
+    
+    # 原图按块写入临时文件（小文件留在内存），不一次性读入内存
+    with closing(storage.get_image_stream(source_key)) as stream, \
+            tempfile.SpooledTemporaryFile(max_size=storage.chunk_size) as source:
+        shutil.copyfileobj(stream, source, 1024 * 1024)
+        source.seek(0)
+        content, rendered_width, rendered_height = storage.render_resized(
+            source, width, height, fit, image_format
+        )
+    
+    _, extension, content_type = IMAGE_FORMATS[image_format]
+    stem = source_key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    key = f"resized/{variant}/{stem}.{extension}"
+    storage.put_object(key, content, content_type)
+    
+    try:
+        db.session.add(PhotoDerivative(
+            source_key=source_key,
+            variant=variant,
+            format=image_format,
+            key=key,
+            width=rendered_width,
+            height=rendered_height,
+            size=len(content)
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # 其他worker已生成同一尺寸
+        db.session.rollback()
+    
+    return content
+
+def resize_params_error(details):
+    return {
+        'success': False,
+        'error': {
+            'code': 'INVALID_RESIZE_PARAMS',
+            'message': '缩放参数无效',
+            'details': details
+        }
+    }, 400
+
+# 缩略图生成前使用的占位图
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="300" height="300" viewBox="0 0 300 300">'
+    '<rect width="300" height="300" fill="#e5e7eb"/></svg>'
+)
+
 # 图片访问接口
+@images_ns.route('/placeholder')
+class ImagePlaceholder(Resource):
+    @api.response(200, 'Success')
+    def get(self):
+        """获取缩略图占位图（缩略图生成中时使用）"""
+        from flask import Response
+        return Response(
+            PLACEHOLDER_SVG,
+            mimetype='image/svg+xml',
+            headers={'Cache-Control': 'public, max-age=86400'}
+        )
+
 @images_ns.route('/<string:photo_id>/original')
 class ImageOriginal(Resource):
     @api.doc(security='Bearer')
@@ -1017,17 +3531,274 @@ class ImageThumbnail(Resource):
         """获取缩略图（登录用户或提供查看密钥可访问私有图片）"""
         return _get_image(photo_id, 'thumbnail')
 
+@images_ns.route('/<string:photo_id>/<int:size>')
+class ImageDerivative(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(404, 'Not Found', error_model)
+    @api.response(403, 'Forbidden', error_model)
+    @api.param('X-View-Password', '查看密钥（Header）', _in='header', type='string')
+    @handle_errors
+    def get(self, photo_id, size):
+        """获取指定长边尺寸的衍生图（返回不小于该尺寸的最小衍生图，没有时返回原图）"""
+        return _get_image(photo_id, str(size))
+
+@images_ns.route('/<string:photo_id>/resize')
+class ImageResize(Resource):
+    @api.doc(security='Bearer')
+    @api.response(200, 'Success')
+    @api.response(400, 'Bad Request', error_model)
+    @api.response(404, 'Not Found', error_model)
+    @api.param('w', '目标宽度（须为 RESIZE_ALLOWED_SIZES 之一，省略时按高度等比计算）', type='integer')
+    @api.param('h', '目标高度（须为 RESIZE_ALLOWED_SIZES 之一，省略时按宽度等比计算）', type='integer')
+    @api.param('fit', '裁剪方式：contain（默认）、cover、fill', type='string', default='contain')
+    @api.param('fmt', '输出格式：auto（默认，按Accept协商）、jpeg、webp、avif', type='string', default='auto')
+    @api.param('X-View-Password', '查看密钥（Header）', _in='header', type='string')
+    @handle_errors
+    def get(self, photo_id):
+        """按需缩放图片（首次请求时生成并缓存，之后直接返回缓存）"""
+        from flask import send_file
+        
+        width = request.args.get('w', 0, type=int)
+        height = request.args.get('h', 0, type=int)
+        fit = request.args.get('fit', 'contain')
+        fmt = request.args.get('fmt', 'auto')
+        
+        allowed_sizes = app.config['RESIZE_ALLOWED_SIZES']
+        if not width and not height:
+            return resize_params_error('至少需要指定 w 或 h')
+        if (width and width not in allowed_sizes) or (height and height not in allowed_sizes):
+            return resize_params_error(f"w/h 必须为以下尺寸之一: {', '.join(map(str, allowed_sizes))}")
+        if fit not in RESIZE_FITS:
+            return resize_params_error(f"fit 必须为以下值之一: {', '.join(RESIZE_FITS)}")
+        
+        supported_formats = supported_image_formats()
+        if fmt == 'auto':
+            image_format = negotiate_image_format(supported_formats)
+        elif fmt in supported_formats:
+            image_format = fmt
+        else:
+            return resize_params_error(f"fmt 必须为以下值之一: auto, {', '.join(supported_formats)}")
+        
+        photo_keys = load_photo_keys(photo_id)
+        if photo_keys is None or not photo_keys.get('original'):
+            return {
+                'success': False,
+                'error': {
+                    'code': 'PHOTO_NOT_FOUND',
+                    'message': '照片不存在',
+                    'details': '找不到指定的照片'
+                }
+            }, 404
+        
+        source_key = photo_keys['original']
+        _, extension, content_type = IMAGE_FORMATS[image_format]
+        cache_key = f"{source_key}:{width}x{height}-{fit}:{image_format}"
+        
+        path = resized_image_cache.get(cache_key, f".{extension}")
+        if path is None:
+            if not storage:
+                return {
+                    'success': False,
+                    'error': {
+                        'code': 'OSS_UNAVAILABLE',
+                        'message': 'OSS服务不可用',
+                        'details': '图片存储服务暂时不可用'
+                    }
+                }, 500
+            content = render_resized_image(source_key, width, height, fit, image_format)
+            path = resized_image_cache.set(cache_key, content, f".{extension}")
+        
+        response = send_file(
+            path,
+            mimetype=content_type,
+            max_age=app.config['RESIZE_CACHE_MAX_AGE'],
+            conditional=True
+        )
+        if fmt == 'auto':
+            response.headers['Vary'] = 'Accept'
+        return response
+
 # 文件服务路由
+# 本地文件存储的签名URL访问路由（校验过期时间和HMAC签名）
+@app.route('/api/files/<path:file_key>')
+def local_storage_file(file_key):
+    path = storage.local_path(file_key) if storage else None
+    if not path or not storage.verify_signature(file_key, request.args.get('expires'), request.args.get('signature')):
+        return {
+            'success': False,
+            'error': {
+                'code': 'INVALID_SIGNATURE',
+                'message': '签名无效',
+                'details': '访问地址签名错误或已过期'
+            }
+        }, 403
+    return send_local_file(path)
+
 # 本地文件访问路由（兼容性保留，建议使用OSS）
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+def load_backfill_checkpoint(path):
+    """读取衍生图重新生成的进度文件，不存在时返回初始进度"""
+    if path and os.path.exists(path):
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+    return {'last_key': None, 'processed': 0, 'failed': 0}
+
+def save_backfill_checkpoint(path, state):
+    """原子写入进度文件（先写临时文件再重命名）"""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as checkpoint:
+        json.dump({**state, 'updated_at': datetime.utcnow().isoformat()}, checkpoint)
+    os.replace(tmp_path, path)
+
+def save_backfill_results(results):
+    """
+    保存一批重新生成的衍生图并提交事务（期间已删除的原图，其新生成的文件加入待删除队列），
+    提交后清除相关照片的签名URL缓存（旧衍生图文件已加入待删除队列）
+    :param results: [(任务, build_derivatives 结果)]
+    """
+    if not results:
+        return
+    source_keys = [job['oss_key'] for job, _ in results]
+    live = {row[0] for row in db.session.query(Photo.oss_key).filter(Photo.oss_key.in_(source_keys)).distinct()}
+    for job, result in results:
+        if job['oss_key'] in live:
+            save_derivatives(job['oss_key'], result['derivatives'])
+        else:
+            db.session.add_all([PendingFileDeletion(file_key=item['key']) for item in result['derivatives']])
+    photo_ids = []
+    if live:
+        Photo.query.filter(Photo.oss_key.in_(live), Photo.status != 'ready').update(
+            {'status': 'ready', 'processing_error': None},
+            synchronize_session=False
+        )
+        photo_ids = [row[0] for row in db.session.query(Photo.id).filter(Photo.oss_key.in_(live))]
+    db.session.commit()
+    # 衍生图记录已替换：清除照片映射（所有worker共享的部分）并使公开接口响应缓存失效
+    for photo_id in photo_ids:
+        signed_url_cache.invalidate_photo(photo_id)
+    if photo_ids:
+        response_cache.bump()
+
+def backfill_sources(last_key, chunk_size):
+    """按原图key顺序（keyset分页）分批读取需生成衍生图的原图: (oss_key, 缩略图key, 照片ID)"""
+    while True:
+        query = db.session.query(Photo.oss_key, db.func.min(Photo.oss_thumbnail_key), db.func.min(Photo.id))\
+                          .filter(Photo.oss_key.isnot(None), Photo.oss_thumbnail_key.isnot(None))
+        if last_key is not None:
+            query = query.filter(Photo.oss_key > last_key)
+        rows = query.group_by(Photo.oss_key).order_by(Photo.oss_key).limit(chunk_size).all()
+        if not rows:
+            return
+        yield from rows
+        last_key = rows[-1][0]
+
+def backfill_derivatives(checkpoint=None, workers=None, chunk_size=500, max_rps=0, retries=2,
+                         progress_interval=10, report=print):
+    """
+    为所有照片重新生成缩略图和衍生图（修改尺寸、格式、质量后使用）
+    按原图key顺序分批读取，由进程池并发执行 下载-解码-编码-上传，按顺序保存结果并记录进度，
+    中断后从进度文件继续（每个原图只处理一次，内容去重的照片共享衍生图）
+    :param checkpoint: 进度文件路径（None 表示不记录进度）
+    :param workers: 进程数，默认CPU核数
+    :param chunk_size: 每次读取的原图数，及每次提交事务、记录进度的结果数
+    :param max_rps: 存储请求数上限（次/秒，0表示不限制），每张原图约 1 次下载 + 每个衍生图 1 次上传
+    :param retries: 单张原图失败后的重试次数
+    :param progress_interval: 输出进度的间隔（秒）
+    :return: 统计字典
+    """
+    state = load_backfill_checkpoint(checkpoint)
+    workers = workers or os.cpu_count() or 1
+    total_query = db.session.query(db.func.count(db.distinct(Photo.oss_key)))\
+                            .filter(Photo.oss_key.isnot(None), Photo.oss_thumbnail_key.isnot(None))
+    if state['last_key'] is not None:
+        total_query = total_query.filter(Photo.oss_key > state['last_key'])
+    remaining = total_query.scalar()
+    
+    limiter = RateLimiter(max_rps)
+    # 每张原图的存储请求数，初始按最多生成的衍生图数估计，之后按实际结果的平均值
+    uploads = [0, 0]
+    estimated_uploads = (len(storage.derivative_sizes) + 1) * (len(storage.derivative_formats) + 1)
+    
+    def submit(job):
+        average = uploads[0] / uploads[1] if uploads[1] else estimated_uploads
+        limiter.acquire(1 + average)
+        return pool.submit(build_derivatives, job)
+    
+    stats = {'processed': 0, 'failed': 0, 'elapsed': 0.0}
+    results = []
+    window = deque()
+    start = last_report = time.perf_counter()
+    
+    def flush():
+        save_backfill_results(results)
+        results.clear()
+        save_backfill_checkpoint(checkpoint, state)
+    
+    def finish_oldest():
+        # 按提交顺序取结果，进度（last_key）之前的原图均已处理
+        nonlocal last_report
+        entry = window[0]
+        job, future = entry[0], entry[1]
+        try:
+            result = future.result()
+        except Exception as e:
+            if entry[2] < retries:
+                entry[2] += 1
+                entry[1] = submit(job)
+                return
+            stats['failed'] += 1
+            state['failed'] += 1
+            report(f"生成失败\t{job['oss_key']}\t{e}")
+        else:
+            results.append((job, result))
+            uploads[0] += len(result['derivatives'])
+            uploads[1] += 1
+        window.popleft()
+        stats['processed'] += 1
+        state['processed'] += 1
+        state['last_key'] = job['oss_key']
+        if len(results) >= chunk_size:
+            flush()
+        
+        now = time.perf_counter()
+        if now - last_report >= progress_interval:
+            last_report = now
+            speed = stats['processed'] / (now - start)
+            eta = (remaining - stats['processed']) / speed if speed else 0
+            report(f"进度\t已处理 {stats['processed']}/{remaining}，失败 {stats['failed']}，"
+                   f"{speed:.1f} 张/秒，预计剩余 {eta / 60:.0f} 分钟")
+    
+    # spawn 启动子进程，避免继承父进程的数据库/HTTP连接
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        for oss_key, thumbnail_key, photo_id in backfill_sources(state['last_key'], chunk_size):
+            job = {'photo_id': photo_id, 'oss_key': oss_key, 'thumbnail_key': thumbnail_key, 'source_path': None}
+            window.append([job, submit(job), 0])
+            # 在途任务数保持为进程数的2倍：最早的任务完成即取结果，否则等待
+            while window and (len(window) >= workers * 2 or window[0][1].done()):
+                finish_oldest()
+        while window:
+            finish_oldest()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        flush()
+    
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
 # 初始化数据库
 def init_database():
     """初始化数据库"""
     with app.app_context():
         db.create_all()
+        run_migrations(db)
+        search_index.setup()
         
         # 检查是否存在默认用户
         if not User.query.filter_by(username='vane').first():
@@ -1040,6 +3811,116 @@ def init_database():
             db.session.commit()
             print(f'默认管理员账户创建成功: vane/{app.config["ADMIN_PASSWORD"]}')
 
+@app.cli.command('process-pending')
+def process_pending_command():
+    """为处理中或失败的照片重新生成缩略图（从OSS读取原图）"""
+    photos = Photo.query.filter(Photo.status.in_(['processing', 'failed'])).all()
+    for photo in photos:
+        derivative_queue.submit(derivative_job(photo))
+    print(f'已提交 {len(photos)} 个缩略图生成任务')
+    
+    while derivative_queue.pending:
+        time.sleep(0.5)
+    derivative_queue.shutdown()
+    print('缩略图生成任务已全部完成')
+
+@app.cli.command('gc-upload-sessions')
+def gc_upload_sessions_command():
+    """立即清理过期的分片上传会话（后台线程每隔 UPLOAD_SESSION_GC_INTERVAL 秒自动清理）"""
+    removed = gc_upload_sessions()
+    print(f'已清理 {removed} 个过期上传会话')
+
+@app.cli.command('purge-tombstones')
+def purge_tombstones_command():
+    """清除超过保留期的已删除照片记录（增量同步的删除标记，建议通过cron定期执行）"""
+    purged = purge_tombstones()
+    print(f'已清除 {purged} 条已删除照片记录')
+
+@app.cli.command('purge-storage')
+def purge_storage_command():
+    """立即删除待删除队列中到期的文件（后台清理线程未运行时使用）"""
+    deleted = failed = 0
+    while True:
+        batch_deleted, batch_failed = purge_pending_files()
+        deleted += batch_deleted
+        failed += batch_failed
+        if batch_deleted + batch_failed < app.config['STORAGE_PURGE_BATCH_SIZE']:
+            break
+    remaining = PendingFileDeletion.query.count()
+    print(f'已删除 {deleted} 个文件，失败 {failed} 个，队列中剩余 {remaining} 个（等待重试）')
+
+@app.cli.command('reconcile-storage')
+@click.option('--delete', is_flag=True, help='删除孤立文件（默认只报告）')
+@click.option('--prefix', 'prefixes', multiple=True, help='扫描的key前缀，可多次指定（默认 photos/ thumbnails/ derivatives/ resized/）')
+@click.option('--min-age', default=86400, show_default=True, help='只处理最后修改时间早于N秒的孤立文件')
+@click.option('--chunk-size', default=1000, show_default=True, help='数据库每次读取的行数及批量删除的文件数')
+@click.option('--quiet', is_flag=True, help='不逐个输出孤立/缺失文件，只输出统计')
+def reconcile_storage_command(delete, prefixes, min_age, chunk_size, quiet):
+    """对账存储文件与数据库，报告（或删除）孤立文件，报告缺失的原图/缩略图/衍生图"""
+    if not storage:
+        print('存储服务不可用')
+        return
+    
+    stats = reconcile_storage(
+        prefixes or RECONCILE_PREFIXES,
+        delete=delete,
+        min_age=min_age,
+        chunk_size=chunk_size,
+        report=(lambda line: None) if quiet else print
+    )
+    
+    elapsed = max(stats['elapsed'], 1e-6)
+    print(f"扫描 {stats['objects']} 个文件、{stats['db_keys']} 个数据库key，耗时 {elapsed:.1f} 秒"
+          f"（{stats['objects'] / elapsed:.0f} 文件/秒，{stats['db_keys'] / elapsed:.0f} key/秒）")
+    print(f"孤立文件 {stats['orphans']} 个（{get_file_size_string(stats['orphan_bytes'])}），"
+          f"最近修改而跳过 {stats['recent_orphans']} 个")
+    if delete:
+        print(f"已删除 {stats['deleted']} 个，删除失败 {stats['delete_failed']} 个")
+    missing = ', '.join(f"{kind} {count}" for kind, count in sorted(stats['missing'].items())) or '无'
+    print(f"缺失文件: {missing}")
+
+@app.cli.command('backfill-derivatives')
+@click.option('--checkpoint', default='backfill-derivatives.json', show_default=True, help='进度文件，存在时从上次中断处继续')
+@click.option('--restart', is_flag=True, help='忽略进度文件，从头重新生成')
+@click.option('--workers', type=int, help='进程数（默认CPU核数）')
+@click.option('--chunk-size', default=500, show_default=True, help='每批读取、保存的原图数')
+@click.option('--max-rps', default=0.0, show_default=True, help='存储请求数上限（次/秒，0表示不限制）')
+@click.option('--retries', default=2, show_default=True, help='单张原图失败后的重试次数')
+def backfill_derivatives_command(checkpoint, restart, workers, chunk_size, max_rps, retries):
+    """按当前配置为所有照片重新生成缩略图和衍生图（修改尺寸、格式、质量后执行，可中断后继续）"""
+    if not storage:
+        print('存储服务不可用')
+        return
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    
+    stats = backfill_derivatives(
+        checkpoint=checkpoint,
+        workers=workers,
+        chunk_size=chunk_size,
+        max_rps=max_rps,
+        retries=retries
+    )
+    
+    elapsed = max(stats['elapsed'], 1e-6)
+    print(f"已处理 {stats['processed']} 张原图，失败 {stats['failed']} 张，耗时 {elapsed:.1f} 秒"
+          f"（{stats['processed'] / elapsed:.1f} 张/秒）")
+    if stats['failed']:
+        print("失败的原图已跳过，可使用 --restart 重新执行全部")
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """根据照片表重建用户统计"""
+    total = reconcile_user_stats()
+    print(f'用户统计重建完成，共 {total} 个用户')
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """重建照片全文检索索引"""
+    total = search_index.rebuild()
+    db.session.commit()
+    print(f'全文检索索引重建完成（{search_index.backend.name}），共索引 {total} 张照片')
+
 # JWT 错误处理
 @app.errorhandler(422)
 def handle_unprocessable_entity(e):
@@ -0,0 +1,149 @@
+"""
+缩略图/衍生图生成性能测试：对比全分辨率解码与降分辨率解码（JPEG draft + reducing_gap）
+
+每个 (图片, 模式) 在独立子进程中执行，统计耗时（多次取最小值）和峰值内存。
+降分辨率解码使用 IMAGE_REDUCING_GAP 环境变量（默认2.0）。
+
+用法:
+    python bench_thumbnail.py                     # 生成 48MP/24MP/12MP JPEG 及 12MP PNG 样例图片
+    python bench_thumbnail.py --corpus ./samples  # 使用目录中的真实照片
+    python bench_thumbnail.py --repeat 5 --modes thumbnail,derivatives
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 样例图片: (文件名, 宽, 高, 格式)
+SAMPLE_IMAGES = [
+    ('48mp.jpg', 8000, 6000, 'JPEG'),
+    ('24mp.jpg', 6000, 4000, 'JPEG'),
+    ('12mp.jpg', 4032, 3024, 'JPEG'),
+    ('12mp.png', 4032, 3024, 'PNG')
+]
+
+MODES = ('thumbnail', 'derivatives', 'resize')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+def create_service():
+    """创建仅用于图片处理的存储实例（本地存储，存储目录位于临时目录）"""
+    os.environ.setdefault('LOCAL_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'jiadan-bench-storage'))
+    # 基准测试不生成签名URL，使用随机签名密钥
+    os.environ.setdefault('LOCAL_STORAGE_SECRET', os.urandom(16).hex())
+    from local_storage import LocalStorage
+    return LocalStorage()
+
+def generate_samples(directory):
+    """生成接近真实照片体积的样例图片（噪点+渐变，避免过度压缩）"""
+    from PIL import Image
+
+    paths = []
+    for name, width, height, image_format in SAMPLE_IMAGES:
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            noise = Image.effect_noise((width, height), 48)
+            gradient = Image.linear_gradient('L').resize((width, height))
+            image = Image.merge('RGB', (noise, gradient, Image.blend(noise, gradient, 0.5)))
+            if image_format == 'JPEG':
+                image.save(path, format='JPEG', quality=90)
+            else:
+                image.save(path, format=image_format)
+        paths.append(path)
+    return paths
+
+def peak_rss_mb():
+    """
+    当前进程峰值内存（MB）
+    Linux 读取 /proc/self/status 的 VmHWM（ru_maxrss 会保留 exec 前父进程的峰值）；
+    其他平台使用 ru_maxrss（macOS 单位为字节）
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_worker(mode, path, fast, repeat):
+    """子进程: 执行 repeat 次并输出JSON结果"""
+    service = create_service()
+    if not fast:
+        service.reducing_gap = None
+    base_rss = peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(path, 'rb') as source:
+            if mode == 'thumbnail':
+                service._create_thumbnail(source)
+            elif mode == 'derivatives':
+                for _, image in service._create_derivatives(source):
+                    image.load()
+            else:
+                service.render_resized(source, 640, 640, 'cover')
+        timings.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        'wall_ms': min(timings) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'base_rss_mb': base_rss
+    }))
+
+def measure(mode, path, fast, repeat):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', mode, path,
+         '--fast' if fast else '--full', '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='缩略图/衍生图生成性能测试')
+    parser.add_argument('--corpus', help='样例图片目录（默认生成样例图片）')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数（耗时取最小值）')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"测试项，逗号分隔: {', '.join(MODES)}")
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    parser.add_argument('--fast', dest='fast', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--full', dest='fast', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.fast, args.repeat)
+        return
+
+    if args.corpus:
+        paths = sorted(
+            os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    else:
+        directory = os.path.join(tempfile.gettempdir(), 'jiadan-bench-samples')
+        os.makedirs(directory, exist_ok=True)
+        print(f"生成样例图片: {directory}")
+        paths = generate_samples(directory)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip() in MODES]
+    header = f"{'图片':<16}{'测试项':<14}{'全分辨率(ms)':>14}{'降分辨率(ms)':>14}{'加速':>8}" \
+             f"{'全分辨率峰值(MB)':>18}{'降分辨率峰值(MB)':>18}"
+    print(header)
+    print('-' * len(header))
+    for path in paths:
+        for mode in modes:
+            full = measure(mode, path, False, args.repeat)
+            fast = measure(mode, path, True, args.repeat)
+            print(f"{os.path.basename(path):<16}{mode:<14}"
+                  f"{full['wall_ms']:>14.0f}{fast['wall_ms']:>14.0f}"
+                  f"{full['wall_ms'] / fast['wall_ms']:>7.1f}x"
+                  f"{full['peak_rss_mb']:>18.0f}{fast['peak_rss_mb']:>18.0f}")
+    print(f"\n峰值内存包含导入模块后的基础内存（约 {fast['base_rss_mb']:.0f} MB）")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,566 @@
+import os
+import json
+import hashlib
+import tempfile
+import time
+import threading
+from collections import OrderedDict, Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class LRUCache:
+    """
+    进程内有界LRU缓存（每个gunicorn worker各持有一份）
+    """
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        result = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def set_many(self, items, ttl):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            return self._counters[key]
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def __len__(self):
+        return len(self._data)
+
+class RedisCache:
+    """
+    基于Redis的共享缓存，所有gunicorn worker共用
+    """
+    def __init__(self, url, prefix='jiadan:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def get(self, key):
+        value = self.client.get(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self._key(key) for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key, value, ttl):
+        ttl = int(ttl)
+        if ttl <= 0:
+            return
+        self.client.setex(self._key(key), ttl, json.dumps(value))
+
+    def set_many(self, items, ttl):
+        ttl = int(ttl)
+        if ttl <= 0 or not items:
+            return
+        pipe = self.client.pipeline()
+        for key, value in items.items():
+            pipe.setex(self._key(key), ttl, json.dumps(value))
+        pipe.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self._key(key) for key in keys])
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(self._key(key), amount)
+
+    def get_counter(self, key):
+        value = self.client.get(self._key(key))
+        return int(value) if value is not None else 0
+
+class StatsCounter:
+    """
+    缓存命中统计
+    计数先在进程内累加，累计 flush_every 次或距上次写入超过 flush_interval 秒时批量写入共享缓存，
+    命中本地缓存的请求不会为统计访问Redis；未配置共享缓存时只统计本worker
+    """
+    def __init__(self, local, shared=None, prefix='stats:', flush_every=100, flush_interval=10):
+        self.local = local
+        self.shared = shared
+        self.prefix = prefix
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = Counter()
+        self._flushed_at = time.time()
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        if not amount:
+            return
+        if self.shared is None:
+            self.local.incr(f"{self.prefix}{name}", amount)
+            return
+        with self._lock:
+            self._pending[name] += amount
+            due = (sum(self._pending.values()) >= self.flush_every
+                   or time.time() - self._flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """将进程内累计的计数写入共享缓存（写入失败时保留在本worker的计数中）"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.time()
+        for name, amount in pending.items():
+            try:
+                self.shared.incr(f"{self.prefix}{name}", amount)
+            except Exception:
+                self.local.incr(f"{self.prefix}{name}", amount)
+
+    def get(self, name):
+        """读取计数（先写入本worker尚未写入的部分）"""
+        if self.shared is not None:
+            self.flush()
+            try:
+                return self.shared.get_counter(f"{self.prefix}{name}") + self.local.get_counter(f"{self.prefix}{name}")
+            except Exception:
+                pass
+        return self.local.get_counter(f"{self.prefix}{name}")
+
+class SignedURLCache:
+    """
+    签名URL缓存
+    以 (OSS key, 图片类型) 为键缓存签名URL，在URL过期前 margin 秒失效；
+    同时缓存 照片ID -> OSS key 的映射，使图片访问无需查询数据库。
+    本地LRU在前，可选的共享缓存（Redis）在后。
+    照片删除、衍生图重新生成时 invalidate_photo 只能清除当前worker的本地缓存（及共享缓存），
+    因此照片映射在本地只保留 local_photo_ttl 秒，其他worker最多在该时间内读到旧映射。
+    """
+    def __init__(self, local, shared=None, margin=300, photo_ttl=3600, local_photo_ttl=10):
+        self.local = local
+        self.shared = shared
+        self.margin = margin
+        self.photo_ttl = photo_ttl
+        self.local_photo_ttl = min(local_photo_ttl, photo_ttl)
+        self.counter = StatsCounter(local, shared)
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"读取共享缓存失败: {e}")
+                value = None
+            if value is not None:
+                self.local.set(key, value, self._remaining(value))
+        return value
+
+    def _set(self, key, value, ttl, local_ttl=None):
+        self.local.set(key, value, ttl if local_ttl is None else local_ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception as e:
+                print(f"写入共享缓存失败: {e}")
+
+    def _get_many(self, keys):
+        result = self.local.get_many(keys)
+        missing = [key for key in keys if key not in result]
+        if missing and self.shared is not None:
+            try:
+                shared_values = self.shared.get_many(missing)
+            except Exception as e:
+                print(f"读取共享缓存失败: {e}")
+                shared_values = {}
+            for key, value in shared_values.items():
+                self.local.set(key, value, self._remaining(value))
+            result.update(shared_values)
+        return result
+
+    def _set_many(self, items, ttl):
+        self.local.set_many(items, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set_many(items, ttl)
+            except Exception as e:
+                print(f"写入共享缓存失败: {e}")
+
+    def _delete(self, *keys):
+        self.local.delete(*keys)
+        if self.shared is not None:
+            try:
+                self.shared.delete(*keys)
+            except Exception as e:
+                print(f"删除共享缓存失败: {e}")
+
+    def _count(self, name, amount=1):
+        self.counter.incr(name, amount)
+
+    def _remaining(self, value):
+        if isinstance(value, dict) and 'expires_at' in value:
+            return value['expires_at'] - self.margin - time.time()
+        return self.local_photo_ttl
+
+    @staticmethod
+    def _url_key(file_key, variant):
+        return f"url:{variant}:{file_key}"
+
+    @staticmethod
+    def _photo_key(photo_id):
+        return f"photo:{photo_id}"
+
+    def get_url(self, file_key, variant, signer, expires_in=3600):
+        """
+        获取签名URL，未命中时调用 signer 生成并缓存
+        :param file_key: OSS文件key
+        :param variant: 图片类型（original/thumbnail）
+        :param signer: 签名函数 signer(file_key, expires_in_seconds)
+        :param expires_in: 签名有效期（秒）
+        :return: (签名URL, 过期时间戳)
+        """
+        key = self._url_key(file_key, variant)
+        cached = self._get(key)
+        if cached is not None:
+            self._count('hits')
+            return cached['url'], cached['expires_at']
+
+        self._count('misses')
+        expires_at = int(time.time()) + expires_in
+        url = signer(file_key, expires_in)
+        self._set(key, {'url': url, 'expires_at': expires_at}, expires_in - self.margin)
+        return url, expires_at
+
+    def get_urls(self, items, signer, expires_in=3600):
+        """
+        批量获取签名URL，一次读取缓存，仅对未命中的key签名
+        :param items: (OSS文件key, 图片类型) 列表
+        :param signer: 签名函数 signer(file_key, expires_in_seconds)
+        :param expires_in: 签名有效期（秒）
+        :return: {(file_key, variant): (签名URL, 过期时间戳)}
+        """
+        items = list(dict.fromkeys(item for item in items if item[0]))
+        cache_keys = {item: self._url_key(*item) for item in items}
+        cached = self._get_many(list(cache_keys.values()))
+
+        result = {}
+        signed = {}
+        expires_at = int(time.time()) + expires_in
+        for item, cache_key in cache_keys.items():
+            value = cached.get(cache_key)
+            if value is None:
+                value = {'url': signer(item[0], expires_in), 'expires_at': expires_at}
+                signed[cache_key] = value
+            result[item] = (value['url'], value['expires_at'])
+
+        self._count('hits', len(items) - len(signed))
+        self._count('misses', len(signed))
+        if signed:
+            self._set_many(signed, expires_in - self.margin)
+        return result
+
+    def get_photo_keys(self, photo_id):
+        """获取照片对应的OSS key映射，未缓存时返回None"""
+        return self._get(self._photo_key(photo_id))
+
+    def set_photo_keys(self, photo_id, keys):
+        self._set(self._photo_key(photo_id), keys, self.photo_ttl, local_ttl=self.local_photo_ttl)
+
+    def invalidate_photo(self, photo_id, file_keys=(), derivatives=()):
+        """
+        使照片相关的缓存失效
+        :param photo_id: 照片ID
+        :param file_keys: 照片的OSS key列表
+        :param derivatives: 衍生图 [(variant, OSS key)]
+        """
+        keys = [self._photo_key(photo_id)]
+        for file_key in file_keys:
+            if file_key:
+                keys.extend(self._url_key(file_key, variant) for variant in ('original', 'thumbnail'))
+        keys.extend(self._url_key(file_key, variant) for variant, file_key in derivatives)
+        self._delete(*keys)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        hits = self.counter.get('hits')
+        misses = self.counter.get('misses')
+        total = hits + misses
+        return {
+            'backend': 'redis' if self.shared is not None else 'local',
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'local_entries': len(self.local)
+        }
+
+class ResponseCache:
+    """
+    接口响应缓存（版本号键）
+    缓存键包含数据版本号，照片数据变更时递增版本号，所有旧响应随即失效，无需逐个删除（旧条目按TTL/LRU淘汰）。
+    配置共享缓存（Redis）时版本号和响应在所有worker间共享，版本号在本worker缓存 version_ttl 秒，
+    其他worker上的变更最多在该时间后可见；否则版本号只在本worker内递增，
+    其他worker上的变更要等响应TTL过期后才可见，因此TTL应较短。
+    """
+    VERSION_KEY = 'resp:version'
+
+    def __init__(self, local, shared=None, ttl=30, version_ttl=1):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        # (共享版本号, 本地缓存到期时间)
+        self._version = None
+        self.counter = StatsCounter(local, shared, prefix='resp:stats:')
+
+    def version(self):
+        """当前数据版本号"""
+        if self.shared is not None:
+            cached = self._version
+            if cached is not None and cached[1] > time.time():
+                return cached[0]
+            try:
+                version = self.shared.get_counter(self.VERSION_KEY)
+                # 读取期间本worker可能已递增版本号，版本号只增不减
+                latest = self._version
+                if latest is not None:
+                    version = max(version, latest[0])
+                self._version = (version, time.time() + self.version_ttl)
+                return version
+            except Exception as e:
+                print(f"读取共享缓存失败: {e}")
+        return self.local.get_counter(self.VERSION_KEY)
+
+    def bump(self):
+        """数据已变更：递增版本号（本worker立即使用新版本号）"""
+        self.local.incr(self.VERSION_KEY)
+        if self.shared is not None:
+            try:
+                version = self.shared.incr(self.VERSION_KEY)
+                self._version = (version, time.time() + self.version_ttl)
+            except Exception as e:
+                self._version = None
+                print(f"写入共享缓存失败: {e}")
+
+    @staticmethod
+    def _key(version, key):
+        return f"resp:{version}:{key}"
+
+    def get(self, key):
+        """
+        读取缓存的响应
+        :param key: 请求标识（路径+查询参数）
+        :return: (版本号, 缓存的响应或None)，未命中时用该版本号调用 set
+        """
+        version = self.version()
+        cache_key = self._key(version, key)
+        value = self.local.get(cache_key)
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(cache_key)
+            except Exception as e:
+                print(f"读取共享缓存失败: {e}")
+                value = None
+            if value is not None:
+                self.local.set(cache_key, value, self.ttl)
+        self._count('hits' if value is not None else 'misses')
+        return version, value
+
+    def set(self, version, key, value):
+        """
+        缓存响应（version 为生成响应前读取的版本号，生成期间数据有变更时该条目不会再被读取）
+        """
+        cache_key = self._key(version, key)
+        self.local.set(cache_key, value, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(cache_key, value, self.ttl)
+            except Exception as e:
+                print(f"写入共享缓存失败: {e}")
+
+    def _count(self, name):
+        self.counter.incr(name)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        hits = self.counter.get('hits')
+        misses = self.counter.get('misses')
+        total = hits + misses
+        return {
+            'backend': 'redis' if self.shared is not None else 'local',
+            'version': self.version(),
+            'ttl': self.ttl,
+            'version_ttl': self.version_ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'local_entries': len(self.local)
+        }
+
+class DiskLRUCache:
+    """
+    本地磁盘LRU缓存，总大小超过 max_bytes 时按最近访问时间淘汰
+    同一目录可被多个gunicorn worker共用（写入使用临时文件+原子重命名）
+    """
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key, extension=''):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], f"{name}{extension}")
+
+    def get(self, key, extension=''):
+        """
+        获取缓存文件路径，未命中时返回None
+        命中时更新文件修改时间作为最近访问时间
+        """
+        path = self._path(key, extension)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def set(self, key, data, extension=''):
+        """
+        写入缓存
+        :param data: 字节数据
+        :return: 缓存文件路径
+        """
+        path = self._path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                output.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """淘汰最久未访问的文件，直到总大小降至上限的90%"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def stats(self):
+        """返回缓存文件数和总大小"""
+        entries = list(self._entries())
+        return {
+            'directory': self.directory,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
+
+def create_shared_cache():
+    """根据环境变量创建共享缓存，未配置或不可用时返回None"""
+    redis_url = os.getenv('CACHE_REDIS_URL')
+    if not redis_url:
+        return None
+    try:
+        return RedisCache(redis_url)
+    except ImportError:
+        print("警告: 已配置CACHE_REDIS_URL但未安装redis，使用进程内缓存")
+        return None
+
+shared_cache = create_shared_cache()
+
+# 创建全局签名URL缓存实例
+signed_url_cache = SignedURLCache(
+    LRUCache(max_size=int(os.getenv('SIGNED_URL_CACHE_SIZE', 10000))),
+    shared=shared_cache,
+    margin=int(os.getenv('SIGNED_URL_CACHE_MARGIN', 300)),
+    photo_ttl=int(os.getenv('SIGNED_URL_PHOTO_TTL', 3600)),
+    local_photo_ttl=int(os.getenv('SIGNED_URL_PHOTO_LOCAL_TTL', 10))
+)
+
+# 公开接口响应缓存
+response_cache = ResponseCache(
+    LRUCache(max_size=int(os.getenv('RESPONSE_CACHE_SIZE', 1000))),
+    shared=shared_cache,
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', 30)),
+    version_ttl=float(os.getenv('RESPONSE_CACHE_VERSION_TTL', 1))
+)
+
+# 按需缩放图片的本地磁盘缓存
+resized_image_cache = DiskLRUCache(
+    os.getenv('RESIZE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'jiadan-resized')),
+    max_bytes=int(os.getenv('RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+)
@@ -4,9 +4,14 @@ import os
 # 服务器配置
 bind = "0.0.0.0:9000"
 workers = 4
-worker_class = "sync"
+# 使用线程worker：请求在工作线程中处理，主线程持续向master发送心跳，
+# 批量上传等长请求（NDJSON流式响应）不会因超过 timeout 被master杀死；sync worker处理请求期间不发送心跳
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
 worker_connections = 1000
-timeout = 30
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# 达到 max_requests 重启worker或重新部署时，等待进行中的请求（如大批量上传）完成的时间
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 600))
 keepalive = 2
 
 # 进程配置
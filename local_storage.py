@@ -0,0 +1,296 @@
+import os
+import hmac
+import time
+import shutil
+import hashlib
+import tempfile
+import mimetypes
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from dotenv import load_dotenv
+from storage import Storage
+
+load_dotenv()
+
+class LocalStorage(Storage):
+    """
+    本地文件系统存储
+    文件保存在 LOCAL_STORAGE_DIR 下；签名URL为带过期时间和HMAC签名的本地地址，
+    由 /api/files 路由校验签名后以 sendfile（零拷贝）返回文件
+    """
+    # 签名URL指向本API，图片接口直接转发文件，省去一次重定向
+    proxy_delivery = True
+    # 示例配置中的默认密钥，任何人都能据此伪造签名URL
+    DEFAULT_SECRETS = ('your-jwt-secret-key', 'your-jwt-secret-key-change-in-production', 'your-local-storage-secret')
+
+    def __init__(self):
+        super().__init__()
+
+        # 签名密钥，多个worker需一致
+        secret = os.getenv('LOCAL_STORAGE_SECRET') or os.getenv('JWT_SECRET_KEY')
+        if not secret or secret in self.DEFAULT_SECRETS:
+            raise ValueError("本地存储签名密钥未配置，请设置 LOCAL_STORAGE_SECRET 或 JWT_SECRET_KEY（不能使用示例中的默认值）")
+        self.secret = secret.encode('utf-8')
+
+        self.root = os.path.abspath(os.getenv('LOCAL_STORAGE_DIR', 'storage'))
+        self.url_prefix = os.getenv('LOCAL_STORAGE_URL_PREFIX', '/api/files').rstrip('/')
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, file_key):
+        """文件key对应的本地路径（拒绝越出存储目录或以.开头的key）"""
+        normalized = os.path.normpath(file_key)
+        if os.path.isabs(normalized) or any(part.startswith('.') for part in normalized.split(os.sep)):
+            raise ValueError(f"非法的文件key: {file_key}")
+        return os.path.join(self.root, normalized)
+
+    def _multipart_dir(self, upload_id):
+        if not upload_id.isalnum():
+            raise ValueError(f"非法的upload_id: {upload_id}")
+        return os.path.join(self.root, '.multipart', upload_id)
+
+    @contextmanager
+    def _atomic_path(self, path):
+        """返回临时文件路径，写入完成后原子重命名为 path，避免读取到写了一半的文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, file_key, path, size=None):
+        """复制本地文件到存储目录（Linux 下 shutil.copyfile 使用 sendfile 零拷贝）"""
+        with self._atomic_path(self._path(file_key)) as tmp_path:
+            shutil.copyfile(path, tmp_path)
+
+    def put_object(self, file_key, content, content_type=None):
+        with self._atomic_path(self._path(file_key)) as tmp_path:
+            with open(tmp_path, 'wb') as output:
+                output.write(content)
+
+    def init_multipart(self, file_key):
+        upload_id = os.urandom(16).hex()
+        os.makedirs(self._multipart_dir(upload_id))
+        return upload_id
+
+    def upload_part(self, file_key, upload_id, part_number, data):
+        directory = self._multipart_dir(upload_id)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"分片上传不存在: {upload_id}")
+        with self._atomic_path(os.path.join(directory, f"{part_number:05d}")) as tmp_path:
+            with open(tmp_path, 'wb') as output:
+                output.write(data)
+        return hashlib.md5(data).hexdigest().upper()
+
+    def complete_multipart(self, file_key, upload_id, parts):
+        directory = self._multipart_dir(upload_id)
+        with self._atomic_path(self._path(file_key)) as tmp_path:
+            with open(tmp_path, 'wb') as output:
+                for part_number, _ in parts:
+                    with open(os.path.join(directory, f"{part_number:05d}"), 'rb') as part:
+                        shutil.copyfileobj(part, output, self.chunk_size)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def abort_multipart(self, file_key, upload_id):
+        shutil.rmtree(self._multipart_dir(upload_id), ignore_errors=True)
+
+    def get_image_stream(self, file_key):
+        return open(self._path(file_key), 'rb')
+
+    def open_image(self, file_key, request_headers=None):
+        """
+        按HTTP范围请求/条件请求读取本地文件，与OSS使用相同的ETag/Last-Modified判断
+        只支持单个范围，多范围或格式错误的 Range 按整个文件返回
+        """
+        headers = request_headers or {}
+        try:
+            stream = open(self._path(file_key), 'rb')
+        except (ValueError, FileNotFoundError, IsADirectoryError):
+            raise FileNotFoundError(file_key)
+
+        stat = os.fstat(stream.fileno())
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        response_headers = {
+            'Content-Type': mimetypes.guess_type(file_key)[0] or 'application/octet-stream',
+            'Accept-Ranges': 'bytes',
+            'ETag': etag,
+            'Last-Modified': formatdate(stat.st_mtime, usegmt=True)
+        }
+
+        if self._not_modified(headers, etag, stat.st_mtime):
+            stream.close()
+            return 304, response_headers, None
+
+        byte_range = None
+        if headers.get('Range') and headers.get('If-Range', etag) == etag:
+            byte_range = self._parse_range(headers['Range'], stat.st_size)
+            if byte_range is False:
+                stream.close()
+                response_headers['Content-Range'] = f"bytes */{stat.st_size}"
+                return 416, response_headers, None
+
+        if byte_range is None:
+            response_headers['Content-Length'] = str(stat.st_size)
+            return 200, response_headers, stream
+
+        start, end = byte_range
+        stream.seek(start)
+        response_headers['Content-Length'] = str(end - start + 1)
+        response_headers['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        return 206, response_headers, _FileRange(stream, end - start + 1)
+
+    @staticmethod
+    def _not_modified(headers, etag, mtime):
+        """If-None-Match（弱比较）优先于 If-Modified-Since"""
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def _parse_range(value, size):
+        """
+        解析单个字节范围
+        :return: (起始, 结束)；格式错误或多范围时返回None（返回整个文件），无法满足时返回False
+        """
+        unit, _, spec = value.partition('=')
+        if unit.strip().lower() != 'bytes' or ',' in spec:
+            return None
+        first, sep, last = spec.strip().partition('-')
+        try:
+            if not sep:
+                return None
+            if not first:
+                length = int(last)
+                if length <= 0:
+                    return False
+                return max(size - length, 0), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            return False
+        if start < 0 or end < start:
+            return None
+        return start, min(end, size - 1)
+
+    def download_file(self, file_key, path):
+        try:
+            shutil.copyfile(self._path(file_key), path)
+        except Exception as e:
+            raise Exception(f"下载文件失败: {str(e)}")
+
+    def delete_objects(self, file_keys):
+        for file_key in file_keys:
+            try:
+                os.remove(self._path(file_key))
+            except FileNotFoundError:
+                pass
+
+    def generate_signed_url(self, file_key, expires_in_seconds=3600):
+        expires = int(time.time()) + expires_in_seconds
+        return f"{self.url_prefix}/{quote(file_key)}?expires={expires}&signature={self._sign(file_key, expires)}"
+
+    def verify_signature(self, file_key, expires, signature):
+        """
+        校验签名URL
+        :param expires: URL中的过期时间戳
+        :param signature: URL中的签名
+        :return: 是否有效（签名正确且未过期）
+        """
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._sign(file_key, expires), signature or '')
+
+    def _sign(self, file_key, expires):
+        message = f"{file_key}\n{expires}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def get_file_info(self, file_key):
+        try:
+            stat = os.stat(self._path(file_key))
+            return {
+                'size': stat.st_size,
+                'last_modified': int(stat.st_mtime),
+                'content_type': mimetypes.guess_type(file_key)[0] or 'application/octet-stream',
+                'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            }
+        except Exception as e:
+            raise Exception(f"获取文件信息失败: {str(e)}")
+
+    def list_objects(self, prefix=''):
+        """
+        按key字典序列出文件（跳过临时文件和未完成的分片）
+        只遍历前缀所在的目录，逐个目录排序后递归（目录按 "名称/" 参与排序），不缓存全部key
+        """
+        base = prefix.rsplit('/', 1)[0] if '/' in prefix else ''
+        yield from self._walk_sorted(os.path.join(self.root, base), base, prefix)
+
+    def _walk_sorted(self, directory, key_prefix, prefix):
+        try:
+            with os.scandir(directory) as entries:
+                entries = [
+                    (entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name, entry)
+                    for entry in entries if not entry.name.startswith('.')
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for name, entry in sorted(entries, key=lambda item: item[0]):
+            key = f"{key_prefix}/{name}" if key_prefix else name
+            if name.endswith('/'):
+                if key.startswith(prefix) or prefix.startswith(key):
+                    yield from self._walk_sorted(entry.path, key[:-1], prefix)
+                continue
+            if not key.startswith(prefix):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield {
+                'key': key,
+                'size': stat.st_size,
+                'last_modified': int(stat.st_mtime)
+            }
+
+    def local_path(self, file_key):
+        try:
+            return self._path(file_key)
+        except ValueError:
+            return None
+
+
+class _FileRange:
+    """只读取文件中指定长度的内容（Range响应），关闭时关闭文件"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
@@ -0,0 +1,124 @@
+from datetime import datetime
+from sqlalchemy import inspect, text, Table, Column, Integer, String, DateTime, MetaData
+from sqlalchemy.exc import IntegrityError
+
+# 已执行的迁移记录表
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime)
+)
+
+# 注册的迁移列表: (版本号, 描述, 迁移函数)
+MIGRATIONS = []
+
+def migration(version, description):
+    """
+    注册数据库迁移
+    迁移函数签名为 fn(conn, metadata)，需保证幂等（新建的数据库已由 db.create_all() 建好最新结构）
+    """
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return decorator
+
+def create_missing_indexes(conn, table, names):
+    """
+    创建模型上声明但数据库中不存在的索引
+    :param names: 要创建的索引名
+    :return: 新建的索引名列表
+    """
+    existing = {index['name'] for index in inspect(conn).get_indexes(table.name)}
+    created = []
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(conn)
+            created.append(index.name)
+    return created
+
+def add_missing_columns(conn, table, names):
+    """
+    为已存在的表添加模型上新增的列（ALTER TABLE ADD COLUMN）
+    新增列需允许为空或带有服务端默认值
+    :param names: 要添加的列名
+    :return: 新增的列名列表
+    """
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name not in names or column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        ddl = f"ALTER TABLE {conn.dialect.identifier_preparer.quote(table.name)} " \
+              f"ADD COLUMN {conn.dialect.identifier_preparer.quote(column.name)} {column_type}"
+        if column.server_default is not None:
+            default = column.server_default.arg
+            ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f" DEFAULT {default}"
+        conn.execute(text(ddl))
+        added.append(column.name)
+    return added
+
+def run_migrations(db):
+    """
+    执行尚未执行的迁移（需在应用上下文中、db.create_all() 之后调用）
+    :return: 本次执行的迁移版本号列表
+    """
+    engine = db.engine
+    migration_metadata.create_all(engine)
+
+    with engine.connect() as conn:
+        applied = {row[0] for row in conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version))}
+
+    executed = []
+    for version, description, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                fn(conn, db.metadata)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # 其他进程已执行该迁移
+            continue
+        executed.append(version)
+        print(f"数据库迁移 {version} 已执行: {description}")
+    return executed
+
+@migration(1, '照片列表复合索引 (created_at, id) / (is_public, created_at, id) / (user_id, created_at)')
+def add_photo_list_indexes(conn, metadata):
+    create_missing_indexes(conn, metadata.tables['photo'], [
+        'ix_photo_created_at_id',
+        'ix_photo_public_created_at_id',
+        'ix_photo_user_created_at'
+    ])
+
+@migration(2, '照片处理状态字段 status / processing_error')
+def add_photo_status_columns(conn, metadata):
+    add_missing_columns(conn, metadata.tables['photo'], ['status', 'processing_error'])
+
+@migration(3, '照片内容哈希字段 content_hash 及索引')
+def add_photo_content_hash(conn, metadata):
+    photo = metadata.tables['photo']
+    add_missing_columns(conn, photo, ['content_hash'])
+    create_missing_indexes(conn, photo, ['ix_photo_content_hash'])
+
+@migration(4, '照片软删除字段 deleted_at 及增量同步索引 (updated_at, id)')
+def add_photo_deleted_at(conn, metadata):
+    photo = metadata.tables['photo']
+    add_missing_columns(conn, photo, ['deleted_at'])
+    create_missing_indexes(conn, photo, ['ix_photo_updated_at_id'])
+
+@migration(5, '照片原图key索引 oss_key（按原图更新状态、衍生图批量重新生成）')
+def add_photo_oss_key_index(conn, metadata):
+    create_missing_indexes(conn, metadata.tables['photo'], ['ix_photo_oss_key'])
+
+@migration(6, '照片取消公开时间 unpublished_at（匿名增量同步）')
+def add_photo_unpublished_at(conn, metadata):
+    add_missing_columns(conn, metadata.tables['photo'], ['unpublished_at'])
@@ -1,14 +1,36 @@
 import os
-import uuid
+import socket
+import threading
 import oss2
-from PIL import Image
-import io
-from datetime import datetime, timedelta
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+from storage import Storage
 
 load_dotenv()
 
-class OSSService:
+# OSS批量删除接口单次最多删除的文件数
+BATCH_DELETE_LIMIT = 1000
+
+class KeepAliveAdapter(requests.adapters.HTTPAdapter):
+    """开启TCP keep-alive的连接池，空闲连接不会被中间网络设备静默断开"""
+    def __init__(self, keepalive_idle=60, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive_idle > 0:
+            socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                socket_options += [
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(self.keepalive_idle // 4, 1))
+                ]
+            kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+class OSSService(Storage):
+    """阿里云OSS存储"""
     def __init__(self):
         # 阿里云OSS配置
         self.access_key_id = os.getenv('ALIYUN_ACCESS_KEY_ID')
@@ -19,53 +41,171 @@ class OSSService:
         if not all([self.access_key_id, self.access_key_secret, self.endpoint, self.bucket_name]):
             raise ValueError("阿里云OSS配置不完整，请检查环境变量")
         
-        # 创建OSS认证和bucket对象
+        super().__init__()
+        
+        # 并发I/O线程数（上传原图/缩略图/衍生图、分片上传、批量删除）及连接池配置
+        self.io_workers = max(int(os.getenv('OSS_IO_WORKERS', 8)), 1)
+        # 每个进程同时在内存中等待/上传的分片数上限（与并发上传的请求数无关）
+        self.max_inflight_parts = max(int(os.getenv('OSS_MAX_INFLIGHT_PARTS', 4)), 1)
+        pool_size = max(int(os.getenv('OSS_CONNECTION_POOL_SIZE', 16)), self.io_workers)
+        timeout = (float(os.getenv('OSS_CONNECT_TIMEOUT', 5)), float(os.getenv('OSS_READ_TIMEOUT', 60)))
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._part_slots = None
+        
+        # 创建OSS认证和bucket对象（共享连接池，连接保持复用）
         auth = oss2.Auth(self.access_key_id, self.access_key_secret)
-        self.bucket = oss2.Bucket(auth, self.endpoint, self.bucket_name)
+        session = oss2.Session(adapter=KeepAliveAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            keepalive_idle=int(os.getenv('OSS_TCP_KEEPALIVE', 60))
+        ))
+        self.bucket = oss2.Bucket(auth, self.endpoint, self.bucket_name, session=session, connect_timeout=timeout)
+    
+    def _get_executor(self):
+        """获取I/O线程池及分片信号量（fork后的子进程中重新创建）"""
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='oss-io')
+                self._part_slots = threading.BoundedSemaphore(self.max_inflight_parts)
+                self._executor_pid = os.getpid()
+            return self._executor
     
-    def upload_image(self, file_obj, filename=None):
+    @staticmethod
+    def _in_io_thread():
+        return threading.current_thread().name.startswith('oss-io')
+    
+    def _parallel(self, calls):
         """
-        上传图片到OSS
-        :param file_obj: 文件对象
-        :param filename: 文件名（可选）
-        :return: 文件信息字典
+        在I/O线程池中并发执行多个相互独立的OSS操作
+        同时进行中的操作不超过线程数的2倍，calls 为生成器时边生成边提交（内存占用有上限）；
+        任一操作失败时等待已提交的操作结束后抛出异常。在I/O线程中调用时依次执行，避免线程池互相等待死锁
+        :param calls: 可迭代的 (函数, 参数元组)
+        :return: 各操作的返回值列表（与调用顺序一致）
         """
+        if self._in_io_thread():
+            return super()._parallel(calls)
+        
+        executor = self._get_executor()
+        calls = iter(calls)
+        futures = []
+        pending = set()
         try:
-            # 生成唯一文件名
-            if not filename:
-                filename = f"{uuid.uuid4()}.jpg"
-            
-            # 确保文件名有正确的扩展名
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                filename = f"{filename}.jpg"
-            
-            # 读取文件内容
-            file_obj.seek(0)
-            file_content = file_obj.read()
-            file_size = len(file_content)
-            
-            # 生成文件路径
-            original_key = f"photos/{filename}"
-            thumbnail_key = f"thumbnails/{filename}"
-            
-            # 上传原图
-            result = self.bucket.put_object(original_key, file_content)
-            
-            # 创建缩略图
-            file_obj.seek(0)
-            thumbnail_content = self._create_thumbnail(file_obj)
-            
-            # 上传缩略图
-            self.bucket.put_object(thumbnail_key, thumbnail_content)
+            while True:
+                # 先等待空位再取下一个操作，calls 为生成器时不会提前读取数据
+                if len(pending) >= self.io_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                call = next(calls, None)
+                if call is None:
+                    break
+                fn, args = call
+                future = executor.submit(fn, *args)
+                futures.append(future)
+                pending.add(future)
+        finally:
+            wait(pending)
+        return [future.result() for future in futures]
+    
+    def put_file(self, file_key, path, size=None):
+        """
+        上传本地文件到OSS
+        不超过一个分块时直接流式上传，否则使用分片上传。
+        分片并发上传，读取分片前需取得进程内的分片信号量，因此无论多少请求（含批量上传的 BATCH_UPLOAD_WORKERS 个线程）
+        同时上传，每个进程等待/上传中的分片不超过 OSS_MAX_INFLIGHT_PARTS 个，分片内存上限约为 OSS_MAX_INFLIGHT_PARTS × UPLOAD_CHUNK_SIZE。
+        在I/O线程中调用时分片依次上传（避免线程池互相等待），不占用信号量，每个线程最多持有一个分片
+        :param file_key: 文件key
+        :param path: 本地文件路径
+        :param size: 文件大小（可选）
+        """
+        if size is None:
+            size = os.path.getsize(path)
+        
+        if size <= self.chunk_size:
+            with open(path, 'rb') as source:
+                self.bucket.put_object(file_key, source)
+            return
+        
+        upload_id = self.init_multipart(file_key)
+        try:
+            if self._in_io_thread():
+                slots = None
+            else:
+                self._get_executor()
+                slots = self._part_slots
             
-            return {
-                'file_size': file_size,
-                'file_key': original_key,
-                'thumbnail_key': thumbnail_key
-            }
+            def upload(part_number, chunk):
+                try:
+                    return self.upload_part(file_key, upload_id, part_number, chunk)
+                finally:
+                    if slots:
+                        slots.release()
             
-        except Exception as e:
-            raise Exception(f"上传文件到OSS失败: {str(e)}")
+            with open(path, 'rb') as source:
+                def chunks():
+                    part_number = 1
+                    while True:
+                        if slots:
+                            slots.acquire()
+                        chunk = source.read(self.chunk_size)
+                        if not chunk:
+                            if slots:
+                                slots.release()
+                            break
+                        yield upload, (part_number, chunk)
+                        part_number += 1
+                
+                # 各分片并发上传
+                etags = self._parallel(chunks())
+            self.complete_multipart(file_key, upload_id, list(enumerate(etags, 1)))
+        except Exception:
+            self.abort_multipart(file_key, upload_id)
+            raise
+    
+    def init_multipart(self, file_key):
+        """
+        初始化分片上传
+        :param file_key: 文件key
+        :return: OSS upload_id
+        """
+        return self.bucket.init_multipart_upload(file_key).upload_id
+    
+    def upload_part(self, file_key, upload_id, part_number, data):
+        """
+        上传一个分片
+        :param part_number: 分片序号（1-10000）
+        :param data: 分片内容
+        :return: 分片ETag
+        """
+        return self.bucket.upload_part(file_key, upload_id, part_number, data).etag
+    
+    def complete_multipart(self, file_key, upload_id, parts):
+        """
+        完成分片上传
+        :param parts: [(分片序号, ETag)]，按分片序号排序
+        """
+        self.bucket.complete_multipart_upload(
+            file_key,
+            upload_id,
+            [oss2.models.PartInfo(part_number, etag) for part_number, etag in parts]
+        )
+    
+    def abort_multipart(self, file_key, upload_id):
+        """取消分片上传并清理已上传的分片"""
+        try:
+            self.bucket.abort_multipart_upload(file_key, upload_id)
+        except oss2.exceptions.NoSuchUpload:
+            pass
+    
+    def put_object(self, file_key, content, content_type=None):
+        """
+        上传字节数据
+        :param content_type: MIME类型（可选）
+        """
+        headers = {'Content-Type': content_type} if content_type else None
+        self.bucket.put_object(file_key, content, headers=headers)
     
     def generate_signed_url(self, file_key, expires_in_seconds=3600):
         """
@@ -102,54 +242,62 @@ class OSSService:
         except Exception as e:
             raise Exception(f"获取文件流失败: {str(e)}")
     
-    def delete_image(self, file_key, thumbnail_key=None):
+    def open_image(self, file_key, request_headers=None):
         """
-        删除OSS中的图片
-        :param file_key: 原图文件key
-        :param thumbnail_key: 缩略图文件key
+        按HTTP范围请求/条件请求读取OSS文件（供API代理转发）
+        Range、If-None-Match、If-Modified-Since 等请求头透传给OSS，由OSS按对象ETag和修改时间判断
+        :param file_key: 文件key
+        :param request_headers: 透传的请求头
+        :return: (HTTP状态码, 响应头, 文件流)，304/416 时文件流为None
+        :raises FileNotFoundError: 文件不存在
         """
+        headers = dict(request_headers or {})
+        if 'Range' in headers:
+            # 使用标准HTTP范围语义（超出文件大小时返回416，而不是整个文件）
+            headers['x-oss-range-behavior'] = 'standard'
         try:
-            # 删除原图
-            self.bucket.delete_object(file_key)
-            
-            # 删除缩略图
-            if thumbnail_key:
-                self.bucket.delete_object(thumbnail_key)
-                
-        except Exception as e:
-            raise Exception(f"删除OSS文件失败: {str(e)}")
+            result = self.bucket.get_object(file_key, headers=headers)
+        except oss2.exceptions.NotModified as e:
+            return 304, self._response_headers(e.headers), None
+        except oss2.exceptions.NoSuchKey:
+            raise FileNotFoundError(file_key)
+        except oss2.exceptions.ServerError as e:
+            if e.status == 416:
+                return 416, self._response_headers(e.headers), None
+            raise Exception(f"获取文件流失败: {str(e)}")
+        return result.status, self._response_headers(result.headers), result
     
-    def _create_thumbnail(self, file_obj, size=(300, 300)):
+    @staticmethod
+    def _response_headers(headers):
+        """提取需要转发给客户端的响应头"""
+        names = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+        return {name: headers[name] for name in names if headers.get(name)}
+    
+    def download_file(self, file_key, path):
         """
-        创建缩略图
-        :param file_obj: 文件对象
-        :param size: 缩略图尺寸
-        :return: 缩略图字节数据
+        将OSS文件流式下载到本地文件
+        :param file_key: 文件key
+        :param path: 本地文件路径
         """
         try:
-            # 打开图片
-            image = Image.open(file_obj)
-            
-            # 转换为RGB模式（处理RGBA等格式）
-            if image.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            
-            # 创建缩略图
-            image.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # 保存到字节流
-            output = io.BytesIO()
-            image.save(output, format='JPEG', quality=85)
-            output.seek(0)
-            
-            return output.getvalue()
-            
+            self.bucket.get_object_to_file(file_key, path)
         except Exception as e:
-            raise Exception(f"创建缩略图失败: {str(e)}")
+            raise Exception(f"下载文件失败: {str(e)}")
+    
+    def delete_objects(self, file_keys):
+        """
+        删除多个OSS文件（文件不存在时忽略）
+        多个文件使用批量删除接口，每次最多1000个，多批并发执行
+        :param file_keys: 文件key列表
+        """
+        file_keys = list(dict.fromkeys(file_keys))
+        if len(file_keys) == 1:
+            self.bucket.delete_object(file_keys[0])
+            return
+        self._parallel(
+            (self.bucket.batch_delete_objects, (file_keys[start:start + BATCH_DELETE_LIMIT],))
+            for start in range(0, len(file_keys), BATCH_DELETE_LIMIT)
+        )
     
     def get_file_info(self, file_key):
         """
@@ -162,14 +310,21 @@ class OSSService:
             return {
                 'size': result.content_length,
                 'last_modified': result.last_modified,
-                'content_type': result.content_type
+                'content_type': result.content_type,
+                'etag': result.etag
             }
         except Exception as e:
             raise Exception(f"获取文件信息失败: {str(e)}")
-
-# 创建全局OSS服务实例
-try:
-    oss_service = OSSService()
-except ValueError as e:
-    print(f"警告: {e}")
-    oss_service = None 
\ No newline at end of file
+    
+    def list_objects(self, prefix=''):
+        """
+        按key字典序列出OSS文件（分页拉取）
+        :param prefix: key前缀
+        :return: 迭代器，元素为 {'key', 'size', 'last_modified'}
+        """
+        for item in oss2.ObjectIterator(self.bucket, prefix=prefix):
+            yield {
+                'key': item.key,
+                'size': item.size,
+                'last_modified': item.last_modified
+            }
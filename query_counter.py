@@ -0,0 +1,60 @@
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_state = threading.local()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_state, 'counters', ()):
+        counter.queries.append(statement)
+
+class QueryCounter:
+    """
+    统计当前线程内执行的SQL语句
+    """
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def start(self):
+        if not hasattr(_state, 'counters'):
+            _state.counters = []
+        _state.counters.append(self)
+        return self
+
+    def stop(self):
+        counters = getattr(_state, 'counters', [])
+        if self in counters:
+            counters.remove(self)
+
+@contextmanager
+def count_queries():
+    """
+    统计代码块内执行的SQL数量
+    用法:
+        with count_queries() as counter:
+            ...
+        print(counter.count)
+    """
+    counter = QueryCounter().start()
+    try:
+        yield counter
+    finally:
+        counter.stop()
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    断言代码块内执行的SQL数量不超过 limit，用于发现 N+1 查询
+    :raises AssertionError: 超出数量限制
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        statements = '\n'.join(counter.queries)
+        raise AssertionError(f"执行了 {counter.count} 条SQL，超过上限 {limit}:\n{statements}")
@@ -0,0 +1,312 @@
+import re
+from sqlalchemy import text, inspect
+
+# 中日韩字符范围（汉字、假名、韩文）
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN_PATTERN = re.compile(rf'([{CJK_CHARS}]+)|((?:(?![{CJK_CHARS}])[^\W_])+)')
+
+# 参与检索的字段及其排序权重
+SEARCH_FIELDS = ('title', 'description', 'location')
+FIELD_WEIGHTS = {'title': 10.0, 'description': 2.0, 'location': 5.0}
+
+def index_tokens(value):
+    """
+    将文本切分为索引词
+    中日韩文本按单字和相邻双字切分，其他文本按单词切分并转为小写
+    :param value: 原始文本
+    :return: 以空格分隔的索引词字符串
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(value or ''):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word.lower())
+    return ' '.join(tokens)
+
+def query_terms(value):
+    """
+    将搜索关键词切分为检索词
+    中日韩文本切分为相邻双字（所有双字都需命中，近似子串匹配），单字则直接匹配；
+    其他单词按前缀匹配
+    :return: [(检索词, 是否前缀匹配)]
+    """
+    terms = []
+    for cjk, word in TOKEN_PATTERN.findall(value or ''):
+        if cjk:
+            if len(cjk) == 1:
+                terms.append((cjk, False))
+            else:
+                terms.extend((cjk[i:i + 2], False) for i in range(len(cjk) - 1))
+        else:
+            terms.append((word.lower(), True))
+    return terms
+
+class SearchBackend:
+    """
+    全文检索后端基类，默认实现为 LIKE 模糊匹配（无索引）
+    """
+    name = 'like'
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def setup(self):
+        """创建索引结构，返回是否新建"""
+        return False
+
+    def index_photo(self, photo):
+        pass
+
+    def remove_photo(self, photo_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def apply(self, query, search):
+        """
+        为查询添加检索条件
+        :return: (查询对象, 排序表达式或None)
+        """
+        model = self.model
+        return query.filter(
+            self.db.or_(
+                model.title.contains(search),
+                model.description.contains(search),
+                model.location.contains(search)
+            )
+        ), None
+
+    def _iter_photos(self, chunk_size=1000):
+        """按主键分批读取照片的检索字段"""
+        model = self.model
+        last_id = ''
+        while True:
+            rows = self.db.session.query(model.id, model.title, model.description, model.location)\
+                                  .filter(model.id > last_id)\
+                                  .order_by(model.id)\
+                                  .limit(chunk_size).all()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1].id
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 全文检索，索引内容由应用预先切分为单字/双字
+    """
+    name = 'sqlite_fts5'
+
+    def setup(self):
+        exists = self.db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'photo_fts'")
+        ).first()
+        if exists:
+            return False
+        self.db.session.execute(text(
+            "CREATE VIRTUAL TABLE photo_fts USING fts5("
+            "photo_id UNINDEXED, title, description, location, tokenize = 'unicode61')"
+        ))
+        return True
+
+    def index_photo(self, photo):
+        self.remove_photo(photo.id)
+        self.db.session.execute(
+            text("INSERT INTO photo_fts (photo_id, title, description, location) "
+                 "VALUES (:photo_id, :title, :description, :location)"),
+            self._row_params(photo)
+        )
+
+    def remove_photo(self, photo_id):
+        self.db.session.execute(text("DELETE FROM photo_fts WHERE photo_id = :photo_id"), {'photo_id': photo_id})
+
+    def rebuild(self):
+        self.db.session.execute(text("DELETE FROM photo_fts"))
+        total = 0
+        for rows in self._iter_photos():
+            self.db.session.execute(
+                text("INSERT INTO photo_fts (photo_id, title, description, location) "
+                     "VALUES (:photo_id, :title, :description, :location)"),
+                [self._row_params(row) for row in rows]
+            )
+            total += len(rows)
+        return total
+
+    def apply(self, query, search):
+        terms = query_terms(search)
+        if not terms:
+            return super().apply(query, search)
+        match = ' AND '.join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in terms)
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in SEARCH_FIELDS)
+        ranked = text(
+            f"SELECT photo_id, bm25(photo_fts, 0.0, {weights}) AS rank "
+            "FROM photo_fts WHERE photo_fts MATCH :match"
+        ).bindparams(match=match).columns(photo_id=self.db.String, rank=self.db.Float).subquery('photo_fts_match')
+        # bm25 分值越小相关度越高
+        return query.join(ranked, self.model.id == ranked.c.photo_id), ranked.c.rank.asc()
+
+    @staticmethod
+    def _row_params(photo):
+        return {
+            'photo_id': photo.id,
+            'title': index_tokens(photo.title),
+            'description': index_tokens(photo.description),
+            'location': index_tokens(photo.location)
+        }
+
+class MySQLFulltextBackend(SearchBackend):
+    """
+    MySQL InnoDB FULLTEXT 索引（ngram 分词器，原生支持中文），索引由数据库自动维护
+    """
+    name = 'mysql_fulltext'
+    index_name = 'ft_photo_search'
+
+    def setup(self):
+        table = self.model.__tablename__
+        indexes = inspect(self.db.session.connection()).get_indexes(table)
+        if any(index['name'] == self.index_name for index in indexes):
+            return False
+        self.db.session.execute(text(
+            f"ALTER TABLE {table} ADD FULLTEXT INDEX {self.index_name} "
+            f"({', '.join(SEARCH_FIELDS)}) WITH PARSER ngram"
+        ))
+        return True
+
+    def apply(self, query, search):
+        terms = []
+        for cjk, word in TOKEN_PATTERN.findall(search or ''):
+            terms.append(f'+"{cjk}"' if cjk else f'+{word.lower()}*')
+        if not terms:
+            return super().apply(query, search)
+        table = self.model.__tablename__
+        columns = ', '.join(f'{table}.{field}' for field in SEARCH_FIELDS)
+        match_sql = f"MATCH({columns}) AGAINST (:match IN BOOLEAN MODE)"
+        match = ' '.join(terms)
+        return query.filter(text(match_sql).bindparams(match=match)), \
+               text(f"{match_sql} DESC").bindparams(match=match)
+
+class PostgresFulltextBackend(SearchBackend):
+    """
+    PostgreSQL tsvector + GIN 索引，索引内容由应用预先切分为单字/双字
+    """
+    name = 'postgres_tsvector'
+
+    def setup(self):
+        if inspect(self.db.session.connection()).has_table('photo_search'):
+            return False
+        self.db.session.execute(text(
+            "CREATE TABLE photo_search ("
+            "photo_id VARCHAR(36) PRIMARY KEY, document TSVECTOR NOT NULL)"
+        ))
+        self.db.session.execute(text(
+            "CREATE INDEX ix_photo_search_document ON photo_search USING GIN (document)"
+        ))
+        return True
+
+    def index_photo(self, photo):
+        self.db.session.execute(
+            text("INSERT INTO photo_search (photo_id, document) VALUES (:photo_id, "
+                 f"{self._document_sql()}) "
+                 f"ON CONFLICT (photo_id) DO UPDATE SET document = EXCLUDED.document"),
+            self._row_params(photo)
+        )
+
+    def remove_photo(self, photo_id):
+        self.db.session.execute(text("DELETE FROM photo_search WHERE photo_id = :photo_id"), {'photo_id': photo_id})
+
+    def rebuild(self):
+        self.db.session.execute(text("DELETE FROM photo_search"))
+        total = 0
+        for rows in self._iter_photos():
+            self.db.session.execute(
+                text(f"INSERT INTO photo_search (photo_id, document) VALUES (:photo_id, {self._document_sql()})"),
+                [self._row_params(row) for row in rows]
+            )
+            total += len(rows)
+        return total
+
+    def apply(self, query, search):
+        terms = query_terms(search)
+        if not terms:
+            return super().apply(query, search)
+        match = ' & '.join(f'{term}:*' if prefix else term for term, prefix in terms)
+        ranked = text(
+            "SELECT photo_id, ts_rank(document, to_tsquery('simple', :match)) AS rank "
+            "FROM photo_search WHERE document @@ to_tsquery('simple', :match)"
+        ).bindparams(match=match).columns(photo_id=self.db.String, rank=self.db.Float).subquery('photo_search_match')
+        return query.join(ranked, self.model.id == ranked.c.photo_id), ranked.c.rank.desc()
+
+    @staticmethod
+    def _document_sql():
+        weights = {'title': 'A', 'location': 'B', 'description': 'C'}
+        return ' || '.join(
+            f"setweight(to_tsvector('simple', :{field}), '{weights[field]}')" for field in SEARCH_FIELDS
+        )
+
+    @staticmethod
+    def _row_params(photo):
+        return {
+            'photo_id': photo.id,
+            'title': index_tokens(photo.title),
+            'description': index_tokens(photo.description),
+            'location': index_tokens(photo.location)
+        }
+
+class PhotoSearchIndex:
+    """
+    照片全文检索
+    根据数据库类型选择后端：SQLite 使用 FTS5，MySQL 使用 ngram FULLTEXT 索引，
+    PostgreSQL 使用 tsvector/GIN；其他数据库退化为 LIKE 匹配。
+    """
+    backends = {
+        'sqlite': SQLiteFTSBackend,
+        'mysql': MySQLFulltextBackend,
+        'mariadb': MySQLFulltextBackend,
+        'postgresql': PostgresFulltextBackend
+    }
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.backend = SearchBackend(db, model)
+
+    def setup(self):
+        """
+        初始化检索后端，首次创建索引时从照片表重建
+        需在应用上下文中调用
+        """
+        dialect = self.db.engine.dialect.name
+        backend_class = self.backends.get(dialect, SearchBackend)
+        backend = backend_class(self.db, self.model)
+        try:
+            if backend.setup():
+                total = backend.rebuild()
+                print(f"全文检索索引已创建（{backend.name}），共索引 {total} 张照片")
+            self.db.session.commit()
+            self.backend = backend
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"警告: 初始化全文检索失败，使用LIKE匹配: {e}")
+            self.backend = SearchBackend(self.db, self.model)
+
+    def index_photo(self, photo):
+        """在当前事务中写入/更新照片的检索索引（需在flush之后调用，以确保已生成ID）"""
+        self.backend.index_photo(photo)
+
+    def remove_photo(self, photo_id):
+        """在当前事务中删除照片的检索索引"""
+        self.backend.remove_photo(photo_id)
+
+    def rebuild(self):
+        """重建全部检索索引，返回索引的照片数"""
+        return self.backend.rebuild()
+
+    def apply(self, query, search):
+        """
+        为照片查询添加全文检索条件
+        :return: (查询对象, 相关度排序表达式或None)
+        """
+        return self.backend.apply(query, search)
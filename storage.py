@@ -0,0 +1,444 @@
+import os
+from PIL import Image, ImageOps
+import io
+import math
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    # Pillow 11.2 之前需要安装 pillow-avif-plugin 才能编码AVIF
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# 衍生图格式: (Pillow格式名, 扩展名, MIME类型)
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'avif': ('AVIF', 'avif', 'image/avif')
+}
+
+def supported_image_formats():
+    """当前Pillow可编码的衍生图格式"""
+    Image.init()
+    return [name for name, (pil_format, _, _) in IMAGE_FORMATS.items() if pil_format in Image.SAVE]
+
+class Storage:
+    """
+    文件存储后端基类
+    子类实现 put/get/stream/delete/sign/head/list 等基本操作，
+    图片处理（缩略图、衍生图、缩放）及上传流程在基类中基于这些操作实现。
+    """
+    # 签名URL指向本API自身时为True，图片接口直接经 open_image 转发而不是重定向
+    proxy_delivery = False
+
+    def __init__(self):
+        # 衍生图尺寸（长边像素）及JPEG质量
+        self.derivative_sizes = sorted(
+            {int(size) for size in os.getenv('DERIVATIVE_SIZES', '160,320,640,1280,2048').split(',') if size.strip()},
+            reverse=True
+        )
+        self.derivative_quality = int(os.getenv('DERIVATIVE_QUALITY', 85))
+        
+        # 在JPEG之外额外生成的格式（Pillow不支持的格式自动跳过）
+        supported = supported_image_formats()
+        self.derivative_formats = []
+        for name in os.getenv('DERIVATIVE_FORMATS', 'webp,avif').split(','):
+            name = name.strip().lower()
+            if not name or name == 'jpeg' or name in self.derivative_formats:
+                continue
+            if name in supported:
+                self.derivative_formats.append(name)
+            else:
+                print(f"警告: 当前Pillow不支持编码 {name} 格式，跳过该格式的衍生图")
+        
+        # 降分辨率解码余量：JPEG按DCT缩放解码到不小于 目标尺寸×该值 的分辨率，
+        # 缩放时先整数倍缩小到该余量再重采样（越小越快，不小于2.0时与直接重采样几乎无差别；0表示全分辨率解码）
+        reducing_gap = float(os.getenv('IMAGE_REDUCING_GAP', 2.0))
+        self.reducing_gap = max(reducing_gap, 1.0) if reducing_gap else None
+        
+        # 流式上传的分块大小（同时也是单次上传的内存上限），OSS要求分片不小于100KB
+        self.chunk_size = max(int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)), 100 * 1024)
+    
+    def spool_upload(self, file_obj):
+        """
+        按块将上传文件写入本地临时文件，同时计算大小和SHA-256
+        :param file_obj: 文件对象
+        :return: {'path': 临时文件路径, 'size': 字节数, 'sha256': 十六进制摘要}
+        """
+        file_obj.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(prefix='upload-', dir=os.getenv('DERIVATIVE_TMP_DIR'))
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                while True:
+                    chunk = file_obj.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(path)
+            raise
+        
+        return {'path': path, 'size': size, 'sha256': digest.hexdigest()}
+    
+    def upload_derivatives(self, file_obj, thumbnail_key):
+        """
+        一次解码原图，生成并上传缩略图和各尺寸衍生图
+        每个尺寸生成JPEG及 derivative_formats 中的格式（WebP/AVIF），体积不小于JPEG的不上传；
+        缩略图其他格式的key为缩略图key替换扩展名，衍生图key为 derivatives/<长边>/<文件名>.<扩展名>
+        :param file_obj: 原图文件对象
+        :param thumbnail_key: 缩略图文件key
+        :return: 衍生图信息列表 [{'variant', 'format', 'key', 'width', 'height', 'size'}]
+        """
+        thumbnail_stem = thumbnail_key.rsplit('.', 1)[0]
+        stem = thumbnail_stem.rsplit('/', 1)[-1]
+        derivatives = []
+        
+        def encoded():
+            # 逐个编码，编码下一张的同时上传已编码的图片
+            for variant, image in self._create_derivatives(file_obj):
+                jpeg_size = None
+                for image_format in ['jpeg'] + self.derivative_formats:
+                    content = self._encode(image, image_format)
+                    if jpeg_size is not None and len(content) >= jpeg_size:
+                        continue
+                    extension = IMAGE_FORMATS[image_format][1]
+                    if variant == 'thumbnail':
+                        key = thumbnail_key if image_format == 'jpeg' else f"{thumbnail_stem}.{extension}"
+                    else:
+                        key = f"derivatives/{variant}/{stem}.{extension}"
+                    yield key, content, IMAGE_FORMATS[image_format][2]
+                    if image_format == 'jpeg':
+                        jpeg_size = len(content)
+                    derivatives.append({
+                        'variant': variant,
+                        'format': image_format,
+                        'key': key,
+                        'width': image.width,
+                        'height': image.height,
+                        'size': len(content)
+                    })
+        
+        self.put_objects(encoded())
+        return derivatives
+    
+    def put_objects(self, items):
+        """
+        上传多个字节数据
+        :param items: 可迭代的 (文件key, 内容, MIME类型)，可以是生成器（边生成边上传）
+        """
+        self._parallel((self.put_object, item) for item in items)
+    
+    def _parallel(self, calls):
+        """
+        执行多个相互独立的存储操作，默认依次执行；支持并发的后端可重写为并发执行
+        :param calls: 可迭代的 (函数, 参数元组)
+        :return: 各操作的返回值列表（与调用顺序一致）
+        """
+        return [fn(*args) for fn, args in calls]
+    
+    def render_resized(self, file_obj, width=0, height=0, fit='contain', image_format='jpeg'):
+        """
+        按指定尺寸缩放图片（不放大原图）
+        :param width: 目标宽度，0表示按高度等比计算
+        :param height: 目标高度，0表示按宽度等比计算
+        :param fit: contain（等比缩放至框内）/cover（等比缩放并居中裁剪）/fill（拉伸至目标尺寸）
+        :param image_format: jpeg/webp/avif
+        :return: (字节数据, 宽, 高)
+        """
+        try:
+            image = Image.open(file_obj)
+            # EXIF方向为旋转90度时，原图宽高与显示宽高互换
+            transposed = image.getexif().get(0x0112) in (5, 6, 7, 8)
+            source_size = image.size[::-1] if transposed else image.size
+            if not width:
+                width = max(1, round(source_size[0] * height / source_size[1]))
+            if not height:
+                height = max(1, round(source_size[1] * width / source_size[0]))
+            
+            # 目标尺寸大于原图时按比例缩小目标框
+            scale = min(1.0, source_size[0] / width, source_size[1] / height)
+            box = (max(1, round(width * scale)), max(1, round(height * scale)))
+            
+            # cover/fill 需要宽高都不小于目标框，contain 只需覆盖等比缩放后的尺寸
+            draft_size = self._contain_size(source_size, box) if fit == 'contain' else box
+            self._draft(image, draft_size[::-1] if transposed else draft_size)
+            image = self._to_rgb(ImageOps.exif_transpose(image))
+            
+            if fit == 'cover':
+                image = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+            elif fit == 'fill':
+                image = image.resize(box, Image.Resampling.LANCZOS, reducing_gap=self.reducing_gap)
+            else:
+                image.thumbnail(box, Image.Resampling.LANCZOS, reducing_gap=self.reducing_gap)
+            
+            return self._encode(image, image_format), image.width, image.height
+            
+        except Exception as e:
+            raise Exception(f"缩放图片失败: {str(e)}")
+    
+    def delete_image(self, file_key, thumbnail_key=None, derivative_keys=()):
+        """
+        删除图片及其缩略图、衍生图
+        :param file_key: 原图文件key
+        :param thumbnail_key: 缩略图文件key
+        :param derivative_keys: 衍生图文件key列表
+        """
+        keys = [file_key]
+        if thumbnail_key:
+            keys.append(thumbnail_key)
+        keys.extend(key for key in derivative_keys if key != thumbnail_key)
+        try:
+            self.delete_objects(keys)
+        except Exception as e:
+            raise Exception(f"删除文件失败: {str(e)}")
+    
+    def _create_thumbnail(self, file_obj, size=(300, 300)):
+        """
+        创建缩略图
+        :param file_obj: 文件对象
+        :param size: 缩略图尺寸
+        :return: 缩略图字节数据
+        """
+        try:
+            # 打开图片（JPEG按DCT缩放降分辨率解码）
+            image = Image.open(file_obj)
+            self._draft(image, self._contain_size(image.size, size))
+            image = self._to_rgb(image)
+            
+            # 创建缩略图
+            image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=self.reducing_gap)
+            
+            # 保存到字节流
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=85)
+            output.seek(0)
+            
+            return output.getvalue()
+            
+        except Exception as e:
+            raise Exception(f"创建缩略图失败: {str(e)}")
+    
+    def _create_derivatives(self, file_obj, thumbnail_size=300):
+        """
+        一次解码生成缩略图和各尺寸衍生图
+        JPEG按最大目标尺寸降分辨率解码，再从大到小逐级缩放（每级基于上一级结果），不放大小于目标尺寸的图片
+        :param file_obj: 文件对象
+        :param thumbnail_size: 缩略图长边上限
+        :return: [(variant, Image)]，variant 为 'thumbnail' 或长边像素字符串
+        """
+        try:
+            image = Image.open(file_obj)
+            long_edge = max(image.size)
+            
+            targets = [(size, str(size)) for size in self.derivative_sizes if size < long_edge]
+            targets.append((min(thumbnail_size, long_edge), 'thumbnail'))
+            targets.sort(key=lambda target: target[0], reverse=True)
+            
+            largest = targets[0][0]
+            self._draft(image, self._contain_size(image.size, (largest, largest)))
+            image = self._to_rgb(image)
+            
+            results = []
+            current = image
+            for size, variant in targets:
+                scale = size / max(current.size)
+                if scale < 1:
+                    new_size = (max(1, round(current.width * scale)), max(1, round(current.height * scale)))
+                    current = current.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=self.reducing_gap)
+                results.append((variant, current))
+            return results
+            
+        except Exception as e:
+            raise Exception(f"创建衍生图失败: {str(e)}")
+    
+    def _draft(self, image, size):
+        """
+        配置JPEG降分辨率解码（需在图片加载前调用）
+        libjpeg 按 1/2、1/4、1/8 DCT缩放解码，结果不小于 size×reducing_gap；其他格式不处理
+        :param image: 尚未加载的图片
+        :param size: 最终需要的尺寸 (宽, 高)
+        """
+        if image.format != 'JPEG' or not self.reducing_gap:
+            return
+        image.draft('RGB', (math.ceil(size[0] * self.reducing_gap), math.ceil(size[1] * self.reducing_gap)))
+    
+    @staticmethod
+    def _contain_size(size, box):
+        """等比缩放 size 至 box 内（不放大）后的尺寸"""
+        scale = min(1.0, box[0] / size[0], box[1] / size[1])
+        return max(1, math.ceil(size[0] * scale)), max(1, math.ceil(size[1] * scale))
+    
+    def _encode(self, image, image_format='jpeg'):
+        """
+        将图片编码为指定格式
+        :param image_format: jpeg/webp/avif
+        :return: 字节数据
+        """
+        output = io.BytesIO()
+        if image_format == 'webp':
+            image.save(output, format='WEBP', quality=self.derivative_quality, method=4)
+        elif image_format == 'avif':
+            image.save(output, format='AVIF', quality=self.derivative_quality, speed=6)
+        else:
+            image.save(output, format='JPEG', quality=self.derivative_quality, optimize=True, progressive=True)
+        return output.getvalue()
+    
+    @staticmethod
+    def _to_rgb(image):
+        """转换为RGB模式（处理RGBA等格式，透明背景填充白色）"""
+        if image.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
+            return background
+        if image.mode != 'RGB':
+            return image.convert('RGB')
+        return image
+    
+    # 以下为各存储后端需要实现的基本操作
+    
+    def put_file(self, file_key, path, size=None):
+        """
+        上传本地文件
+        :param file_key: 文件key
+        :param path: 本地文件路径
+        :param size: 文件大小（可选）
+        """
+        raise NotImplementedError
+    
+    def put_object(self, file_key, content, content_type=None):
+        """
+        上传字节数据
+        :param content_type: MIME类型（可选）
+        """
+        raise NotImplementedError
+    
+    def init_multipart(self, file_key):
+        """
+        初始化分片上传
+        :param file_key: 文件key
+        :return: upload_id
+        """
+        raise NotImplementedError
+    
+    def upload_part(self, file_key, upload_id, part_number, data):
+        """
+        上传一个分片
+        :param part_number: 分片序号（1-10000）
+        :param data: 分片内容
+        :return: 分片ETag
+        """
+        raise NotImplementedError
+    
+    def complete_multipart(self, file_key, upload_id, parts):
+        """
+        完成分片上传
+        :param parts: [(分片序号, ETag)]，按分片序号排序
+        """
+        raise NotImplementedError
+    
+    def abort_multipart(self, file_key, upload_id):
+        """取消分片上传并清理已上传的分片（上传不存在时忽略）"""
+        raise NotImplementedError
+    
+    def get_image_stream(self, file_key):
+        """
+        获取文件流
+        :param file_key: 文件key
+        :return: 可 read() 的文件流
+        """
+        raise NotImplementedError
+    
+    def open_image(self, file_key, request_headers=None):
+        """
+        按HTTP范围请求/条件请求读取文件（供API代理转发）
+        :param request_headers: 透传的 Range/If-None-Match/If-Modified-Since 等请求头
+        :return: (HTTP状态码, 响应头, 文件流)，304/416 时文件流为None
+        :raises FileNotFoundError: 文件不存在
+        """
+        raise NotImplementedError
+    
+    def download_file(self, file_key, path):
+        """
+        将文件保存到本地路径
+        :param file_key: 文件key
+        :param path: 本地文件路径
+        """
+        raise NotImplementedError
+    
+    def delete_objects(self, file_keys):
+        """
+        删除多个文件（文件不存在时忽略）
+        :param file_keys: 文件key列表
+        """
+        raise NotImplementedError
+    
+    def generate_signed_url(self, file_key, expires_in_seconds=3600):
+        """
+        生成带签名和过期时间的访问URL
+        :param file_key: 文件key
+        :param expires_in_seconds: 过期时间（秒），默认1小时
+        :return: 签名URL
+        """
+        raise NotImplementedError
+    
+    def get_file_info(self, file_key):
+        """
+        获取文件信息
+        :param file_key: 文件key
+        :return: {'size', 'last_modified', 'content_type', 'etag'}
+        """
+        raise NotImplementedError
+    
+    def list_objects(self, prefix=''):
+        """
+        按key字典序列出文件
+        :param prefix: key前缀
+        :return: 迭代器，元素为 {'key', 'size', 'last_modified'}
+        """
+        raise NotImplementedError
+    
+    def local_path(self, file_key):
+        """文件在本机上的路径（可直接以 sendfile 返回），非本地存储返回None"""
+        return None
+
+def create_storage():
+    """
+    根据环境变量 STORAGE_BACKEND 创建存储后端：oss（阿里云OSS，默认）或 local（本地文件系统）
+    只有显式指定 local 时才使用本地文件存储，OSS配置不完整时不会自动改用本地存储
+    :return: 存储后端实例，配置不完整或后端名称无效时返回None
+    """
+    backend = os.getenv('STORAGE_BACKEND', '').strip().lower() or 'oss'
+    if backend == 'oss':
+        from oss_service import OSSService as backend_class
+    elif backend == 'local':
+        from local_storage import LocalStorage as backend_class
+    else:
+        print(f"警告: 未知的存储后端 STORAGE_BACKEND={backend}，可选 oss 或 local")
+        return None
+    
+    try:
+        return backend_class()
+    except ValueError as e:
+        print(f"警告: {e}")
+        return None
+
+def __getattr__(name):
+    """
+    首次访问 storage 时创建全局存储实例
+    （延迟到本模块加载完成之后，各后端模块可以先于本模块导入）
+    """
+    if name == 'storage':
+        instance = create_storage()
+        globals()['storage'] = instance
+        return instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
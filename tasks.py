@@ -0,0 +1,199 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def build_derivatives(job):
+    """
+    生成照片缩略图及各尺寸衍生图（在进程池子进程中执行）
+    优先读取上传时保存的本地临时文件，不存在时从OSS下载原图
+    :param job: 任务字典，包含 photo_id, oss_key, thumbnail_key, source_path
+    :return: 结果字典
+    """
+    from storage import storage
+    import tempfile
+
+    if not storage:
+        raise Exception("存储服务不可用")
+
+    source_path = job.get('source_path')
+    if source_path and os.path.exists(source_path):
+        with open(source_path, 'rb') as source:
+            derivatives = storage.upload_derivatives(source, job['thumbnail_key'])
+    else:
+        fd, download_path = tempfile.mkstemp(prefix='derivative-', dir=os.getenv('DERIVATIVE_TMP_DIR'))
+        os.close(fd)
+        try:
+            storage.download_file(job['oss_key'], download_path)
+            with open(download_path, 'rb') as source:
+                derivatives = storage.upload_derivatives(source, job['thumbnail_key'])
+        finally:
+            os.remove(download_path)
+
+    return {
+        'photo_id': job['photo_id'],
+        'thumbnail_key': job['thumbnail_key'],
+        'derivatives': derivatives
+    }
+
+class JobQueue:
+    """
+    基于进程池的后台任务队列
+    任务失败后按指数退避重试，最终成功/失败时在父进程线程中回调。
+    进程池在首次提交任务时按进程创建（gunicorn preload 模式下 fork 之后）。
+    """
+    def __init__(self, worker_fn, on_success=None, on_failure=None,
+                 max_workers=2, max_retries=3, retry_delay=2.0):
+        self.worker_fn = worker_fn
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # 使用 spawn 启动子进程，避免继承父进程的数据库/HTTP连接
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, job, attempt=0):
+        """
+        提交任务
+        :param job: 可序列化的任务字典
+        :param attempt: 已重试次数
+        """
+        with self._lock:
+            if attempt == 0:
+                self._pending += 1
+        try:
+            future = self._get_executor().submit(self.worker_fn, job)
+        except Exception as e:
+            # 进程池已损坏（如子进程被杀死），重建后重试
+            with self._lock:
+                self._executor = None
+            self._handle_error(job, attempt, e)
+            return
+        future.add_done_callback(lambda f: self._done(job, attempt, f))
+
+    def _done(self, job, attempt, future):
+        error = future.exception()
+        if error is not None:
+            self._handle_error(job, attempt, error)
+            return
+        self._finish()
+        if self.on_success:
+            try:
+                self.on_success(job, future.result())
+            except Exception as e:
+                print(f"任务成功回调失败: {e}")
+
+    def _handle_error(self, job, attempt, error):
+        if attempt < self.max_retries:
+            delay = self.retry_delay * (2 ** attempt)
+            print(f"任务执行失败，{delay:.0f}秒后重试（第{attempt + 1}次）: {error}")
+            timer = threading.Timer(delay, self.submit, args=(job, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        self._finish()
+        if self.on_failure:
+            try:
+                self.on_failure(job, error)
+            except Exception as e:
+                print(f"任务失败回调失败: {e}")
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self):
+        """未完成（含等待重试）的任务数"""
+        return self._pending
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        # 在锁外等待进程池退出，完成回调（_finish）需要获取同一把锁
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+class RateLimiter:
+    """
+    令牌桶限速（单线程使用）：每秒补充 rate 个令牌，最多累积1秒的令牌
+    rate 为0时不限速
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+
+    def acquire(self, cost=1):
+        """取得 cost 个令牌，不足时等待"""
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= min(cost, self.rate):
+                self._tokens -= cost
+                return
+            time.sleep((min(cost, self.rate) - self._tokens) / self.rate)
+
+class BackgroundWorker:
+    """
+    后台线程：被唤醒（notify）或每隔 interval 秒执行一次 run_fn，
+    run_fn 返回真值（还有待处理的任务）时立即再次执行。
+    线程在首次 start/notify 时按进程创建（gunicorn preload 模式下 fork 之后），run_fn 异常只打印不退出。
+    """
+    def __init__(self, run_fn, interval=60.0, name='background-worker'):
+        self.run_fn = run_fn
+        self.interval = interval
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动当前进程的后台线程（已启动时不做任何事）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._event = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def notify(self):
+        """唤醒后台线程立即执行一次"""
+        self.start()
+        self._event.set()
+
+    def _run(self):
+        while True:
+            self._event.wait(self.interval)
+            self._event.clear()
+            try:
+                while self.run_fn():
+                    pass
+            except Exception as e:
+                print(f"后台任务 {self.name} 执行失败: {e}")
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 应用在导入时读取配置并初始化数据库，需在导入前指向临时目录
+TEST_DIR = tempfile.mkdtemp(prefix='jiadan-test-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TEST_DIR, 'photos.db')}",
+    'STORAGE_BACKEND': 'local',
+    'LOCAL_STORAGE_DIR': os.path.join(TEST_DIR, 'storage'),
+    'LOCAL_STORAGE_SECRET': 'test-local-storage-secret',
+    'UPLOAD_FOLDER': os.path.join(TEST_DIR, 'uploads'),
+    'DERIVATIVE_TMP_DIR': os.path.join(TEST_DIR, 'tmp'),
+    'JWT_SECRET_KEY': 'test-jwt-secret-key-with-32-bytes!',
+    'SYNC_SETTLE_SECONDS': '0',
+    'TOMBSTONE_PURGE_INTERVAL': '0',
+    'STORAGE_PURGE_INTERVAL': '3600',
+    'PROCESSING_RECOVERY_INTERVAL': '0',
+    'UPLOAD_SESSION_GC_INTERVAL': '0'
+})
+os.makedirs(os.environ['DERIVATIVE_TMP_DIR'])
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+@pytest.fixture
+def app():
+    flask_app = app_module.app
+    with flask_app.app_context():
+        yield flask_app
+        app_module.db.session.rollback()
+        for model in (app_module.TombstonePurge, app_module.Photo, app_module.UserStats, app_module.PhotoBlob,
+                      app_module.PhotoDerivative, app_module.PendingFileDeletion, app_module.UploadPart, app_module.UploadSession):
+            model.query.execution_options(include_deleted=True).delete()
+        app_module.db.session.commit()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/api/auth/login', json={'username': 'vane', 'password': app_module.app.config['ADMIN_PASSWORD']})
+    return {'Authorization': f"Bearer {response.json['data']['token']}"}
+
+@pytest.fixture
+def make_photos(app):
+    """直接写入照片记录: make_photos(数量, updated_at=..., is_public=...)"""
+    from datetime import datetime
+
+    def make(count, updated_at=None, **fields):
+        user = app_module.User.query.filter_by(username='vane').first()
+        photos = []
+        for index in range(count):
+            moment = updated_at or datetime.utcnow()
+            photos.append(app_module.Photo(
+                title=f'photo {index}',
+                src='/api/images/x/original',
+                thumbnail='/api/images/x/thumbnail',
+                user_id=user.id,
+                created_at=moment,
+                updated_at=moment,
+                **fields
+            ))
+        app_module.db.session.add_all(photos)
+        app_module.db.session.commit()
+        return photos
+    return make
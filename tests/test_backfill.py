@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import app as app_module
+
+
+def derivative(key, variant='640'):
+    return {'variant': variant, 'format': 'jpeg', 'key': key, 'width': 640, 'height': 480, 'size': 100}
+
+
+def test_backfill_invalidates_cached_keys_before_old_files_are_purged(make_photos):
+    photo_id = make_photos(1, status='ready', oss_key='photos/a.jpg', oss_thumbnail_key='thumbnails/a.jpg')[0].id
+    app_module.save_derivatives('photos/a.jpg', [derivative('derivatives/640/old.jpg')])
+    app_module.db.session.commit()
+    app_module.signed_url_cache.set_photo_keys(photo_id, {'640': 'derivatives/640/old.jpg'})
+    version = app_module.response_cache.version()
+
+    job = {'photo_id': photo_id, 'oss_key': 'photos/a.jpg', 'thumbnail_key': 'thumbnails/a.jpg'}
+    app_module.save_backfill_results([(job, {'derivatives': [derivative('derivatives/640/new.jpg')]})])
+
+    assert app_module.signed_url_cache.get_photo_keys(photo_id) is None
+    assert app_module.response_cache.version() > version
+    pending = app_module.PendingFileDeletion.query.one()
+    assert pending.file_key == 'derivatives/640/old.jpg'
+    # 其他worker本地缓存的映射过期之前旧文件不会被删除
+    assert pending.next_attempt_at > datetime.utcnow()
+    assert app_module.purge_pending_files() == (0, 0)
@@ -0,0 +1,37 @@
+import app as app_module
+
+
+def test_only_search_field_changes_reindex(client, auth_headers, make_photos, monkeypatch):
+    indexed = []
+    monkeypatch.setattr(app_module.search_index, 'index_photo', lambda photo: indexed.append(photo.id))
+    ids = [photo.id for photo in make_photos(3, is_public=False)]
+
+    response = client.post('/api/photos/batch/visibility', json={'ids': ids, 'is_public': True}, headers=auth_headers)
+    assert response.json['data']['succeeded'] == 3
+    assert indexed == []
+
+    response = client.post('/api/photos/batch/update', json={'ids': ids, 'date': '2024-01-01'}, headers=auth_headers)
+    assert response.json['data']['succeeded'] == 3
+    assert indexed == []
+
+    response = client.post('/api/photos/batch/update', json={'ids': ids, 'title': 'new title'}, headers=auth_headers)
+    assert response.json['data']['succeeded'] == 3
+    assert sorted(indexed) == sorted(ids)
+
+
+def test_invalid_values_are_reported_per_id_and_not_stored(client, auth_headers, make_photos):
+    ids = [photo.id for photo in make_photos(2, is_public=False)]
+
+    for changes in ({'title': 123}, {'is_public': 'yes'}, {'location': ['a']}, {'title': None}):
+        response = client.post('/api/photos/batch/update', json=dict(changes, ids=ids + ['missing']), headers=auth_headers)
+        assert response.status_code == 200, (changes, response.json)
+        data = response.json['data']
+        assert (data['succeeded'], data['failed']) == (0, 3)
+        codes = {result['id']: result['error']['code'] for result in data['results']}
+        assert codes == {ids[0]: 'INVALID_FIELD_VALUE', ids[1]: 'INVALID_FIELD_VALUE', 'missing': 'PHOTO_NOT_FOUND'}
+
+    rows = app_module.Photo.query.filter(app_module.Photo.id.in_(ids)).all()
+    assert all(row.title.startswith('photo ') and row.is_public is False and row.location is None for row in rows)
+
+    response = client.put(f'/api/photos/{ids[0]}', json={'is_public': 'yes'}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,59 @@
+import io
+import time
+import hashlib
+import json
+
+from PIL import Image
+
+import app as app_module
+
+def jpeg_bytes(color):
+    output = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(output, 'JPEG')
+    return output.getvalue()
+
+def batch_upload(client, headers, contents, **kwargs):
+    data = {'files': [(io.BytesIO(content), f'{index}.jpg') for index, content in enumerate(contents)]}
+    return client.post('/api/photos/upload/batch', headers=headers, data=data,
+                       content_type='multipart/form-data', **kwargs)
+
+def test_reused_blob_without_ready_photo_submits_derivative_job(monkeypatch, client, auth_headers, make_photos):
+    submitted = []
+    monkeypatch.setattr(app_module.derivative_queue, 'submit', submitted.append)
+    content = jpeg_bytes((10, 20, 30))
+    content_hash = hashlib.sha256(content).hexdigest()
+    make_photos(1, status='failed', oss_key='photos/failed.jpg', oss_thumbnail_key='thumbnails/failed.jpg',
+                content_hash=content_hash)
+    app_module.db.session.add(app_module.PhotoBlob(
+        content_hash=content_hash, oss_key='photos/failed.jpg', oss_thumbnail_key='thumbnails/failed.jpg',
+        size=len(content), ref_count=1
+    ))
+    app_module.db.session.commit()
+
+    lines = [json.loads(line) for line in batch_upload(client, auth_headers, [content]).data.splitlines()]
+
+    assert lines[0]['success'] and lines[0]['photo']['status'] == 'processing'
+    assert [job['oss_key'] for job in submitted] == ['photos/failed.jpg']
+    assert submitted[0]['source_path'] is None
+
+def test_disconnect_queues_uploaded_but_uncommitted_originals(monkeypatch, client, auth_headers):
+    monkeypatch.setattr(app_module.derivative_queue, 'submit', lambda job: None)
+    monkeypatch.setattr(app_module.storage_purger, 'notify', lambda: None)
+    original = app_module.put_spooled_upload
+
+    def slow_second_upload(source, filename):
+        # 第二个文件在客户端断开后才上传完成
+        if source['size'] == len(second):
+            time.sleep(0.5)
+        return original(source, filename)
+    monkeypatch.setattr(app_module, 'put_spooled_upload', slow_second_upload)
+    first, second = jpeg_bytes((200, 0, 0)), jpeg_bytes((0, 200, 0)) + b'\0'
+
+    response = batch_upload(client, auth_headers, [first, second], buffered=False)
+    assert json.loads(next(iter(response.response)))['success']
+    response.close()
+
+    photo, = app_module.Photo.query.all()
+    queued = {row.file_key for row in app_module.PendingFileDeletion.query}
+    assert len(queued) == 2 and photo.oss_key not in queued
+    assert {key.split('/')[0] for key in queued} == {'photos', 'thumbnails'}
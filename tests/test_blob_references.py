@@ -0,0 +1,63 @@
+import io
+
+import pytest
+from PIL import Image
+
+import app as app_module
+
+def jpeg_file():
+    output = io.BytesIO()
+    Image.new('RGB', (64, 48), (30, 60, 90)).save(output, 'JPEG')
+    output.seek(0)
+    return output
+
+def released_blob(content_hash, user_id=None):
+    """查找时存在、增加引用前已被删除的对象"""
+    return app_module.PhotoBlob(content_hash=content_hash, oss_key='photos/released.jpg',
+                                oss_thumbnail_key='thumbnails/released.jpg', size=1, ref_count=1)
+
+def test_reused_blob_is_not_recreated_after_release(app):
+    upload_result = {'file_size': 1, 'file_key': 'photos/released.jpg', 'thumbnail_key': 'thumbnails/released.jpg',
+                     'sha256': 'a' * 64, 'source_path': None, 'reused': True}
+
+    with pytest.raises(app_module.BlobReleasedError):
+        app_module.acquire_blob(upload_result, 'image/jpeg')
+    assert app_module.PhotoBlob.query.get('a' * 64) is None
+
+def test_upload_reuploads_when_matched_blob_was_released(monkeypatch, client, auth_headers):
+    monkeypatch.setattr(app_module.derivative_queue, 'submit', lambda job: None)
+    monkeypatch.setattr(app_module, 'find_blob', released_blob)
+
+    response = client.post('/api/photos/upload', headers=auth_headers, data={'file': (jpeg_file(), 'a.jpg')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    photo = app_module.Photo.query.one()
+    blob = app_module.PhotoBlob.query.one()
+    assert photo.oss_key == blob.oss_key != 'photos/released.jpg'
+    assert app_module.storage.local_path(photo.oss_key)
+
+def test_instant_upload_of_released_blob_returns_not_found(monkeypatch, client, auth_headers):
+    monkeypatch.setattr(app_module, 'find_blob', released_blob)
+
+    response = client.post('/api/photos/instant', headers=auth_headers, json={'sha256': 'b' * 64})
+
+    assert response.status_code == 404
+    assert app_module.PhotoBlob.query.count() == 0
+
+def test_purge_skips_files_still_referenced_by_live_photos(monkeypatch, make_photos):
+    storage = app_module.storage
+    storage.put_object('photos/live.jpg', b'live')
+    storage.put_object('photos/gone.jpg', b'gone')
+    make_photos(1, oss_key='photos/live.jpg', oss_thumbnail_key='thumbnails/live.jpg')
+    app_module.db.session.add_all([
+        app_module.PendingFileDeletion(file_key='photos/live.jpg'),
+        app_module.PendingFileDeletion(file_key='photos/gone.jpg')
+    ])
+    app_module.db.session.commit()
+
+    assert app_module.purge_pending_files() == (2, 0)
+    assert app_module.PendingFileDeletion.query.count() == 0
+    assert storage.get_image_stream('photos/live.jpg').read() == b'live'
+    with pytest.raises(FileNotFoundError):
+        storage.get_image_stream('photos/gone.jpg')
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from PIL import Image
+
+import app as app_module
+
+
+@pytest.fixture
+def opened_streams(monkeypatch):
+    """记录存储后端打开的文件流，检查请求结束后是否都已关闭"""
+    storage = app_module.storage
+    streams = []
+
+    def track(method):
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            stream = result[2] if isinstance(result, tuple) else result
+            if stream is not None:
+                streams.append(stream)
+            return result
+        return wrapper
+
+    monkeypatch.setattr(storage, 'open_image', track(storage.open_image))
+    monkeypatch.setattr(storage, 'get_image_stream', track(storage.get_image_stream))
+    return streams
+
+
+def is_closed(stream):
+    return getattr(stream, 'stream', stream).closed
+
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'red').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_proxied_image_stream_closed_without_reading_body(client, make_photos, opened_streams):
+    photo = make_photos(1, is_public=True, status='ready', oss_key='photos/s.jpg', oss_thumbnail_key='photos/s_t.jpg')[0]
+    app_module.storage.put_object('photos/s.jpg', b'0123456789')
+
+    with client.head(f'/api/images/{photo.id}/original') as response:
+        assert response.status_code == 200
+    with client.get(f'/api/images/{photo.id}/original', headers={'Range': 'bytes=0-1'}) as response:
+        assert response.data == b'01'
+
+    assert len(opened_streams) == 2
+    assert all(is_closed(stream) for stream in opened_streams)
+
+
+def test_render_resized_image_closes_streams(app, opened_streams):
+    app_module.storage.put_object('photos/r.jpg', jpeg_bytes())
+
+    rendered = app_module.render_resized_image('photos/r.jpg', 32, 32, 'contain', 'jpeg')
+    assert app_module.render_resized_image('photos/r.jpg', 32, 32, 'contain', 'jpeg') == rendered
+
+    assert len(opened_streams) == 2
+    assert all(is_closed(stream) for stream in opened_streams)
@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.mark.parametrize('query', ['per_page=0&cursor=', 'per_page=-1&cursor=', 'per_page=0', 'per_page=-5&page=1'])
+def test_per_page_is_clamped_to_at_least_one(client, auth_headers, make_photos, query):
+    make_photos(3, is_public=True)
+
+    for path in ('/api/photos', '/api/public/photos'):
+        response = client.get(f'{path}?{query}', headers=auth_headers)
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()['data']
+        assert len(data['photos']) == 1
+        assert data['pagination']['per_page'] == 1
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+
+def test_stale_processing_photos_are_resubmitted_once_per_original(monkeypatch, make_photos):
+    submitted = []
+    monkeypatch.setattr(app_module.derivative_queue, 'submit', submitted.append)
+    stale = datetime.utcnow() - timedelta(seconds=app_module.app.config['PROCESSING_TIMEOUT'] + 60)
+    make_photos(2, updated_at=stale, status='processing', oss_key='photos/shared.jpg', oss_thumbnail_key='thumbnails/shared.jpg')
+    make_photos(1, updated_at=stale, status='processing', oss_key='photos/other.jpg', oss_thumbnail_key='thumbnails/other.jpg')
+    make_photos(1, status='processing', oss_key='photos/recent.jpg', oss_thumbnail_key='thumbnails/recent.jpg')
+    make_photos(1, updated_at=stale, status='ready', oss_key='photos/ready.jpg', oss_thumbnail_key='thumbnails/ready.jpg')
+
+    assert app_module.recover_processing_photos() == 2
+    assert sorted(job['oss_key'] for job in submitted) == ['photos/other.jpg', 'photos/shared.jpg']
+    assert all(job['source_path'] is None for job in submitted)
+
+    # 重新提交后重新计时，不会重复提交
+    assert app_module.recover_processing_photos() == 0
+
+def test_derivatives_of_deleted_photo_are_queued_for_deletion(monkeypatch, make_photos):
+    monkeypatch.setattr(app_module.storage_purger, 'notify', lambda: None)
+    photo, = make_photos(1, status='processing', oss_key='photos/live.jpg', oss_thumbnail_key='thumbnails/live.jpg')
+    derivative = {'variant': 'thumbnail', 'format': 'jpeg', 'width': 10, 'height': 10, 'size': 100}
+
+    job = {'photo_id': photo.id, 'oss_key': 'photos/live.jpg', 'thumbnail_key': 'thumbnails/live.jpg'}
+    app_module.on_derivatives_ready(job, {'derivatives': [dict(derivative, key='thumbnails/live.jpg')]})
+    assert app_module.db.session.query(app_module.Photo.status).filter_by(id=photo.id).scalar() == 'ready'
+    assert app_module.PhotoDerivative.query.filter_by(source_key='photos/live.jpg').count() == 1
+
+    # 任务期间照片已被删除：不保存衍生图记录，新生成的文件加入待删除队列
+    job = {'photo_id': 'deleted-photo', 'oss_key': 'photos/gone.jpg', 'thumbnail_key': 'thumbnails/gone.jpg'}
+    app_module.on_derivatives_ready(job, {'derivatives': [dict(derivative, key='thumbnails/gone.jpg')]})
+    assert app_module.PhotoDerivative.query.filter_by(source_key='photos/gone.jpg').count() == 0
+    assert [row.file_key for row in app_module.PendingFileDeletion.query] == ['thumbnails/gone.jpg']
@@ -0,0 +1,57 @@
+import pytest
+
+import app as app_module
+from query_counter import assert_max_queries, count_queries
+
+
+@pytest.fixture
+def add_photos(make_photos):
+    """写入带衍生图记录的照片"""
+    created = []
+
+    def add(count):
+        photos = []
+        for _ in range(count):
+            index = len(created)
+            photo, = make_photos(1, status='ready', oss_key=f'photos/{index}.jpg', oss_thumbnail_key=f'thumbnails/{index}.jpg')
+            photos.append(photo)
+            created.append(photo)
+        app_module.db.session.add_all([
+            app_module.PhotoDerivative(source_key=photo.oss_key, variant=variant, format='jpeg',
+                                       key=f'derivatives/{photo.id}-{variant}.jpg', width=10, height=10, size=100)
+            for photo in photos for variant in ('thumbnail', '640', '1280')
+        ])
+        app_module.db.session.commit()
+        return photos
+    return add
+
+
+def viewer_headers(auth_headers):
+    return {'X-View-Password': app_module.app.config['VIEW_PASSWORD']}
+
+
+@pytest.mark.parametrize('headers', [lambda auth: auth, viewer_headers], ids=['user', 'viewer'])
+def test_photo_list_query_count_does_not_grow_with_page_size(client, auth_headers, add_photos, headers):
+    headers = headers(auth_headers)
+    add_photos(2)
+    with count_queries() as small:
+        response = client.get('/api/photos?per_page=50', headers=headers)
+    assert response.status_code == 200
+
+    add_photos(20)
+    with assert_max_queries(small.count):
+        response = client.get('/api/photos?per_page=50', headers=headers)
+    assert len(response.get_json()['data']['photos']) == 22
+
+    with assert_max_queries(small.count):
+        response = client.get('/api/photos?per_page=50&cursor=', headers=headers)
+    assert len(response.get_json()['data']['photos']) == 22
+
+
+def test_photo_detail_query_count(client, auth_headers, add_photos):
+    photo_id = add_photos(1)[0].id
+    # 照片（含用户）与衍生图各一条查询
+    with assert_max_queries(2):
+        response = client.get(f'/api/photos/{photo_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.get_json()['data']['photo']['srcset']) == {'640', '1280'}
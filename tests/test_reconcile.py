@@ -0,0 +1,32 @@
+import pytest
+
+import app as app_module
+
+
+def listing(*keys):
+    def list_objects(prefix=''):
+        for key in keys:
+            if key.startswith(prefix):
+                yield {'key': key, 'size': 1, 'last_modified': 0}
+    return list_objects
+
+
+def test_orphans_are_deleted_after_merge(monkeypatch, make_photos):
+    deleted = []
+    make_photos(1, oss_key='photos/b.jpg', oss_thumbnail_key='thumbnails/b.jpg')
+    monkeypatch.setattr(app_module.storage, 'list_objects', listing('photos/a.jpg', 'photos/b.jpg', 'photos/c.jpg'))
+    monkeypatch.setattr(app_module.storage, 'delete_objects', deleted.extend)
+
+    stats = app_module.reconcile_storage(prefixes=['photos/'], delete=True, chunk_size=1, report=lambda line: None)
+    assert deleted == ['photos/a.jpg', 'photos/c.jpg']
+    assert stats['orphans'] == 2 and stats['deleted'] == 2
+
+
+def test_nothing_is_deleted_when_listing_is_out_of_order(monkeypatch, app):
+    deleted = []
+    monkeypatch.setattr(app_module.storage, 'list_objects', listing('photos/b.jpg', 'photos/a.jpg'))
+    monkeypatch.setattr(app_module.storage, 'delete_objects', deleted.extend)
+
+    with pytest.raises(Exception, match='字典序'):
+        app_module.reconcile_storage(prefixes=['photos/'], delete=True, chunk_size=1, report=lambda line: None)
+    assert deleted == []
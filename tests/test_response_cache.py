@@ -0,0 +1,57 @@
+import pytest
+
+from cache import LRUCache, ResponseCache
+
+
+class RecordingCache(LRUCache):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def incr(self, key, amount=1):
+        self.calls += 1
+        return super().incr(key, amount)
+
+    def get_counter(self, key):
+        self.calls += 1
+        return super().get_counter(key)
+
+
+def test_cached_version_and_stats_avoid_shared_cache_round_trips():
+    shared = RecordingCache()
+    cache = ResponseCache(LRUCache(), shared, version_ttl=60)
+    version, _ = cache.get('/api/public/photos')
+    cache.set(version, '/api/public/photos', {'body': '{}', 'etag': 'abc'})
+    calls = shared.calls
+    for _ in range(50):
+        assert cache.get('/api/public/photos')[1] is not None
+    assert shared.calls == calls
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (50, 1)
+
+
+def test_bump_is_visible_to_own_worker_immediately_and_others_after_version_ttl():
+    shared = LRUCache()
+    worker_a = ResponseCache(LRUCache(), shared, version_ttl=60)
+    worker_b = ResponseCache(LRUCache(), shared, version_ttl=60)
+    version = worker_b.version()
+
+    worker_a.bump()
+    assert worker_a.version() == version + 1
+    assert worker_b.version() == version
+
+    worker_b.version_ttl = 0
+    worker_b._version = None
+    assert worker_b.version() == version + 1
+
+
+@pytest.mark.parametrize('if_none_match', ['"{etag}"', 'W/"{etag}"', '"other", W/"{etag}"', '*'])
+def test_public_list_not_modified_with_weak_etags(client, make_photos, if_none_match):
+    make_photos(2, is_public=True)
+    response = client.get('/api/public/photos')
+    etag = response.headers['ETag'].strip('"')
+
+    response = client.get('/api/public/photos', headers={'If-None-Match': if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert client.get('/api/public/photos', headers={'If-None-Match': '"other"'}).status_code == 200
@@ -0,0 +1,48 @@
+import time
+
+from cache import LRUCache, SignedURLCache
+
+
+def test_invalidate_photo_reaches_other_workers():
+    shared = LRUCache()
+    worker_a = SignedURLCache(LRUCache(), shared, local_photo_ttl=1)
+    worker_b = SignedURLCache(LRUCache(), shared, local_photo_ttl=1)
+
+    worker_a.set_photo_keys(1, {'original': 'photos/a.jpg'})
+    assert worker_b.get_photo_keys(1) == {'original': 'photos/a.jpg'}
+
+    worker_a.invalidate_photo(1, ['photos/a.jpg'])
+    assert worker_a.get_photo_keys(1) is None
+
+    time.sleep(1.1)
+    assert worker_b.get_photo_keys(1) is None
+
+
+def test_local_photo_ttl_without_shared_backend():
+    cache = SignedURLCache(LRUCache(), local_photo_ttl=1)
+    cache.set_photo_keys(1, {'original': 'photos/a.jpg'})
+    assert cache.get_photo_keys(1) is not None
+    time.sleep(1.1)
+    assert cache.get_photo_keys(1) is None
+
+
+class RecordingCache(LRUCache):
+    def __init__(self):
+        super().__init__()
+        self.incr_calls = 0
+
+    def incr(self, key, amount=1):
+        self.incr_calls += 1
+        return super().incr(key, amount)
+
+
+def test_hit_stats_are_flushed_to_shared_cache_in_batches():
+    shared = RecordingCache()
+    cache = SignedURLCache(LRUCache(), shared)
+    for _ in range(50):
+        cache.get_url('photos/a.jpg', 'original', lambda key, expires_in: f'https://oss/{key}')
+    assert shared.incr_calls == 0
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (49, 1)
+    assert shared.incr_calls == 2
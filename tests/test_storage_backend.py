@@ -0,0 +1,83 @@
+import pytest
+
+from local_storage import LocalStorage
+from storage import create_storage
+
+
+@pytest.fixture
+def oss_unconfigured(monkeypatch):
+    for name in ('ALIYUN_ACCESS_KEY_ID', 'ALIYUN_ACCESS_KEY_SECRET', 'ALIYUN_OSS_ENDPOINT', 'ALIYUN_OSS_BUCKET'):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.mark.parametrize('backend', ['', 'oss'])
+def test_incomplete_oss_config_does_not_fall_back_to_local(monkeypatch, oss_unconfigured, backend):
+    monkeypatch.setenv('STORAGE_BACKEND', backend)
+    assert create_storage() is None
+
+
+def test_local_backend_must_be_explicit(monkeypatch, tmp_path):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('LOCAL_STORAGE_DIR', str(tmp_path))
+    assert isinstance(create_storage(), LocalStorage)
+
+
+@pytest.mark.parametrize('secret', [None, 'your-jwt-secret-key'])
+def test_local_storage_refuses_default_secret(monkeypatch, tmp_path, secret):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('LOCAL_STORAGE_DIR', str(tmp_path))
+    monkeypatch.delenv('LOCAL_STORAGE_SECRET', raising=False)
+    if secret:
+        monkeypatch.setenv('JWT_SECRET_KEY', secret)
+    else:
+        monkeypatch.delenv('JWT_SECRET_KEY', raising=False)
+
+    with pytest.raises(ValueError):
+        LocalStorage()
+    assert create_storage() is None
+
+
+@pytest.fixture
+def local_storage(monkeypatch, tmp_path):
+    monkeypatch.setenv('LOCAL_STORAGE_DIR', str(tmp_path))
+    storage = LocalStorage()
+    storage.put_object('photos/a.jpg', b'0123456789')
+    return storage
+
+
+def test_local_open_image_full_range_and_conditional(local_storage):
+    status, headers, stream = local_storage.open_image('photos/a.jpg')
+    with stream:
+        assert (status, stream.read()) == (200, b'0123456789')
+    assert headers['Content-Length'] == '10'
+    assert headers['Content-Type'] == 'image/jpeg'
+
+    status, ranged, stream = local_storage.open_image('photos/a.jpg', {'Range': 'bytes=2-4'})
+    assert (status, stream.read(), stream.read()) == (206, b'234', b'')
+    stream.close()
+    assert ranged['Content-Range'] == 'bytes 2-4/10'
+    assert ranged['Content-Length'] == '3'
+
+    status, _, stream = local_storage.open_image('photos/a.jpg', {'Range': 'bytes=-3'})
+    assert (status, stream.read()) == (206, b'789')
+    stream.close()
+
+    status, unsatisfiable, stream = local_storage.open_image('photos/a.jpg', {'Range': 'bytes=20-'})
+    assert (status, stream, unsatisfiable['Content-Range']) == (416, None, 'bytes */10')
+
+    etag = headers['ETag']
+    for conditional in ({'If-None-Match': f'"other", W/{etag}'}, {'If-None-Match': '*'},
+                        {'If-Modified-Since': headers['Last-Modified']}):
+        status, _, stream = local_storage.open_image('photos/a.jpg', conditional)
+        assert (status, stream) == (304, None)
+
+    # If-Range 不匹配时忽略 Range，返回整个文件
+    status, _, stream = local_storage.open_image('photos/a.jpg', {'Range': 'bytes=2-4', 'If-Range': '"stale"'})
+    with stream:
+        assert (status, stream.read()) == (200, b'0123456789')
+
+
+@pytest.mark.parametrize('file_key', ['photos/missing.jpg', '../secret', 'photos'])
+def test_local_open_image_missing(local_storage, file_key):
+    with pytest.raises(FileNotFoundError):
+        local_storage.open_image(file_key)
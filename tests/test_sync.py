@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+
+def sync_pages(client, headers, since=None, limit=2):
+    """从 since 开始翻页直到 has_more 为 false，返回 (各页响应, 最后的 next_since)"""
+    pages = []
+    while True:
+        query = f'/api/photos/changes?limit={limit}' + (f'&since={since}' if since else '')
+        response = client.get(query, headers=headers)
+        pages.append(response)
+        if response.status_code != 200:
+            return pages, since
+        since = response.json['data']['next_since']
+        if not response.json['data']['has_more']:
+            return pages, since
+
+def test_full_sync_pages_over_rows_older_than_tombstone_retention(client, auth_headers, make_photos):
+    make_photos(5, updated_at=datetime.utcnow() - timedelta(days=60))
+
+    pages, _ = sync_pages(client, auth_headers)
+
+    assert [page.status_code for page in pages] == [200, 200, 200]
+    assert sum(len(page.json['data']['upserts']) for page in pages) == 5
+
+def test_since_before_purged_tombstone_expires(app, client, auth_headers, make_photos):
+    old = datetime.utcnow() - timedelta(days=60)
+    make_photos(2, updated_at=old)
+    _, since = sync_pages(client, auth_headers)
+    deleted_at = old + timedelta(days=1)
+    make_photos(1, updated_at=deleted_at, deleted_at=deleted_at)
+
+    assert app_module.purge_tombstones() == 1
+    assert app_module.TombstonePurge.query.one().purged_through == deleted_at
+
+    response = client.get(f'/api/photos/changes?since={since}', headers=auth_headers)
+    assert response.status_code == 410
+    assert response.json['error']['code'] == 'SYNC_EXPIRED'
+
+def test_since_after_purged_tombstone_is_still_valid(client, auth_headers, make_photos):
+    old = datetime.utcnow() - timedelta(days=60)
+    make_photos(1, updated_at=old, deleted_at=old)
+    assert app_module.purge_tombstones() == 1
+    make_photos(1, updated_at=old + timedelta(days=1))
+
+    pages, since = sync_pages(client, auth_headers)
+    response = client.get(f'/api/photos/changes?since={since}', headers=auth_headers)
+
+    assert all(page.status_code == 200 for page in pages)
+    assert response.status_code == 200
+
+def test_anonymous_sync_never_reveals_private_photos(client, auth_headers, make_photos):
+    shown, hidden, deleted = make_photos(3, is_public=True)
+    shown_id, hidden_id, deleted_id = shown.id, hidden.id, deleted.id
+    private_id = make_photos(1, is_public=False)[0].id
+
+    pages, since = sync_pages(client, {})
+    assert {photo['id'] for page in pages for photo in page.json['data']['upserts']} == {shown_id, hidden_id, deleted_id}
+
+    response = client.post('/api/photos/batch/visibility', json={'ids': [hidden_id], 'is_public': False}, headers=auth_headers)
+    assert response.status_code == 200
+    response = client.post('/api/photos/batch/update', json={'ids': [private_id], 'title': 'renamed'},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    response = client.post('/api/photos/batch/delete', json={'ids': [deleted_id]}, headers=auth_headers)
+    assert response.status_code == 200
+
+    pages, _ = sync_pages(client, {}, since=since, limit=1)
+    removed = [photo_id for page in pages for photo_id in page.json['data']['removed']]
+    assert sorted(removed) == sorted([hidden_id, deleted_id])
+    assert all(not page.json['data']['upserts'] for page in pages)
+
+    # 已登录用户仍能看到非公开照片的修改
+    pages, _ = sync_pages(client, auth_headers, since=since)
+    assert private_id in {photo['id'] for page in pages for photo in page.json['data']['upserts']}
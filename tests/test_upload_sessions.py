@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import app as app_module
+
+
+def create_session(client, headers, **fields):
+    response = client.post('/api/photos/uploads', json=dict(file_name='a.jpg', **fields), headers=headers)
+    return response, (response.get_json().get('data') or {}).get('session')
+
+
+def put_part(client, headers, session, part_number, data):
+    return client.put(f"/api/photos/uploads/{session['session_id']}/parts/{part_number}", data=data, headers=headers)
+
+
+def test_session_size_limits(client, auth_headers, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_SESSION_MAX_SIZE', 100)
+
+    response, _ = create_session(client, auth_headers, total_size=101)
+    assert response.status_code == 413
+    response, _ = create_session(client, auth_headers, total_size=-1)
+    assert response.status_code == 400
+
+    # 分片总大小不能超过声明的大小，重复上传的分片按新大小计算
+    _, session = create_session(client, auth_headers, total_size=50)
+    assert put_part(client, auth_headers, session, 1, b'x' * 30).status_code == 200
+    response = put_part(client, auth_headers, session, 2, b'x' * 30)
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'SIZE_EXCEEDED'
+    assert put_part(client, auth_headers, session, 1, b'x' * 20).status_code == 200
+    assert put_part(client, auth_headers, session, 2, b'x' * 30).status_code == 200
+
+    # 未声明大小时受会话大小上限限制
+    _, session = create_session(client, auth_headers)
+    assert put_part(client, auth_headers, session, 1, b'x' * 80).status_code == 200
+    assert put_part(client, auth_headers, session, 2, b'x' * 30).status_code == 413
+
+
+def test_completed_object_is_queued_when_commit_fails(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module.storage_purger, 'notify', lambda: None)
+    _, session = create_session(client, auth_headers)
+    assert put_part(client, auth_headers, session, 1, b'x' * 10).status_code == 200
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('db down')
+    monkeypatch.setattr(app_module, 'create_photo_record', fail)
+
+    response = client.post(f"/api/photos/uploads/{session['session_id']}/complete", headers=auth_headers)
+    assert response.status_code == 500
+    row = app_module.db.session.get(app_module.UploadSession, session['session_id'])
+    assert row.status == 'aborted'
+    assert [item.file_key for item in app_module.PendingFileDeletion.query] == [row.oss_key]
+
+
+def test_concurrent_duplicate_part_is_overwritten(client, auth_headers):
+    _, session = create_session(client, auth_headers)
+    parts = app_module.UploadPart.__table__
+
+    # 本请求上传期间另一个请求已提交同一分片，插入时主键冲突
+    def insert_concurrent_part(db_session, flush_context, instances):
+        with app_module.db.engine.begin() as connection:
+            connection.execute(parts.insert().values(
+                session_id=session['session_id'], part_number=1, etag='OTHER', size=3
+            ))
+    event.listen(app_module.db.session(), 'before_flush', insert_concurrent_part, once=True)
+
+    response = put_part(client, auth_headers, session, 1, b'x' * 10)
+    assert response.status_code == 200
+    part = app_module.db.session.get(app_module.UploadPart, (session['session_id'], 1))
+    assert (part.etag, part.size) == (response.get_json()['data']['etag'], 10)
+
+
+def test_gc_claims_expired_sessions_and_retries_failures_later(client, auth_headers, monkeypatch):
+    _, session = create_session(client, auth_headers)
+    row = app_module.db.session.get(app_module.UploadSession, session['session_id'])
+    row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    app_module.db.session.commit()
+
+    def fail(session):
+        raise RuntimeError('storage down')
+    monkeypatch.setattr(app_module, 'abort_upload_session', fail)
+    assert app_module.gc_upload_sessions() == 0
+    # 认领时已推迟过期时间，失败的会话不会在同一轮被反复清理
+    assert app_module.gc_upload_sessions() == 0
+    row = app_module.db.session.get(app_module.UploadSession, session['session_id'])
+    assert row.expires_at > datetime.utcnow()
+
+    monkeypatch.undo()
+    row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    app_module.db.session.commit()
+    assert app_module.gc_upload_sessions() == 1
+    assert app_module.db.session.get(app_module.UploadSession, session['session_id']) is None